@@ -0,0 +1,398 @@
+"""
+Performance benchmark for model_manager.py
+
+Generates synthetic model repositories (valid safetensors files with realistic
+SD1.5 / SDXL / Flux / LoRA header sizes), times the scanning, linking and
+inspector code paths at several repository sizes and writes the results to a
+JSON file so runs from different commits can be compared.
+
+Usage:
+    python benchmark_model_manager.py                      # 1k and 10k files
+    python benchmark_model_manager.py --sizes 1000,10000,100000
+    python benchmark_model_manager.py --output new.json --compare old.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import random
+import argparse
+import platform
+import tempfile
+import datetime
+import threading
+import subprocess
+import urllib.request
+from urllib.parse import quote
+from http.server import HTTPServer
+
+import model_manager
+
+# Share of generated files per folder
+FOLDER_WEIGHTS = {
+    "loras": 0.55,
+    "checkpoints": 0.05,
+    "embeddings": 0.17,
+    "vae": 0.03,
+    "controlnet": 0.05,
+    "upscale_models": 0.05,
+    "clip": 0.02,
+    "text_encoders": 0.02,
+    "unet": 0.03,
+    "diffusion_models": 0.03,
+}
+
+# Nested loras/ layout: loras/<category>/<sub>/file.safetensors
+LORA_CATEGORIES = ["style", "character", "concept", "clothing", "pose"]
+LORA_SUBFOLDERS = ["flux", "sdxl", "sd15", ""]
+
+# Per-file benchmarks are timed over at most this many files
+SAMPLE_FILES = 2000
+
+
+# ---- synthetic key sets ----
+
+def _sd15_unet_keys(prefix):
+    keys = []
+    for block in range(12):
+        for layer in ("in_layers.0", "in_layers.2", "out_layers.0", "out_layers.3", "emb_layers.1"):
+            keys += [f"{prefix}input_blocks.{block}.0.{layer}.weight", f"{prefix}input_blocks.{block}.0.{layer}.bias"]
+        for attn in ("attn1.to_q", "attn1.to_k", "attn1.to_v", "attn1.to_out.0", "attn2.to_q", "attn2.to_k", "attn2.to_v", "attn2.to_out.0", "ff.net.0.proj", "ff.net.2"):
+            keys.append(f"{prefix}input_blocks.{block}.1.transformer_blocks.0.{attn}.weight")
+    for block in range(12):
+        for layer in ("in_layers.0", "in_layers.2", "out_layers.0", "out_layers.3", "emb_layers.1", "skip_connection"):
+            keys += [f"{prefix}output_blocks.{block}.0.{layer}.weight", f"{prefix}output_blocks.{block}.0.{layer}.bias"]
+        for attn in ("attn1.to_q", "attn1.to_k", "attn1.to_v", "attn1.to_out.0", "attn2.to_q", "attn2.to_k", "attn2.to_v", "attn2.to_out.0"):
+            keys.append(f"{prefix}output_blocks.{block}.1.transformer_blocks.0.{attn}.weight")
+    return keys
+
+def _vae_keys(prefix):
+    keys = []
+    for part in ("encoder", "decoder"):
+        for block in range(4):
+            for res in range(3):
+                for layer in ("norm1", "conv1", "norm2", "conv2"):
+                    keys += [f"{prefix}{part}.down.{block}.block.{res}.{layer}.weight", f"{prefix}{part}.down.{block}.block.{res}.{layer}.bias"]
+    return keys
+
+def _clip_keys(prefix, layers):
+    keys = []
+    for layer in range(layers):
+        for name in ("self_attn.q_proj", "self_attn.k_proj", "self_attn.v_proj", "self_attn.out_proj", "mlp.fc1", "mlp.fc2", "layer_norm1", "layer_norm2"):
+            keys += [f"{prefix}encoder.layers.{layer}.{name}.weight", f"{prefix}encoder.layers.{layer}.{name}.bias"]
+    return keys
+
+def _flux_keys():
+    keys = []
+    for block in range(19):
+        for name in ("img_attn.qkv", "img_attn.proj", "txt_attn.qkv", "txt_attn.proj", "img_mlp.0", "img_mlp.2", "txt_mlp.0", "txt_mlp.2", "img_mod.lin", "txt_mod.lin"):
+            keys += [f"double_blocks.{block}.{name}.weight", f"double_blocks.{block}.{name}.bias"]
+    for block in range(38):
+        for name in ("linear1", "linear2", "modulation.lin"):
+            keys += [f"single_blocks.{block}.{name}.weight", f"single_blocks.{block}.{name}.bias"]
+    return keys
+
+def _lora_keys(base_keys):
+    keys = []
+    for key in base_keys:
+        if not key.endswith(".weight"):
+            continue
+        name = "lora_unet_" + key[:-len(".weight")].replace(".", "_")
+        keys += [f"{name}.lora_down.weight", f"{name}.lora_up.weight", f"{name}.alpha"]
+    return keys
+
+def build_templates():
+    """Key sets and metadata for every synthetic model kind"""
+    sd15_unet = _sd15_unet_keys("model.diffusion_model.")
+    sdxl_unet = _sd15_unet_keys("model.diffusion_model.") + _sd15_unet_keys("model.diffusion_model.middle_")
+    flux = _flux_keys()
+    return {
+        "sd15_checkpoint": (sd15_unet + _vae_keys("first_stage_model.") + _clip_keys("cond_stage_model.transformer.text_model.", 12), {}),
+        "sdxl_checkpoint": (sdxl_unet + _vae_keys("first_stage_model.") + _clip_keys("conditioner.embedders.0.transformer.text_model.", 12) + _clip_keys("conditioner.embedders.1.model.", 32),
+                            {"modelspec.architecture": "stable-diffusion-xl-v1-base"}),
+        "flux_unet": (flux, {"modelspec.architecture": "flux-1-dev"}),
+        "sd15_lora": (_lora_keys(sd15_unet[:200]), {"ss_base_model_version": "sd_v1", "ss_output_name": "sd15_lora"}),
+        "sdxl_lora": (_lora_keys(sdxl_unet[:400]), {"ss_base_model_version": "sdxl_base_v1-0", "ss_output_name": "sdxl_lora"}),
+        "flux_lora": (_lora_keys(flux[:300]), {"modelspec.architecture": "flux-1-dev/lora", "ss_output_name": "flux_lora"}),
+        "vae": (_vae_keys(""), {}),
+        "clip": (_clip_keys("text_model.", 12), {}),
+        "controlnet": (["controlnet_" + k for k in sd15_unet[:300]], {}),
+        "embedding": (["emb_params"], {}),
+        "upscale": ([f"model.{i}.weight" for i in range(64)], {}),
+    }
+
+FOLDER_TEMPLATES = {
+    "checkpoints": ["sd15_checkpoint", "sdxl_checkpoint"],
+    "loras": ["sd15_lora", "sdxl_lora", "flux_lora"],
+    "embeddings": ["embedding"],
+    "vae": ["vae"],
+    "controlnet": ["controlnet"],
+    "upscale_models": ["upscale"],
+    "clip": ["clip"],
+    "text_encoders": ["clip"],
+    "unet": ["flux_unet"],
+    "diffusion_models": ["flux_unet"],
+}
+
+def write_safetensors(path, keys, metadata):
+    """Write a tiny but valid safetensors file (one F16 element per tensor)"""
+    header = {}
+    offset = 0
+    for key in keys:
+        header[key] = {"dtype": "F16", "shape": [1], "data_offsets": [offset, offset + 2]}
+        offset += 2
+    if metadata:
+        header["__metadata__"] = metadata
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * offset)
+
+
+# ---- synthetic repository ----
+
+def generate_repository(repo_path, file_count, seed=0):
+    """
+    Create a synthetic repository with roughly file_count model files.
+    Files of the same kind are hard links to one template so 100k files stay cheap on disk.
+    """
+    rng = random.Random(seed)
+    templates = build_templates()
+    template_dir = os.path.join(os.path.dirname(repo_path), "_templates")
+    os.makedirs(template_dir, exist_ok=True)
+    template_files = {}
+    for kind, (keys, metadata) in templates.items():
+        template_files[kind] = os.path.join(template_dir, kind + ".safetensors")
+        write_safetensors(template_files[kind], keys, metadata)
+
+    created = 0
+    for folder, weight in FOLDER_WEIGHTS.items():
+        count = max(1, int(file_count * weight))
+        folder_path = os.path.join(repo_path, folder)
+        os.makedirs(folder_path, exist_ok=True)
+        for i in range(count):
+            kind = rng.choice(FOLDER_TEMPLATES[folder])
+            target_dir = folder_path
+            if folder == "loras" and i % 4:
+                target_dir = os.path.join(folder_path, rng.choice(LORA_CATEGORIES), rng.choice(LORA_SUBFOLDERS))
+                os.makedirs(target_dir, exist_ok=True)
+            file_path = os.path.join(target_dir, f"{kind}_{i:06d}.safetensors")
+            try:
+                os.link(template_files[kind], file_path)
+            except OSError:
+                shutil.copyfile(template_files[kind], file_path)
+            created += 1
+    return created
+
+
+# ---- timing helpers ----
+
+def _timed(func, repeat=1):
+    """Run func repeat times; returns (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _record(results, name, seconds, ops=1, **extra):
+    entry = {"seconds": round(seconds, 6), "ops": ops, "per_op_us": round(seconds / ops * 1e6, 3) if ops else None}
+    entry.update(extra)
+    results[name] = entry
+    print(f"  {name:<32} {seconds * 1000:10.2f} ms  ({ops} ops)")
+
+def _fs_ops():
+    """Filesystem operations the linker has reported to the metrics so far"""
+    return sum(value for (name, _), value in model_manager.METRICS.counters.items()
+               if name == "model_manager_fs_operations_total")
+
+def _list_files(repo_path):
+    files = []
+    for root, dirs, names in os.walk(repo_path):
+        for name in names:
+            files.append(os.path.join(root, name))
+    files.sort()
+    return files
+
+
+# ---- benchmark run ----
+
+class _QuietHandler(model_manager.ModelManagerHandler):
+    def log_message(self, format, *args):
+        pass
+
+def run_size(work_dir, file_count, repeat):
+    print(f"\n=== {file_count} files ===")
+    repo_path = os.path.join(work_dir, "repo")
+    install_path = os.path.join(work_dir, "ComfyUI")
+    os.makedirs(os.path.join(install_path, "models"), exist_ok=True)
+
+    gen_seconds, created = _timed(lambda: generate_repository(repo_path, file_count))
+    results = {}
+    _record(results, "generate_repository", gen_seconds, created)
+
+    files = _list_files(repo_path)
+    sample = files[:: max(1, len(files) // SAMPLE_FILES)][:SAMPLE_FILES]
+
+    # Header parsing and classification
+    seconds, parsed = _timed(lambda: [model_manager._read_safetensor_header(p) for p in sample], repeat)
+    header_bytes = sum(struct.unpack("<Q", open(p, "rb").read(8))[0] for p in sample)
+    _record(results, "_read_safetensor_header", seconds, len(sample), header_bytes=header_bytes)
+    seconds, _ = _timed(lambda: [model_manager.classify_safetensor(os.path.basename(p), meta, keys)
+                                 for p, (meta, keys) in zip(sample, parsed)], repeat)
+    _record(results, "classify_safetensor", seconds, len(sample))
+
+    # Config-level scans; the config lives in the work dir so the real one is never touched
+    os.chdir(work_dir)
+    config = model_manager.ModelManagerConfig()
+    config.state = model_manager.ModelManagerStateStore(os.path.join(work_dir, model_manager.STATE_DB_FILE))
+    config.data = {
+        "repositories": [{"id": 1, "name": "Bench", "path": repo_path, "description": "", "created": "", "exists": True}],
+        "comfyui_installations": [{"id": 1, "name": "Bench", "path": install_path, "description": "", "created": "", "exists": True}],
+        "links": {"1": [1]},
+        "enabled_custom_folders": {}
+    }
+    config.save_config()
+    seconds, _ = _timed(lambda: config.get_repository_folders(repo_path), repeat)
+    _record(results, "get_repository_folders", seconds, len(files))
+
+    # Linking, status and unlinking
+    linker = model_manager.ModelLinker()
+    models_path = os.path.join(install_path, "models")
+
+    def link_all():
+        total = 0
+        for folder in linker.standard_folders:
+            src = os.path.join(repo_path, folder)
+            if os.path.exists(src):
+                total += linker._link_folder(src, os.path.join(models_path, folder), folder)["count"]
+        return total
+    ops_before = _fs_ops()
+    seconds, linked = _timed(link_all)
+    _record(results, "_link_folder", seconds, linked, fs_ops=_fs_ops() - ops_before)
+    # Linking again over the existing links, as re-linking a repository does
+    ops_before = _fs_ops()
+    seconds, _ = _timed(link_all)
+    _record(results, "_link_folder_relink", seconds, linked, fs_ops=_fs_ops() - ops_before)
+
+    seconds, _ = _timed(lambda: linker.get_link_status(repo_path, install_path), repeat)
+    _record(results, "get_link_status", seconds, linked)
+    seconds, _ = _timed(lambda: config.update_all_link_status(linker), repeat)
+    _record(results, "update_all_link_status", seconds, linked)
+
+    # /api/browse through a real HTTP round trip on an ephemeral port
+    httpd = HTTPServer(("127.0.0.1", 0), _QuietHandler)
+    server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    server_thread.start()
+    browse_folder = os.path.join(repo_path, "checkpoints")
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/api/browse?mode=filesystem&path={quote(browse_folder)}"
+    browse_count = len(os.listdir(browse_folder))
+
+    def browse():
+        # Measure the uncached path; the header cache would otherwise serve every repeat
+        model_manager._header_cache_clear()
+        return urllib.request.urlopen(url).read()
+    seconds, _ = _timed(browse, repeat)
+    _record(results, "api_browse", seconds, browse_count)
+
+    # /api/search over an index of the whole repository; the index file lives in the work dir
+    model_manager.SEARCH_INDEX = model_manager.ModelSearchIndex(os.path.join(work_dir, model_manager.SEARCH_INDEX_FILE))
+    seconds, _ = _timed(lambda: model_manager.SEARCH_INDEX.refresh(config.data["repositories"]))
+    _record(results, "search_index_refresh", seconds, len(model_manager.SEARCH_INDEX.docs))
+    search_base = f"http://127.0.0.1:{httpd.server_address[1]}/api/search"
+    search_urls = [search_base + query for query in
+                   ("?q=lora", "?q=sdxl+lora", "?q=", "?q=&folder=loras", "?q=flux&folder=unet", "?q=lora&facets=1")]
+    seconds, _ = _timed(lambda: [urllib.request.urlopen(u).read() for u in search_urls], repeat)
+    _record(results, "api_search", seconds, len(search_urls))
+    httpd.shutdown()
+    httpd.server_close()
+
+    def unlink_all():
+        total = 0
+        devnull = open(os.devnull, "w")
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            for folder in linker.standard_folders:
+                dest = os.path.join(models_path, folder)
+                if os.path.exists(dest):
+                    total += linker._unlink_folder_for_repository(os.path.join(repo_path, folder), dest, folder)["count"]
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+        return total
+    seconds, unlinked = _timed(unlink_all)
+    _record(results, "_unlink_folder_for_repository", seconds, unlinked)
+
+    return {"file_count": len(files), "benchmarks": results}
+
+def _git_commit():
+    try:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=script_dir, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare(current, previous_file):
+    """Print per-benchmark ratios against a previous results file"""
+    with open(previous_file, "r") as f:
+        previous = json.load(f)
+    print(f"\n=== Compared with {previous_file} ({previous.get('commit')}) ===")
+    previous_runs = {run["requested_size"]: run for run in previous.get("runs", [])}
+    for run in current["runs"]:
+        old_run = previous_runs.get(run["requested_size"])
+        if not old_run:
+            continue
+        print(f"{run['requested_size']} files:")
+        for name, entry in run["benchmarks"].items():
+            old = old_run["benchmarks"].get(name)
+            if old and old["seconds"]:
+                ratio = entry["seconds"] / old["seconds"]
+                print(f"  {name:<32} {ratio:6.2f}x  ({old['seconds'] * 1000:.2f} -> {entry['seconds'] * 1000:.2f} ms)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ComfyUI Model Manager")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma separated file counts (e.g. 1000,10000,100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions for read-only benchmarks (best time is kept)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated repositories")
+    args = parser.parse_args()
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": []
+    }
+    output_file = os.path.abspath(args.output)
+    original_cwd = os.getcwd()
+
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        work_dir = tempfile.mkdtemp(prefix=f"mm_bench_{size}_")
+        try:
+            run = run_size(work_dir, size, args.repeat)
+            run["requested_size"] = size
+            report["runs"].append(run)
+        finally:
+            os.chdir(original_cwd)
+            if args.keep:
+                print(f"  kept {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_file}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
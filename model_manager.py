@@ -4,46 +4,1296 @@ import datetime
 import sys
 import subprocess
 import struct
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-from urllib.parse import urlparse, parse_qs
+import hashlib
+import ctypes
+import re
+import bisect
+import heapq
+import random
+import difflib
+import threading
+import time
+import logging
+import cProfile
+import traceback
+import collections
+import sqlite3
+import pickle
+import zipfile
+import hmac
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    # Without Pillow, thumbnail requests are answered with the original preview image
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger("model_manager")
+
+class _RateLimitFilter(logging.Filter):
+    """Let at most `burst` records per event through every `interval` seconds and report how many were dropped"""
+
+    def __init__(self, burst=20, interval=10.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # event -> [window_start, emitted, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, "event", record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(event)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[event] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} suppressed={suppressed}"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+logger.addFilter(_RateLimitFilter())
+
+def _log_event(level, event, **fields):
+    """Structured log line: `event key=value ...`, rate limited per event"""
+    if not logger.isEnabledFor(level):
+        return
+    message = " ".join([event] + [f"{key}={value!r}" for key, value in fields.items()])
+    logger.log(level, message, extra={"event": event})
+
+# Default latency buckets (seconds) for histograms
+METRIC_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    "model_manager_http_request_duration_seconds": ("histogram", "HTTP request latency by method, route and status"),
+    "model_manager_fs_operations_total": ("counter", "Filesystem operations performed by the linker, by operation"),
+    "model_manager_header_parse_duration_seconds": ("histogram", "Time spent parsing safetensors headers"),
+    "model_manager_header_parse_bytes_total": ("counter", "Bytes read while parsing safetensors headers"),
+    "model_manager_header_parse_errors_total": ("counter", "Safetensors headers that failed to parse"),
+    "model_manager_header_prefetch_files_total": ("counter", "Safetensors headers read ahead of a browse request"),
+    "model_manager_integrity_files_total": ("counter", "Files checked by the integrity scanner, by status (ok, suspect, corrupt)"),
+    "model_manager_thumbnail_requests_total": ("counter", "Thumbnail requests, by result (hit, generated, original, not_modified)"),
+    "model_manager_config_load_duration_seconds": ("histogram", "Time spent loading the configuration file"),
+    "model_manager_config_save_duration_seconds": ("histogram", "Time spent saving the configuration file"),
+}
+
+class ModelManagerMetrics:
+    """Process-wide counters and histograms exposed in Prometheus text format on /metrics"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket_counts, sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(METRIC_BUCKETS), 0.0, 0]
+            index = bisect.bisect_left(METRIC_BUCKETS, value)
+            if index < len(METRIC_BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        items = list(labels) + (extra or [])
+        if not items:
+            return ""
+        escaped = []
+        for key, value in items:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{key}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self.histograms.items()}
+
+        lines = []
+        names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+        for name in names:
+            metric_type, help_text = METRIC_HELP.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for (metric_name, labels), value in sorted(counters.items()):
+                if metric_name == name:
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for (metric_name, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(METRIC_BUCKETS, buckets):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+METRICS = ModelManagerMetrics()
+
+# Budget for background filesystem work; override with the "background_io" config setting
+BACKGROUND_IO_DEFAULTS = {
+    "max_ops_per_sec": 2000,                # stat/listdir/open calls; 0 = unlimited
+    "max_bytes_per_sec": 32 * 1024 * 1024,  # bytes read; 0 = unlimited
+    "latency_target_ms": 250                # foreground latency above this slows background work down
+}
+BACKGROUND_IO_MAX_BACKOFF = 32
+
+# ioprio_set(2) is not wrapped by libc or the os module
+_IOPRIO_SET_SYSCALL = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273}
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+
+class BackgroundIOScheduler:
+    """
+    Shared rate limit for filesystem work done off the request path (search index
+    refresh, header prefetch, integrity scans). Threads opt in with enter_background(), which also
+    drops them to nice 19 and the idle I/O class. throttle() then paces their
+    operations and bytes, and the pace slows while foreground requests are slow.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.settings = dict(BACKGROUND_IO_DEFAULTS)
+        self.backoff = 1.0
+        self.latency_ewma = None
+        self.next_free = 0.0  # monotonic time at which the budget is paid off
+
+    def enter_background(self):
+        """Mark the calling thread as background work and lower its CPU and I/O priority"""
+        self.local.background = True
+        try:
+            # Linux applies the nice value to this thread only
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        syscall_number = _IOPRIO_SET_SYSCALL.get(os.uname().machine) if sys.platform.startswith("linux") else None
+        if syscall_number is not None:
+            try:
+                # who=0: the calling thread
+                ctypes.CDLL(None, use_errno=True).syscall(
+                    syscall_number, _IOPRIO_WHO_PROCESS, 0, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT
+                )
+            except (OSError, AttributeError):
+                pass
+
+    def is_background(self):
+        return getattr(self.local, "background", False)
+
+    def throttle(self, ops=1, nbytes=0):
+        """Account for background I/O and sleep until the budget allows it; no-op on foreground threads"""
+        if not self.is_background():
+            return
+        with self.lock:
+            max_ops = self.settings["max_ops_per_sec"]
+            max_bytes = self.settings["max_bytes_per_sec"]
+            cost = max(ops / max_ops if max_ops else 0.0, nbytes / max_bytes if max_bytes else 0.0) * self.backoff
+            now = time.monotonic()
+            self.next_free = max(now, self.next_free) + cost
+            delay = self.next_free - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_foreground(self, seconds, settings=None):
+        """Feed a foreground request latency; background work backs off while latency is above target"""
+        with self.lock:
+            if settings is not None:
+                self.settings = dict(BACKGROUND_IO_DEFAULTS, **settings)
+            self.latency_ewma = seconds if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * seconds
+            if self.latency_ewma * 1000 > self.settings["latency_target_ms"]:
+                self.backoff = min(self.backoff * 2, BACKGROUND_IO_MAX_BACKOFF)
+            else:
+                self.backoff = max(1.0, self.backoff / 2)
+
+IO_SCHEDULER = BackgroundIOScheduler()
 
 # SafeTensor Inspector functionality
 # We use manual header parsing to avoid the heavy torch/numpy dependencies
 SAFETENSORS_AVAILABLE = True
 
+def _open_noatime(file_path):
+    """
+    Open a file for reading without updating its access time, so the manager's own reads
+    don't make models look recently used. O_NOATIME needs file ownership; otherwise a plain open.
+    """
+    flags = os.O_RDONLY | getattr(os, "O_NOATIME", 0)
+    try:
+        fd = os.open(file_path, flags)
+    except PermissionError:
+        fd = os.open(file_path, os.O_RDONLY)
+    return os.fdopen(fd, 'rb')
+
+# First read of a safetensors file; most headers fit, so one read usually gets the whole header
+HEADER_READ_BLOCK = 64 * 1024
+
+def _read_safetensor_header_from(f):
+    """
+    Read the length prefix and JSON header from an open safetensors file.
+    Returns (header, header_length); raises on a short or malformed header.
+    """
+    # Speculatively read a whole block: the 8-byte length prefix and, usually, the header
+    block = f.read(HEADER_READ_BLOCK)
+    background = IO_SCHEDULER.is_background()
+    if len(block) < 8:
+        raise ValueError("File too small to be a valid safetensors file")
+
+    # Unpack as little-endian unsigned 64-bit integer
+    header_length = struct.unpack('<Q', block[:8])[0]
+
+    # Read the JSON header; only headers larger than the block need a second read
+    header_data = block[8:8 + header_length]
+    if len(header_data) < header_length and len(block) == HEADER_READ_BLOCK:
+        # A text file saved as .safetensors (an HTML error page) decodes to an absurd length
+        if header_length > os.fstat(f.fileno()).st_size - 8:
+            raise ValueError(f"Header length {header_length} exceeds the file size")
+        header_data += f.read(header_length - len(header_data))
+    METRICS.inc("model_manager_header_parse_bytes_total", 8 + len(header_data))
+    if background:
+        # No DONTNEED here: it would drop the whole file from the page cache, including
+        # pages ComfyUI or the warmer loaded; a header is only a few cached pages anyway
+        IO_SCHEDULER.throttle(ops=1, nbytes=len(block) + max(0, len(header_data) + 8 - len(block)))
+    if len(header_data) < header_length:
+        raise ValueError("Incomplete header data")
+
+    # Parse JSON header
+    return json.loads(header_data.decode('utf-8')), header_length
+
+def _read_safetensor_header_json(file_path):
+    """
+    Read and parse the JSON header of a safetensors file: tensor entries (dtype, shape,
+    data_offsets) plus the __metadata__ key. Raises exception on error.
+    """
+    start = time.perf_counter()
+    try:
+        with _open_noatime(file_path) as f:
+            header, _ = _read_safetensor_header_from(f)
+
+            METRICS.observe("model_manager_header_parse_duration_seconds", time.perf_counter() - start)
+            return header
+
+    except Exception as e:
+        METRICS.inc("model_manager_header_parse_errors_total")
+        raise Exception(f"Failed to read safetensor header: {str(e)}")
+
 def _read_safetensor_header(file_path):
     """
     Read safetensor file header using only Python stdlib (no torch/numpy needed).
     Returns (metadata_dict, tensor_keys_list) or raises exception on error.
     """
+    header = _read_safetensor_header_json(file_path)
+
+    # Extract metadata (stored in special __metadata__ key)
+    metadata = header.get('__metadata__', {})
+
+    # Extract tensor keys (all keys except __metadata__)
+    tensor_keys = [k for k in header.keys() if k != '__metadata__']
+    return metadata, tensor_keys
+
+# Pickled PyTorch checkpoints (torch.save zip archives or the legacy pickle stream)
+PICKLE_CHECKPOINT_EXTENSIONS = ('.ckpt', '.pt', '.bin', '.pth')
+HEADER_FILE_EXTENSIONS = ('.safetensors', '.gguf') + PICKLE_CHECKPOINT_EXTENSIONS
+
+# torch storage classes and dtypes, by the names safetensors uses
+TORCH_STORAGE_DTYPES = {
+    "DoubleStorage": "F64", "FloatStorage": "F32", "HalfStorage": "F16", "BFloat16Storage": "BF16",
+    "LongStorage": "I64", "IntStorage": "I32", "ShortStorage": "I16", "CharStorage": "I8",
+    "ByteStorage": "U8", "BoolStorage": "BOOL"
+}
+TORCH_DTYPES = {
+    "float64": "F64", "double": "F64", "float32": "F32", "float": "F32", "float16": "F16", "half": "F16",
+    "bfloat16": "BF16", "int64": "I64", "long": "I64", "int32": "I32", "int": "I32", "int16": "I16",
+    "short": "I16", "int8": "I8", "uint8": "U8", "bool": "BOOL",
+    "float8_e4m3fn": "F8_E4M3", "float8_e5m2": "F8_E5M2"
+}
+
+class _PickleStub:
+    """Inert stand-in for any object a checkpoint pickle references; absorbs construction and state"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+    def __setitem__(self, key, value):
+        pass
+
+    def append(self, value):
+        pass
+
+    def extend(self, values):
+        pass
+
+class _TensorInfo:
+    __slots__ = ("dtype", "shape")
+
+    def __init__(self, dtype, shape):
+        self.dtype = dtype
+        self.shape = [int(d) for d in shape] if isinstance(shape, (tuple, list)) else []
+
+    def numel(self):
+        count = 1
+        for dim in self.shape:
+            count *= dim
+        return count
+
+class _TensorStorage:
+    __slots__ = ("dtype",)
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+
+def _rebuild_tensor(storage, storage_offset=0, size=(), *args, **kwargs):
+    return _TensorInfo(getattr(storage, "dtype", "unknown"), size)
+
+def _rebuild_parameter(data, *args, **kwargs):
+    return data
+
+def _rebuild_tensor_without_storage(dtype, size=(), *args, **kwargs):
+    return _TensorInfo(dtype if isinstance(dtype, str) else "unknown", size)
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    """
+    Unpickler that never imports or calls anything from the checkpoint: torch's tensor rebuild
+    functions become shape/dtype records, storages are never loaded, and every other global is a stub.
+    """
+    SAFE_GLOBALS = {
+        ("collections", "OrderedDict"): collections.OrderedDict,
+        ("builtins", "set"): set,
+        ("builtins", "frozenset"): frozenset,
+        ("torch", "Size"): tuple,
+    }
+    TENSOR_REBUILDERS = {
+        "_rebuild_tensor": _rebuild_tensor,
+        "_rebuild_tensor_v2": _rebuild_tensor,
+        "_rebuild_parameter": _rebuild_parameter,
+        "_rebuild_parameter_with_state": _rebuild_parameter,
+        "_rebuild_meta_tensor_no_storage": _rebuild_tensor_without_storage,
+    }
+
+    def find_class(self, module, name):
+        if (module, name) in self.SAFE_GLOBALS:
+            return self.SAFE_GLOBALS[(module, name)]
+        if module == "_codecs" and name == "encode":
+            # Protocol 2 pickles encode bytes objects as _codecs.encode(str, "latin1")
+            return lambda text, encoding="utf-8", *args: text.encode(encoding)
+        if module == "torch._utils" and name in self.TENSOR_REBUILDERS:
+            return self.TENSOR_REBUILDERS[name]
+        if module == "torch" and name in TORCH_STORAGE_DTYPES:
+            return type(name, (_PickleStub,), {"dtype": TORCH_STORAGE_DTYPES[name]})
+        if module == "torch" and name in TORCH_DTYPES:
+            return TORCH_DTYPES[name]
+        return type(name, (_PickleStub,), {"__module__": module})
+
+    def persistent_load(self, pid):
+        # ('storage', storage_type, key, location, numel[, view_metadata]); the storage bytes are never read
+        if isinstance(pid, tuple) and len(pid) > 1 and pid[0] == "storage":
+            storage_type = pid[1]
+            if isinstance(storage_type, str):
+                return _TensorStorage(TORCH_DTYPES.get(storage_type, "unknown"))
+            return _TensorStorage(getattr(storage_type, "dtype", "unknown"))
+        return _PickleStub()
+
+def _collect_tensors(obj, prefix, tensors, depth=0):
+    if isinstance(obj, _TensorInfo):
+        tensors[prefix] = obj
+    elif isinstance(obj, dict) and depth < 8:
+        for key, value in obj.items():
+            _collect_tensors(value, f"{prefix}.{key}" if prefix else str(key), tensors, depth + 1)
+
+def _read_pickle_checkpoint(file_path):
+    """
+    Read a pickled PyTorch checkpoint without torch and without reading its tensor data.
+    Only the pickle (data.pkl in zip archives) is read. Returns (metadata_dict, tensors)
+    where tensors maps tensor name to _TensorInfo, in file order.
+    """
+    with _open_noatime(file_path) as f:
+        magic = f.read(4)
+        f.seek(0)
+        if magic == b"PK\x03\x04":
+            fmt = "PyTorch zip"
+            with zipfile.ZipFile(f) as archive:
+                member = next((info for info in archive.infolist()
+                               if info.filename == "data.pkl" or info.filename.endswith("/data.pkl")), None)
+                if member is None:
+                    raise ValueError("Zip archive has no data.pkl")
+                with archive.open(member) as stream:
+                    root = _CheckpointUnpickler(stream).load()
+                bytes_read = member.compress_size
+        elif magic[:1] == b"\x80":
+            # Legacy stream: magic number, protocol version and sys info pickles precede the object
+            fmt = "PyTorch legacy"
+            unpickler = _CheckpointUnpickler(f)
+            for _ in range(3):
+                unpickler.load()
+            root = unpickler.load()
+            bytes_read = f.tell()
+        else:
+            raise ValueError("Not a PyTorch pickle checkpoint")
+
+    # Lightning/SD checkpoints nest the weights under "state_dict"
+    state = root
+    if isinstance(root, dict) and isinstance(root.get("state_dict"), dict):
+        state = root["state_dict"]
+    tensors = collections.OrderedDict()
+    _collect_tensors(state, "", tensors)
+
+    metadata = {"format": fmt}
+    if isinstance(root, dict):
+        for key, value in root.items():
+            if isinstance(value, (str, int, float, bool)) and not isinstance(key, _PickleStub):
+                metadata[str(key)] = str(value)
+    _summarize_tensors(metadata, tensors)
+    return metadata, tensors, bytes_read
+
+def _summarize_tensors(metadata, tensors):
+    """Add dtype (or quantization type) counts and the parameter count to a metadata dict"""
+    dtype_counts = collections.Counter(info.dtype for info in tensors.values())
+    metadata["dtypes"] = ", ".join(f"{dtype} ({count})" for dtype, count in dtype_counts.most_common())
+    metadata["parameters"] = str(sum(info.numel() for info in tensors.values()))
+
+# GGUF metadata value types: (struct format, size) for fixed-size values
+GGUF_VALUE_FORMATS = {
+    0: ('<B', 1), 1: ('<b', 1), 2: ('<H', 2), 3: ('<h', 2), 4: ('<I', 4), 5: ('<i', 4),
+    6: ('<f', 4), 7: ('<?', 1), 10: ('<Q', 8), 11: ('<q', 8), 12: ('<d', 8)
+}
+GGUF_TYPE_STRING = 8
+GGUF_TYPE_ARRAY = 9
+
+# ggml tensor types as stored in the GGUF tensor info table
+GGML_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 6: "Q5_0", 7: "Q5_1", 8: "Q8_0", 9: "Q8_1",
+    10: "Q2_K", 11: "Q3_K", 12: "Q4_K", 13: "Q5_K", 14: "Q6_K", 15: "Q8_K",
+    16: "IQ2_XXS", 17: "IQ2_XS", 18: "IQ3_XXS", 19: "IQ1_S", 20: "IQ4_NL", 21: "IQ3_S",
+    22: "IQ2_S", 23: "IQ4_XS", 24: "I8", 25: "I16", 26: "I32", 27: "I64", 28: "F64",
+    29: "IQ1_M", 30: "BF16", 34: "TQ1_0", 35: "TQ2_0"
+}
+
+# Arrays longer than this (tokenizer vocabularies) are summarized instead of returned
+GGUF_MAX_ARRAY_ITEMS = 16
+
+class _GGUFStream:
+    """Sequential little-endian reader over a GGUF header; counts the bytes it consumes"""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+        self.version = 3
+
+    def read(self, size):
+        data = self.f.read(size)
+        if len(data) < size:
+            raise ValueError("Unexpected end of GGUF header")
+        self.bytes_read += size
+        return data
+
+    def unpack(self, fmt, size):
+        return struct.unpack(fmt, self.read(size))[0]
+
+    def count(self):
+        # Version 1 used 32-bit counts and string lengths
+        return self.unpack('<I', 4) if self.version == 1 else self.unpack('<Q', 8)
+
+    def string(self):
+        return self.read(self.count()).decode('utf-8', errors='replace')
+
+    def skip(self, size):
+        self.f.seek(size, os.SEEK_CUR)
+        self.bytes_read += size
+
+    def value(self, value_type):
+        if value_type in GGUF_VALUE_FORMATS:
+            return self.unpack(*GGUF_VALUE_FORMATS[value_type])
+        if value_type == GGUF_TYPE_STRING:
+            return self.string()
+        if value_type == GGUF_TYPE_ARRAY:
+            item_type = self.unpack('<I', 4)
+            length = self.count()
+            if length <= GGUF_MAX_ARRAY_ITEMS:
+                return [self.value(item_type) for _ in range(length)]
+            if item_type in GGUF_VALUE_FORMATS:
+                self.skip(GGUF_VALUE_FORMATS[item_type][1] * length)
+            elif item_type == GGUF_TYPE_STRING:
+                for _ in range(length):
+                    self.skip(self.count())
+            else:
+                for _ in range(length):
+                    self.value(item_type)
+            return f"[{length} items]"
+        raise ValueError(f"Unknown GGUF value type {value_type}")
+
+def _read_gguf(file_path):
+    """
+    Read a GGUF file's key/value metadata and tensor info table, stopping before the tensor data.
+    Returns (metadata_dict, tensors, bytes_read) like _read_pickle_checkpoint.
+    """
+    with _open_noatime(file_path) as f:
+        stream = _GGUFStream(f)
+        if stream.read(4) != b"GGUF":
+            raise ValueError("Not a GGUF file")
+        stream.version = stream.unpack('<I', 4)
+        tensor_count = stream.count()
+        kv_count = stream.count()
+
+        metadata = {"format": f"GGUF v{stream.version}"}
+        for _ in range(kv_count):
+            key = stream.string()
+            value = stream.value(stream.unpack('<I', 4))
+            metadata[key] = value if isinstance(value, str) else json.dumps(value)
+
+        tensors = collections.OrderedDict()
+        for _ in range(tensor_count):
+            name = stream.string()
+            n_dims = stream.unpack('<I', 4)
+            # Version 1 stored dimensions as 32-bit values, like its counts
+            dim_format, dim_size = ('I', 4) if stream.version == 1 else ('Q', 8)
+            dims = struct.unpack(f'<{n_dims}{dim_format}', stream.read(dim_size * n_dims))
+            ggml_type = stream.unpack('<I', 4)
+            stream.read(8)  # data offset
+            # ggml lists the fastest-varying dimension first; report shapes outermost-first like torch
+            tensors[name] = _TensorInfo(GGML_TYPES.get(ggml_type, f"type {ggml_type}"), list(reversed(dims)))
+
+    _summarize_tensors(metadata, tensors)
+    return metadata, tensors, stream.bytes_read
+
+# Readers for formats whose header is a tensor table: (reader, description)
+TENSOR_TABLE_READERS = {ext: (_read_pickle_checkpoint, "checkpoint pickle") for ext in PICKLE_CHECKPOINT_EXTENSIONS}
+TENSOR_TABLE_READERS['.gguf'] = (_read_gguf, "GGUF header")
+
+def _tensor_table_reader(file_path):
+    """(reader, description) for a pickled checkpoint or GGUF file, else None"""
+    return TENSOR_TABLE_READERS.get(os.path.splitext(file_path)[1].lower())
+
+def _read_tensor_table_header(file_path):
+    """
+    Pickle-checkpoint and GGUF counterpart of _read_safetensor_header.
+    Returns (metadata_dict, tensor_keys_list) or raises exception on error.
+    """
+    metadata, tensors = _read_tensor_table(file_path)
+    return metadata, list(tensors)
+
+def _read_tensor_table(file_path):
+    """(metadata_dict, tensor name -> _TensorInfo) of a pickled checkpoint or GGUF file, with metrics"""
+    reader, description = _tensor_table_reader(file_path)
+    start = time.perf_counter()
+    try:
+        metadata, tensors, bytes_read = reader(file_path)
+    except Exception as e:
+        METRICS.inc("model_manager_header_parse_errors_total")
+        raise Exception(f"Failed to read {description}: {str(e)}")
+    METRICS.inc("model_manager_header_parse_bytes_total", bytes_read)
+    if IO_SCHEDULER.is_background():
+        IO_SCHEDULER.throttle(ops=1, nbytes=bytes_read)
+    METRICS.observe("model_manager_header_parse_duration_seconds", time.perf_counter() - start)
+    return metadata, tensors
+
+def _read_model_header(file_path):
+    """Header of a .safetensors, GGUF or pickled checkpoint file, chosen by extension"""
+    if _tensor_table_reader(file_path):
+        return _read_tensor_table_header(file_path)
+    return _read_safetensor_header(file_path)
+
+def _safetensor_tensor_infos(header):
+    """Tensor name -> _TensorInfo from a parsed safetensors header"""
+    return collections.OrderedDict(
+        (name, _TensorInfo(entry.get("dtype", "unknown"), entry.get("shape", [])))
+        for name, entry in header.items() if name != '__metadata__'
+    )
+
+def _read_model_tensors(file_path):
+    """Like _read_model_header, but with tensor name -> _TensorInfo instead of the key list"""
+    if _tensor_table_reader(file_path):
+        return _read_tensor_table(file_path)
+    header = _read_safetensor_header_json(file_path)
+    return header.get('__metadata__', {}), _safetensor_tensor_infos(header)
+
+# Parsed headers keyed by path; an entry is reused while the file's size and mtime are unchanged.
+# Least recently used entries are dropped once the tensor key lists pass HEADER_CACHE_MAX_BYTES.
+HEADER_CACHE_MAX_BYTES = 128 * 1024 * 1024
+_header_cache = collections.OrderedDict()
+_header_cache_bytes = 0
+_header_cache_lock = threading.Lock()
+
+def _header_cache_entry_size(entry):
+    """Rough in-memory size of a cache entry: its key strings plus per-object overhead"""
+    tensor_keys = entry[2]
+    return 256 + sum(len(key) + 64 for key in tensor_keys)
+
+def _header_cache_get(file_path, signature):
+    """The cached (metadata, tensor_keys) for file_path if it still matches signature, else None"""
+    with _header_cache_lock:
+        cached = _header_cache.get(file_path)
+        if cached is None or cached[0] != signature:
+            return None
+        _header_cache.move_to_end(file_path)
+    return cached[1], cached[2]
+
+def _header_cache_store(file_path, entry):
+    global _header_cache_bytes
+    size = _header_cache_entry_size(entry)
+    with _header_cache_lock:
+        previous = _header_cache.pop(file_path, None)
+        if previous is not None:
+            _header_cache_bytes -= _header_cache_entry_size(previous)
+        _header_cache[file_path] = entry
+        _header_cache_bytes += size
+        while _header_cache_bytes > HEADER_CACHE_MAX_BYTES and len(_header_cache) > 1:
+            _, evicted = _header_cache.popitem(last=False)
+            _header_cache_bytes -= _header_cache_entry_size(evicted)
+
+def _header_cache_clear():
+    global _header_cache_bytes
+    with _header_cache_lock:
+        _header_cache.clear()
+        _header_cache_bytes = 0
+
+def _read_model_header_cached(file_path, stat_result=None):
+    """
+    Same as _read_model_header, but served from the in-memory header cache
+    when the file has not changed since it was last parsed.
+    """
+    if stat_result is None:
+        stat_result = os.stat(file_path)
+    signature = (stat_result.st_size, stat_result.st_mtime_ns)
+
+    cached = _header_cache_get(file_path, signature)
+    if cached is not None:
+        return cached
+
+    metadata, tensor_keys = _read_model_header(file_path)
+    _header_cache_store(file_path, (signature, metadata, tensor_keys))
+    return metadata, tensor_keys
+
+def _read_model_tensors_cached(file_path, stat_result=None):
+    """
+    _read_model_tensors that also fills the header cache, for callers that need tensor
+    shapes as well as the header: the file is read once instead of twice
+    """
+    if stat_result is None:
+        stat_result = os.stat(file_path)
+    metadata, tensors = _read_model_tensors(file_path)
+    _header_cache_store(file_path, ((stat_result.st_size, stat_result.st_mtime_ns), metadata, list(tensors)))
+    return metadata, tensors
+
+# Bytes per element, by safetensors dtype name
+DTYPE_SIZES = {
+    "F64": 8, "F32": 4, "F16": 2, "BF16": 2, "I64": 8, "I32": 4, "I16": 2, "I8": 1, "U8": 1,
+    "BOOL": 1, "F8_E4M3": 1, "F8_E5M2": 1
+}
+
+# Sharded checkpoints (model.safetensors.index.json, pytorch_model.bin.index.json, ...)
+SHARD_INDEX_SUFFIX = ".index.json"
+DIFFUSERS_INDEX_FILE = "model_index.json"
+
+# Aggregated sharded models and diffusers pipelines keyed by index path; reused while unchanged
+_aggregate_cache = {}
+_aggregate_cache_lock = threading.Lock()
+
+def _read_shard_tensors(file_path):
+    """Tensor name -> _TensorInfo for one shard (safetensors, GGUF or pickled checkpoint)"""
+    return _read_model_tensors(file_path)[1]
+
+def _read_model_config(directory):
+    """Model class from a config.json next to the weights (transformers or diffusers), or \"\" """
+    try:
+        with open(os.path.join(directory, "config.json"), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return ""
+    if not isinstance(config, dict):
+        return ""
+    architectures = config.get("architectures")
+    if isinstance(architectures, list) and architectures:
+        return str(architectures[0])
+    return str(config.get("_class_name", ""))
+
+def _aggregate_sharded_model(index_path):
+    """
+    Present a sharded checkpoint as one model using its index file. The tensor list comes
+    from the index's weight_map and sizes from stat calls; only the first shard's header is
+    read, to get the dtype and bytes per parameter. Returns None if this is not a shard index.
+    """
+    stat_result = os.stat(index_path)
+    signature = (stat_result.st_size, stat_result.st_mtime_ns)
+    with _aggregate_cache_lock:
+        cached = _aggregate_cache.get(index_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or not isinstance(index.get("weight_map"), dict):
+        return None
+
+    directory = os.path.dirname(index_path)
+    weight_map = index["weight_map"]
+    shards = sorted(set(weight_map.values()))
+    shard_size = 0
+    missing = []
+    for shard in shards:
+        try:
+            shard_size += os.stat(os.path.join(directory, shard)).st_size
+        except OSError:
+            missing.append(shard)
+    declared_size = (index.get("metadata") or {}).get("total_size")
+    total_size = int(declared_size) if declared_size else shard_size
+
+    result = {
+        "shards": shards,
+        "missing_shards": missing,
+        "tensor_keys": list(weight_map),
+        "total_size": total_size,
+        "size_on_disk": shard_size,
+        "architecture": _read_model_config(directory),
+        "header_metadata": {},
+        "dtypes": "",
+        "parameters": None
+    }
+    present = [shard for shard in shards if shard not in missing]
+    if present:
+        try:
+            # One parse of the first shard gives both the tensor table and the metadata
+            metadata, tensors = _read_model_tensors_cached(os.path.join(directory, present[0]))
+            dtype_counts = collections.Counter(info.dtype for info in tensors.values())
+            result["dtypes"] = ", ".join(dtype for dtype, _ in dtype_counts.most_common())
+            # Scale the shard's bytes-per-parameter to the whole model
+            elements = sum(info.numel() for info in tensors.values())
+            data_bytes = sum(info.numel() * DTYPE_SIZES.get(info.dtype, 0) for info in tensors.values())
+            if elements and data_bytes:
+                result["parameters"] = int(total_size * elements / data_bytes)
+            if present[0].lower().endswith('.safetensors'):
+                result["header_metadata"] = metadata
+        except Exception as e:
+            result["header_metadata"] = {"error": f"Could not read shard header: {str(e)}"}
+
+    with _aggregate_cache_lock:
+        _aggregate_cache[index_path] = (signature, result)
+    return result
+
+def _aggregate_diffusers_pipeline(directory):
+    """
+    Summarize a diffusers tree from model_index.json: pipeline class, components and
+    aggregated size and parameter count. Returns None if the index is missing or invalid.
+    Cached until model_index.json or one of its component directories changes.
+    """
+    index_path = os.path.join(directory, DIFFUSERS_INDEX_FILE)
     try:
-        with open(file_path, 'rb') as f:
-            # Read first 8 bytes to get header length
-            header_size_bytes = f.read(8)
-            if len(header_size_bytes) < 8:
-                raise ValueError("File too small to be a valid safetensors file")
+        stat_result = os.stat(index_path)
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict):
+        return None
+
+    # Adding or removing weights changes the component directory's mtime
+    signature = [stat_result.st_size, stat_result.st_mtime_ns]
+    for name in sorted(index):
+        try:
+            signature.append(os.stat(os.path.join(directory, name)).st_mtime_ns)
+        except (OSError, TypeError, ValueError):
+            signature.append(None)
+    signature = tuple(signature)
+    with _aggregate_cache_lock:
+        cached = _aggregate_cache.get(index_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    components = {}
+    total_size = 0
+    parameters = 0
+    for name, spec in sorted(index.items()):
+        if name.startswith("_") or not isinstance(spec, list) or len(spec) != 2 or spec[1] is None:
+            continue
+        component_dir = os.path.join(directory, name)
+        component = {"library": spec[0], "class": spec[1], "size": 0, "parameters": None}
+        weight_files = []
+        for root, _, files in os.walk(component_dir):
+            for file in files:
+                try:
+                    component["size"] += os.stat(os.path.join(root, file)).st_size
+                except OSError:
+                    continue
+                if file.endswith(SHARD_INDEX_SUFFIX) or file.lower().endswith(HEADER_FILE_EXTENSIONS):
+                    weight_files.append(os.path.join(root, file))
+
+        # One index (sharded) or one weights file per component; fp16 variants are skipped if both exist
+        indexes = sorted(path for path in weight_files if path.endswith(SHARD_INDEX_SUFFIX))
+        singles = sorted((path for path in weight_files if not path.endswith(SHARD_INDEX_SUFFIX)),
+                         key=lambda path: (".fp16." in path, not path.endswith('.safetensors'), path))
+        try:
+            if indexes:
+                aggregate = _aggregate_sharded_model(indexes[0])
+                component["parameters"] = aggregate["parameters"] if aggregate else None
+            elif singles:
+                tensors = _read_model_tensors_cached(singles[0])[1]
+                component["parameters"] = sum(info.numel() for info in tensors.values())
+        except Exception as e:
+            component["error"] = str(e)
+
+        total_size += component["size"]
+        parameters += component["parameters"] or 0
+        components[name] = component
+
+    result = {
+        "pipeline_class": str(index.get("_class_name", "")),
+        "diffusers_version": str(index.get("_diffusers_version", "")),
+        "components": components,
+        "total_size": total_size,
+        "parameters": parameters
+    }
+    with _aggregate_cache_lock:
+        _aggregate_cache[index_path] = (signature, result)
+    return result
 
-            # Unpack as little-endian unsigned 64-bit integer
-            header_length = struct.unpack('<Q', header_size_bytes)[0]
+def _scan_folder_files(folder_path, recursive=False):
+    """Sorted (relative path, size, mtime_ns) tuples for the files in a folder"""
+    files = []
+    pending = [(folder_path, "")]
+    while pending:
+        current, prefix = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            st = entry.stat()
+                            files.append((prefix + entry.name, st.st_size, st.st_mtime_ns))
+                        elif recursive and entry.is_dir(follow_symlinks=False):
+                            pending.append((entry.path, prefix + entry.name + os.sep))
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+    files.sort()
+    return files
+
+def _folder_digest(files):
+    """Digest over a folder's (name, size, mtime) tuples; equal digests mean no file changed"""
+    h = hashlib.sha1()
+    for name, size, mtime_ns in files:
+        h.update(f"{name}\0{size}\0{mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return h.hexdigest()
+
+# Derived state (link status, folder snapshots) is kept next to the config file in SQLite,
+# so refreshing it updates a few rows instead of re-serializing model_manager_config.json
+STATE_DB_FILE = "model_manager_state.db"
+
+class ModelManagerStateStore:
+    """
+    Incremental store for state derived from the filesystem.
+
+    The config JSON keeps user configuration only (repositories, installations, links).
+    Link status and folder snapshots are written here row by row; rows whose content
+    did not change are left alone. WAL mode lets reads proceed while a refresh writes.
+    """
+
+    def __init__(self, db_file=STATE_DB_FILE):
+        self.db_file = db_file
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS link_status (
+                    install_id INTEGER NOT NULL,
+                    repo_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    PRIMARY KEY (install_id, repo_id)
+                );
+                CREATE TABLE IF NOT EXISTS install_status (
+                    install_id INTEGER PRIMARY KEY,
+                    total_links INTEGER NOT NULL,
+                    link_mode TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS folder_snapshots (
+                    repo_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    file_count INTEGER NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    is_standard INTEGER NOT NULL,
+                    digest TEXT,
+                    PRIMARY KEY (repo_id, name)
+                );
+                CREATE TABLE IF NOT EXISTS file_access (
+                    path TEXT PRIMARY KEY,
+                    last_access REAL NOT NULL,
+                    access_count INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS folder_files (
+                    repo_id INTEGER NOT NULL,
+                    folder TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    PRIMARY KEY (repo_id, folder, name)
+                );
+            """)
+            # Stores created before per-file change detection have no digest column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(folder_snapshots)")}
+            if "digest" not in columns:
+                conn.execute("ALTER TABLE folder_snapshots ADD COLUMN digest TEXT")
+            self._conn = conn
+        return self._conn
+
+    def set_install_link_status(self, install_id, repo_statuses, total_links, link_mode):
+        """Store the per-repository status of one installation; repositories not given are dropped"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO link_status (install_id, repo_id, status) VALUES (?, ?, ?) "
+                    "ON CONFLICT (install_id, repo_id) DO UPDATE SET status = excluded.status "
+                    "WHERE status != excluded.status",
+                    [(install_id, repo_id, json.dumps(status, sort_keys=True)) for repo_id, status in repo_statuses.items()]
+                )
+                placeholders = ",".join("?" * len(repo_statuses))
+                conn.execute(
+                    f"DELETE FROM link_status WHERE install_id = ? AND repo_id NOT IN ({placeholders})",
+                    [install_id, *repo_statuses]
+                )
+                conn.execute(
+                    "INSERT INTO install_status (install_id, total_links, link_mode) VALUES (?, ?, ?) "
+                    "ON CONFLICT (install_id) DO UPDATE SET total_links = excluded.total_links, link_mode = excluded.link_mode "
+                    "WHERE total_links != excluded.total_links OR link_mode != excluded.link_mode",
+                    (install_id, total_links, link_mode)
+                )
+
+    def get_install_link_status(self, install_id):
+        """(repo_id -> status, total_links, link_mode) for an installation, or None if never refreshed"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT total_links, link_mode FROM install_status WHERE install_id = ?", (install_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            statuses = {
+                repo_id: json.loads(status)
+                for repo_id, status in conn.execute(
+                    "SELECT repo_id, status FROM link_status WHERE install_id = ?", (install_id,)
+                )
+            }
+        return statuses, row[0], row[1]
+
+    def get_folder_snapshot(self, repo_id):
+        """Folders recorded at the last change check, in the shape of get_repository_folders()['folders']"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT name, path, file_count, size_bytes, is_standard, digest FROM folder_snapshots WHERE repo_id = ?",
+                (repo_id,)
+            ).fetchall()
+        return [
+            {"name": name, "path": path, "file_count": file_count, "size_bytes": size_bytes,
+             "exists": True, "is_standard": bool(is_standard), "digest": digest}
+            for name, path, file_count, size_bytes, is_standard, digest in rows
+        ]
 
-            # Read the JSON header
-            header_data = f.read(header_length)
-            if len(header_data) < header_length:
-                raise ValueError("Incomplete header data")
+    def set_folder_snapshot(self, repo_id, folders):
+        """Replace a repository's snapshot, touching only the folders that changed"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO folder_snapshots (repo_id, name, path, file_count, size_bytes, is_standard, digest) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (repo_id, name) DO UPDATE SET path = excluded.path, file_count = excluded.file_count, "
+                    "size_bytes = excluded.size_bytes, is_standard = excluded.is_standard, digest = excluded.digest "
+                    "WHERE path != excluded.path OR file_count != excluded.file_count "
+                    "OR size_bytes != excluded.size_bytes OR is_standard != excluded.is_standard "
+                    "OR digest IS NOT excluded.digest",
+                    [(repo_id, f["name"], f["path"], f["file_count"], f["size_bytes"], int(f["is_standard"]), f.get("digest"))
+                     for f in folders]
+                )
+                placeholders = ",".join("?" * len(folders))
+                names = [f["name"] for f in folders]
+                conn.execute(
+                    f"DELETE FROM folder_snapshots WHERE repo_id = ? AND name NOT IN ({placeholders})",
+                    [repo_id, *names]
+                )
+                conn.execute(
+                    f"DELETE FROM folder_files WHERE repo_id = ? AND folder NOT IN ({placeholders})",
+                    [repo_id, *names]
+                )
 
-            # Parse JSON header
-            header = json.loads(header_data.decode('utf-8'))
+    def get_folder_files(self, repo_id, folder):
+        """relative path -> (size, mtime_ns) for a folder at the last change check"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT name, size_bytes, mtime_ns FROM folder_files WHERE repo_id = ? AND folder = ?",
+                (repo_id, folder)
+            ).fetchall()
+        return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
 
-            # Extract metadata (stored in special __metadata__ key)
-            metadata = header.get('__metadata__', {})
+    def update_folder_files(self, repo_id, folder, upserts, deletes):
+        """Apply a folder's file-level diff: upserts are (name, size, mtime_ns) tuples, deletes are names"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO folder_files (repo_id, folder, name, size_bytes, mtime_ns) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (repo_id, folder, name) DO UPDATE SET size_bytes = excluded.size_bytes, "
+                    "mtime_ns = excluded.mtime_ns",
+                    [(repo_id, folder, name, size, mtime_ns) for name, size, mtime_ns in upserts]
+                )
+                conn.executemany(
+                    "DELETE FROM folder_files WHERE repo_id = ? AND folder = ? AND name = ?",
+                    [(repo_id, folder, name) for name in deletes]
+                )
 
-            # Extract tensor keys (all keys except __metadata__)
-            tensor_keys = [k for k in header.keys() if k != '__metadata__']
+    def record_file_access(self, path):
+        """Log that a model file was used through the manager (inspected, warmed)"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO file_access (path, last_access, access_count) VALUES (?, ?, 1) "
+                    "ON CONFLICT (path) DO UPDATE SET last_access = excluded.last_access, "
+                    "access_count = access_count + 1",
+                    (path, time.time())
+                )
 
-            return metadata, tensor_keys
+    def get_file_access(self):
+        """path -> (last access timestamp, access count)"""
+        with self._lock:
+            rows = self._connect().execute("SELECT path, last_access, access_count FROM file_access").fetchall()
+        return {path: (last_access, count) for path, last_access, count in rows}
 
+    def move_file_access(self, old_path, new_path):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE OR REPLACE file_access SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def delete_repository(self, repo_id):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM link_status WHERE repo_id = ?", (repo_id,))
+                conn.execute("DELETE FROM folder_snapshots WHERE repo_id = ?", (repo_id,))
+                conn.execute("DELETE FROM folder_files WHERE repo_id = ?", (repo_id,))
+
+    def delete_installation(self, install_id):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM link_status WHERE install_id = ?", (install_id,))
+                conn.execute("DELETE FROM install_status WHERE install_id = ?", (install_id,))
+
+    def import_legacy_state(self, data):
+        """
+        Move link_status/folder_snapshots left in an older config file into the store.
+        Returns True if the config data was changed and should be saved.
+        """
+        link_status = data.pop("link_status", None)
+        folder_snapshots = data.pop("folder_snapshots", None)
+        if link_status is None and folder_snapshots is None:
+            return False
+
+        for install_key, status_data in (link_status or {}).items():
+            if not install_key.isdigit() or not isinstance(status_data, dict):
+                continue
+            repo_statuses = {
+                int(key): status for key, status in status_data.items()
+                if key.isdigit() and isinstance(status, dict)
+            }
+            self.set_install_link_status(
+                int(install_key), repo_statuses,
+                status_data.get("_total_links", 0), status_data.get("_link_mode", LINK_MODE_SYMLINK)
+            )
+        for repo_key, folders in (folder_snapshots or {}).items():
+            # Only the list format written by detect_repository_changes can be carried over
+            if repo_key.isdigit() and isinstance(folders, list):
+                self.set_folder_snapshot(int(repo_key), folders)
+        return True
+
+STATE_STORE = ModelManagerStateStore()
+
+# Header reads for listings go through a shared pool so network round trips overlap;
+# the size is the "header_read_concurrency" config setting
+DEFAULT_HEADER_READ_CONCURRENCY = 8
+_header_pool = None
+_header_pool_size = 0
+_header_pool_lock = threading.Lock()
+
+def _read_model_header_or_error(file_path, stat_result=None):
+    try:
+        return _read_model_header_cached(file_path, stat_result)
     except Exception as e:
-        raise Exception(f"Failed to read safetensor header: {str(e)}")
+        return e
+
+def _read_model_headers(files, concurrency=DEFAULT_HEADER_READ_CONCURRENCY):
+    """
+    Read the headers of many files at once. files is a list of (path, stat_result or None).
+    Returns, in the same order, (metadata, tensor_keys) per file, or the exception raised for it.
+    """
+    global _header_pool, _header_pool_size
+    if concurrency <= 1 or len(files) <= 1:
+        return [_read_model_header_or_error(path, stat_result) for path, stat_result in files]
+
+    with _header_pool_lock:
+        if _header_pool is None or _header_pool_size != concurrency:
+            if _header_pool is not None:
+                _header_pool.shutdown(wait=False)
+            _header_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="header-read")
+            _header_pool_size = concurrency
+        pool = _header_pool
+    return list(pool.map(lambda item: _read_model_header_or_error(*item), files))
+
+# Header prefetch defaults; override with the "header_prefetch" config setting
+HEADER_PREFETCH_DEFAULTS = {
+    "enabled": True,
+    "max_files": 200,                 # headers read per browse
+    "max_bytes": 64 * 1024 * 1024     # per browse, counted as one HEADER_READ_BLOCK per file read
+}
+
+class HeaderPrefetcher:
+    """
+    Warms the header cache for the directories a user is likely to open next.
+
+    After a browse listing, one background thread (see BackgroundIOScheduler) reads the headers in the listed
+    subdirectories and in the sibling folders. It waits while a foreground request is
+    being served, a newer browse replaces its work, and each browse has a file/byte budget.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.job = None
+        self.generation = 0
+        self.foreground = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def foreground_started(self):
+        with self.lock:
+            self.foreground += 1
+            self.idle.clear()
+
+    def foreground_finished(self):
+        with self.lock:
+            self.foreground = max(0, self.foreground - 1)
+            if not self.foreground:
+                self.idle.set()
+
+    def schedule(self, directory, subdirectories, boundary=None, settings=None):
+        """
+        Prefetch headers in subdirectories, then in directory's siblings.
+        Siblings are skipped when directory is the boundary (or the filesystem root).
+        """
+        settings = dict(HEADER_PREFETCH_DEFAULTS, **(settings or {}))
+        if not settings["enabled"]:
+            return
+        with self.lock:
+            self.generation += 1
+            self.job = (self.generation, directory, list(subdirectories), boundary, settings)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._worker, name="header-prefetch", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def _worker(self):
+        IO_SCHEDULER.enter_background()
+        while True:
+            self.wakeup.wait()
+            with self.lock:
+                job, self.job = self.job, None
+                if job is None:
+                    self.wakeup.clear()
+                    continue
+            try:
+                self._run(*job)
+            except Exception as e:
+                print(f"Error prefetching headers: {e}")
+
+    def _superseded(self, generation):
+        return self.generation != generation
+
+    def _sibling_directories(self, directory, boundary):
+        parent = os.path.dirname(directory)
+        if directory == boundary or parent == directory or parent == os.sep:
+            return []
+        if boundary and parent != boundary and not parent.startswith(boundary + os.sep):
+            return []
+        try:
+            with os.scandir(parent) as entries:
+                return sorted(
+                    entry.path for entry in entries
+                    if entry.path != directory and not entry.name.startswith('.') and entry.is_dir()
+                )
+        except OSError:
+            return []
+
+    def _run(self, generation, directory, subdirectories, boundary, settings):
+        files_read = 0
+        bytes_read = 0
+        for folder in subdirectories + self._sibling_directories(directory, boundary):
+            IO_SCHEDULER.throttle()
+            try:
+                with os.scandir(folder) as entries:
+                    candidates = sorted(
+                        entry.path for entry in entries
+                        if entry.name.lower().endswith(HEADER_FILE_EXTENSIONS)
+                    )
+            except OSError:
+                continue
+
+            for path in candidates:
+                # Yield to foreground requests; a newer browse replaces this job
+                self.idle.wait()
+                if self._superseded(generation):
+                    return
+                IO_SCHEDULER.throttle()
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                if _header_cache_get(path, (stat_result.st_size, stat_result.st_mtime_ns)) is not None:
+                    continue
+
+                try:
+                    _read_model_header_cached(path, stat_result)
+                except Exception:
+                    pass
+                files_read += 1
+                bytes_read += min(stat_result.st_size, HEADER_READ_BLOCK)
+                METRICS.inc("model_manager_header_prefetch_files_total")
+                if files_read >= settings["max_files"] or bytes_read >= settings["max_bytes"]:
+                    return
+
+PREFETCHER = HeaderPrefetcher()
 
 # Configuration file for storing repositories and installations
 CONFIG_FILE = "model_manager_config.json"
@@ -51,9 +1301,36 @@ CONFIG_FILE = "model_manager_config.json"
 class ModelManagerConfig:
     def __init__(self):
         self.config_file = CONFIG_FILE
+        self.state = STATE_STORE
         self.load_config()
+
+    @classmethod
+    def from_data(cls, data):
+        """Config around data received from a controller; the config file is never read or written"""
+        config = cls.__new__(cls)
+        config.config_file = None
+        config.state = STATE_STORE
+        config.data = data
+        return config
     
+    def agent_data(self):
+        """The part of the config agents need (custom folders); node tokens and the rest stay here"""
+        return {"enabled_custom_folders": self.data.get("enabled_custom_folders", {})}
+
+    def public_data(self):
+        """The config as served to the UI: agent node tokens are left out"""
+        nodes = self.data.get("nodes")
+        if not nodes:
+            return self.data
+        redacted = {name: {key: value for key, value in node.items() if key != "token"} for name, node in nodes.items()}
+        return dict(self.data, nodes=redacted)
+
     def load_config(self):
+        start = time.perf_counter()
+        self._load_config_file()
+        METRICS.observe("model_manager_config_load_duration_seconds", time.perf_counter() - start)
+
+    def _load_config_file(self):
         if os.path.exists(self.config_file):
             try:
                 with open(self.config_file, 'r') as f:
@@ -61,17 +1338,25 @@ class ModelManagerConfig:
             except Exception as e:
                 print(f"Error loading config: {e}")
                 self.data = self.get_default_config()
+                return
+            # Older versions kept derived state in the config file itself
+            if self.state.import_legacy_state(self.data):
+                self.save_config()
         else:
             self.data = self.get_default_config()
     
     def save_config(self):
+        start = time.perf_counter()
         try:
             with open(self.config_file, 'w') as f:
                 json.dump(self.data, f, indent=2)
+            DASHBOARD.publish("config", None, {"digest": _config_digest(self.data)})
             return True
         except Exception as e:
             print(f"Error saving config: {e}")
             return False
+        finally:
+            METRICS.observe("model_manager_config_save_duration_seconds", time.perf_counter() - start)
     
     def get_default_config(self):
         return {
@@ -96,12 +1381,10 @@ class ModelManagerConfig:
                 }
             ],
             "links": {},
-            "link_status": {},
-            "folder_snapshots": {},
             "enabled_custom_folders": {}  # repo_id -> [list of enabled custom folder names]
         }
     
-    def add_repository(self, name, path, description=""):
+    def add_repository(self, name, path, description="", node=None):
         repo = {
             "id": len(self.data["repositories"]) + 1,
             "name": name,
@@ -110,10 +1393,14 @@ class ModelManagerConfig:
             "created": datetime.datetime.now().isoformat(),
             "exists": os.path.exists(path)
         }
+        if node:
+            # Lives on an agent node; refresh_all_paths asks the agent whether it exists
+            repo["node"] = node
+            repo["exists"] = False
         self.data["repositories"].append(repo)
         return repo
     
-    def add_comfyui_installation(self, name, path, description=""):
+    def add_comfyui_installation(self, name, path, description="", node=None):
         installation = {
             "id": len(self.data["comfyui_installations"]) + 1,
             "name": name,
@@ -122,6 +1409,9 @@ class ModelManagerConfig:
             "created": datetime.datetime.now().isoformat(),
             "exists": os.path.exists(path)
         }
+        if node:
+            installation["node"] = node
+            installation["exists"] = False
         self.data["comfyui_installations"].append(installation)
         return installation
     
@@ -158,63 +1448,90 @@ class ModelManagerConfig:
         # Clean up links
         for install_id in list(self.data["links"].keys()):
             self.data["links"][install_id] = [r for r in self.data["links"][install_id] if r != repo_id]
+        self.state.delete_repository(repo_id)
     
     def delete_comfyui_installation(self, install_id):
         self.data["comfyui_installations"] = [i for i in self.data["comfyui_installations"] if i["id"] != install_id]
         # Clean up links
         if str(install_id) in self.data["links"]:
             del self.data["links"][str(install_id)]
+        self.state.delete_installation(install_id)
     
     def check_path_exists(self, path):
         return os.path.exists(path)
     
     def refresh_all_paths(self):
-        for repo in self.data["repositories"]:
-            repo["exists"] = os.path.exists(repo["path"])
-        for install in self.data["comfyui_installations"]:
-            install["exists"] = os.path.exists(install["path"])
+        remote = {}  # node -> entities to check on that node
+        previous = {id(entity): entity.get("exists") for entity in self.data["repositories"] + self.data["comfyui_installations"]}
+        for entity in self.data["repositories"] + self.data["comfyui_installations"]:
+            if entity.get("node"):
+                remote.setdefault(entity["node"], []).append(entity)
+            else:
+                entity["exists"] = os.path.exists(entity["path"])
+
+        nodes = list(remote)
+        results = CLUSTER.fan_out(self, [(node, "paths_exist", {"paths": [e["path"] for e in remote[node]]})
+                                         for node in nodes])
+        for node, result in zip(nodes, results):
+            for entity in remote[node]:
+                # An unreachable node reports its paths as missing
+                entity["exists"] = not isinstance(result, AgentError) and result.get(entity["path"], False)
+
+        for kind, entities in (("repository", self.data["repositories"]), ("installation", self.data["comfyui_installations"])):
+            for entity in entities:
+                if entity["exists"] != previous[id(entity)]:
+                    DASHBOARD.publish("exists", (kind, entity["id"]), {"kind": kind, "id": entity["id"], "exists": entity["exists"]})
     
     def update_all_link_status(self, linker):
-        """Update link status for all installations"""
-        if "link_status" not in self.data:
-            self.data["link_status"] = {}
-        
+        """
+        Update link status for all installations (stored in the state store, not the config).
+        Installations on agent nodes are checked by their agents, concurrently.
+        """
+        remote = []
         for install in self.data["comfyui_installations"]:
-            install_id = str(install["id"])
-            self.data["link_status"][install_id] = {}
-            
             # Check each linked repository
-            linked_repos = self.data["links"].get(install_id, [])
-            total_links = 0
-            
-            for repo_id in linked_repos:
-                repo = next((r for r in self.data["repositories"] if r["id"] == repo_id), None)
-                if repo:
-                    status = linker.get_link_status(repo["path"], install["path"])
-                    self.data["link_status"][install_id][str(repo_id)] = status
-                    
-                    # Count total linked files
-                    for folder_status in status.values():
-                        total_links += folder_status.get("linked_count", 0)
-            
-            # Store total count for easy access
-            self.data["link_status"][install_id]["_total_links"] = total_links
+            linked_repos = self.get_linked_repositories(install["id"])
+            if install.get("node"):
+                remote.append((install, linked_repos))
+                continue
+            repo_statuses = {repo["id"]: _link_status_for(linker, install, repo, self) for repo in linked_repos}
+            self._store_link_status(install, repo_statuses)
+
+        results = CLUSTER.fan_out(self, [
+            (install["node"], "link_status", {"install": install, "repos": repos, "config_data": self.agent_data()})
+            for install, repos in remote
+        ])
+        for (install, _), result in zip(remote, results):
+            if isinstance(result, AgentError):
+                # Keep the last known status of an unreachable node
+                _log_event(logging.WARNING, "link_status_failed", install_id=install["id"], error=str(result))
+                continue
+            self._store_link_status(install, {int(repo_id): status for repo_id, status in result.items()})
+
+    def _store_link_status(self, install, repo_statuses):
+        # Count total linked files
+        total_links = sum(folder_status.get("linked_count", 0)
+                          for status in repo_statuses.values() for folder_status in status.values())
+        # Store total count for easy access
+        self.state.set_install_link_status(
+            install["id"], repo_statuses, total_links, install.get("link_mode", LINK_MODE_SYMLINK)
+        )
+        # Only folders with something in them; the dashboard treats missing folders as empty
+        summary = self.get_installation_link_summary(install["id"])
+        summary["folders"] = {folder: data for folder, data in summary["folders"].items() if any(data.values())}
+        DASHBOARD.publish("link_summary", install["id"], {"install_id": install["id"], "summary": summary})
     
     def get_installation_link_summary(self, install_id):
         """Get a summary of links for an installation"""
-        install_key = str(install_id)
-        if "link_status" not in self.data or install_key not in self.data["link_status"]:
-            return {"total_links": 0, "folders": {}}
+        stored = self.state.get_install_link_status(int(install_id))
+        if stored is None:
+            return {"total_links": 0, "folders": {}, "link_mode": LINK_MODE_SYMLINK}
         
-        status_data = self.data["link_status"][install_key]
-        total_links = status_data.get("_total_links", 0)
+        repo_statuses, total_links, link_mode = stored
         
         # Aggregate folder stats across all repositories
         folder_summary = {}
-        for key, repo_status in status_data.items():
-            if key.startswith("_"):  # Skip metadata keys
-                continue
-            
+        for repo_status in repo_statuses.values():
             for folder, folder_data in repo_status.items():
                 if folder not in folder_summary:
                     folder_summary[folder] = {"linked_count": 0, "src_exists": False, "dest_exists": False}
@@ -223,15 +1540,20 @@ class ModelManagerConfig:
                 folder_summary[folder]["src_exists"] = folder_summary[folder]["src_exists"] or folder_data.get("src_exists", False)
                 folder_summary[folder]["dest_exists"] = folder_summary[folder]["dest_exists"] or folder_data.get("dest_exists", False)
         
-        return {"total_links": total_links, "folders": folder_summary}
+        return {"total_links": total_links, "folders": folder_summary, "link_mode": link_mode}
     
-    def link_repository_to_installation(self, install_id, repo_id):
+    def link_repository_to_installation(self, install_id, repo_id, to_end=False):
+        """Link a repository to an installation; with to_end an existing link is moved to the end so it wins conflicts"""
         install_key = str(install_id)
         if install_key not in self.data["links"]:
             self.data["links"][install_key] = []
-        if repo_id not in self.data["links"][install_key]:
-            self.data["links"][install_key].append(repo_id)
+        links = self.data["links"][install_key]
+        if repo_id not in links:
+            links.append(repo_id)
             return True
+        if to_end and links[-1] != repo_id:
+            links.remove(repo_id)
+            links.append(repo_id)
         return False
     
     def unlink_repository_from_installation(self, install_id, repo_id):
@@ -242,12 +1564,27 @@ class ModelManagerConfig:
         return False
     
     def get_linked_repositories(self, install_id):
+        """Repositories linked to an installation, in link order (later entries take priority on conflicts)"""
         install_key = str(install_id)
         linked_repo_ids = self.data["links"].get(install_key, [])
-        return [r for r in self.data["repositories"] if r["id"] in linked_repo_ids]
+        repos_by_id = {r["id"]: r for r in self.data["repositories"]}
+        return [repos_by_id[repo_id] for repo_id in linked_repo_ids if repo_id in repos_by_id]
+
+    def set_link_priority(self, install_id, repo_ids):
+        """Reorder an installation's linked repositories; the last one wins on conflicting files"""
+        install_key = str(install_id)
+        current = self.data["links"].get(install_key, [])
+        if sorted(current) != sorted(repo_ids):
+            return False
+        self.data["links"][install_key] = list(repo_ids)
+        return True
     
-    def get_repository_folders(self, repo_path):
-        """Get all model folders within a repository, including non-standard ones"""
+    def get_repository_folders(self, repo_path, with_files=False):
+        """
+        Get all model folders within a repository, including non-standard ones.
+        With with_files, each folder also carries its "files" (see _scan_folder_files;
+        recursive for RECURSIVE_LINK_FOLDERS) and their "digest", for change detection.
+        """
         # Official ComfyUI model directories (as of 2024)
         standard_folders = [
             "audio_encoders", "checkpoints", "clip", "clip_vision", "configs",
@@ -265,33 +1602,40 @@ class ModelManagerConfig:
                 for item in os.listdir(repo_path):
                     item_path = os.path.join(repo_path, item)
                     if os.path.isdir(item_path):
-                        # Count files and calculate size in the directory
-                        try:
-                            folder_files = 0
-                            folder_size = 0
-                            for f in os.listdir(item_path):
-                                file_path = os.path.join(item_path, f)
-                                if os.path.isfile(file_path):
-                                    folder_files += 1
-                                    total_files += 1
-                                    try:
-                                        file_size = os.path.getsize(file_path)
-                                        folder_size += file_size
-                                        total_size_bytes += file_size
-                                    except (PermissionError, OSError):
-                                        pass
-                        except (PermissionError, OSError):
-                            folder_files = 0
-                            folder_size = 0
-                        
-                        all_folders.append({
+                        folder = {
                             "name": item,
                             "path": item_path,
-                            "file_count": folder_files,
-                            "size_bytes": folder_size,
+                            "file_count": 0,
+                            "size_bytes": 0,
                             "exists": True,
                             "is_standard": item in standard_folders
-                        })
+                        }
+                        if with_files:
+                            files = _scan_folder_files(item_path, item in RECURSIVE_LINK_FOLDERS)
+                            # Counts stay top-level only, as without with_files
+                            top_level = [f for f in files if os.sep not in f[0]]
+                            folder["file_count"] = len(top_level)
+                            folder["size_bytes"] = sum(f[1] for f in top_level)
+                            folder["files"] = files
+                            folder["digest"] = _folder_digest(files)
+                        else:
+                            # Count files and calculate size in the directory
+                            try:
+                                for f in os.listdir(item_path):
+                                    file_path = os.path.join(item_path, f)
+                                    if os.path.isfile(file_path):
+                                        folder["file_count"] += 1
+                                        try:
+                                            folder["size_bytes"] += os.path.getsize(file_path)
+                                        except (PermissionError, OSError):
+                                            pass
+                            except (PermissionError, OSError):
+                                folder["file_count"] = 0
+                                folder["size_bytes"] = 0
+                        
+                        total_files += folder["file_count"]
+                        total_size_bytes += folder["size_bytes"]
+                        all_folders.append(folder)
                 
                 # Sort folders: standard folders first, then others alphabetically
                 all_folders.sort(key=lambda x: (not x["is_standard"], x["name"]))
@@ -312,42 +1656,63 @@ class ModelManagerConfig:
         if not repo or not repo["exists"]:
             return {"new_folders": [], "removed_folders": [], "changed_folders": []}
         
-        # Get current folder state
-        current_folders = self.get_repository_folders(repo["path"])
+        # Get current folder state, with per-file digests
+        current_folders = self.get_repository_folders(repo["path"], with_files=True)
         
-        # Get previous folder state from config
-        if "folder_snapshots" not in self.data:
-            self.data["folder_snapshots"] = {}
-        
-        repo_key = str(repo_id)
-        previous_folders = self.data["folder_snapshots"].get(repo_key, [])
+        # Get previous folder state from the state store
+        previous_folders = self.state.get_folder_snapshot(repo_id)
         
         # Convert to sets for comparison
         current_names = {f["name"] for f in current_folders["folders"]}
         previous_names = {f["name"] for f in previous_folders}
+        current_dict = {f["name"]: f for f in current_folders["folders"]}
+        previous_dict = {f["name"]: f for f in previous_folders}
         
         # Find changes
         new_folders = [f for f in current_folders["folders"] if f["name"] in (current_names - previous_names)]
         removed_folders = [{"name": name} for name in (previous_names - current_names)]
+        for folder in new_folders:
+            self.state.update_folder_files(repo_id, folder["name"], folder["files"], [])
         
-        # Find folders with changed file counts
+        # Find folders whose files changed; equal digests confirm a folder without reading its file table
         changed_folders = []
-        current_dict = {f["name"]: f for f in current_folders["folders"]}
-        previous_dict = {f["name"]: f for f in previous_folders}
-        
         for name in (current_names & previous_names):
-            current_count = current_dict[name]["file_count"]
-            previous_count = previous_dict[name]["file_count"]
-            if current_count != previous_count:
+            current, previous = current_dict[name], previous_dict[name]
+            if current["digest"] == previous["digest"]:
+                continue
+            
+            current_files = {rel: (size, mtime_ns) for rel, size, mtime_ns in current["files"]}
+            previous_files = self.state.get_folder_files(repo_id, name)
+            if previous["digest"] is None:
+                # Snapshot taken before per-file tracking: only the file count can be compared
+                added, removed, modified = [], [], []
+                upserts, deletes = current["files"], list(previous_files.keys() - current_files.keys())
+            else:
+                added = sorted(current_files.keys() - previous_files.keys())
+                removed = sorted(previous_files.keys() - current_files.keys())
+                modified = sorted(rel for rel in current_files.keys() & previous_files.keys()
+                                  if current_files[rel] != previous_files[rel])
+                upserts = [(rel, *current_files[rel]) for rel in added + modified]
+                deletes = removed
+            self.state.update_folder_files(repo_id, name, upserts, deletes)
+            
+            current_count = current["file_count"]
+            previous_count = previous["file_count"]
+            if added or removed or modified or current_count != previous_count:
                 changed_folders.append({
                     "name": name,
                     "previous_count": previous_count,
                     "current_count": current_count,
-                    "change": current_count - previous_count
+                    "change": current_count - previous_count,
+                    "added": added,
+                    "removed": removed,
+                    "modified": modified
                 })
         
-        # Update snapshot
-        self.data["folder_snapshots"][repo_key] = current_folders["folders"]
+        # Update snapshot; the file lists stay in the state store, not in the response
+        for folder in current_folders["folders"]:
+            del folder["files"]
+        self.state.set_folder_snapshot(repo_id, current_folders["folders"])
         
         return {
             "new_folders": new_folders,
@@ -356,13 +1721,29 @@ class ModelManagerConfig:
         }
     
     def check_all_repositories_for_changes(self):
-        """Check all repositories for changes and return summary"""
+        """Check all repositories for changes and return summary; agent nodes check theirs concurrently"""
         changes_summary = {}
         total_changes = 0
         
+        remote_repos = [r for r in self.data["repositories"] if r.get("node") and r["exists"]]
+        remote_results = CLUSTER.fan_out(self, [(r["node"], "detect_changes", {"repo": r}) for r in remote_repos])
+        remote_changes = {r["id"]: result for r, result in zip(remote_repos, remote_results)}
+        
         for repo in self.data["repositories"]:
             if repo["exists"]:
-                changes = self.detect_repository_changes(repo["id"])
+                if repo.get("node"):
+                    changes = remote_changes[repo["id"]]
+                    if isinstance(changes, AgentError):
+                        _log_event(logging.WARNING, "change_check_failed", repo_id=repo["id"], error=str(changes))
+                        continue
+                else:
+                    changes = self.detect_repository_changes(repo["id"])
+                DASHBOARD.publish("repository_changes", repo["id"], {
+                    "repo_id": repo["id"],
+                    "new_folders": len(changes["new_folders"]),
+                    "removed_folders": len(changes["removed_folders"]),
+                    "changed_folders": len(changes["changed_folders"])
+                })
                 if changes["new_folders"] or changes["removed_folders"] or changes["changed_folders"]:
                     changes_summary[repo["id"]] = {
                         "repo_name": repo["name"],
@@ -398,10 +1779,396 @@ class ModelManagerConfig:
         repo_key = str(repo_id)
         return self.data["enabled_custom_folders"].get(repo_key, [])
 
+def _record_fs_ops(**counts):
+    """Add per-operation filesystem counts gathered by the linker to the metrics"""
+    for op, count in counts.items():
+        if count:
+            METRICS.inc("model_manager_fs_operations_total", count, op=op)
+
+# Per (installation, repository) link manifests, kept out of the main config file
+MANIFEST_DIR = "model_manager_manifests"
+
+class LinkManifestStore:
+    """
+    Records every link the linker creates for an (installation, repository) pair so
+    unlink and status only touch those links instead of walking the whole models/ tree.
+    One small JSON file per pair: {"install_path", "repo_path", "folders": {folder: [rel_path, ...]}}
+    """
+
+    def __init__(self, manifest_dir=MANIFEST_DIR):
+        self.manifest_dir = manifest_dir
+
+    def _manifest_file(self, install_path, repo_path):
+        key = f"{os.path.abspath(install_path)}\0{os.path.abspath(repo_path)}"
+        return os.path.join(self.manifest_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + ".json")
+
+    def load(self, install_path, repo_path):
+        """Return the manifest for the pair, or None if its links were never recorded"""
+        manifest_file = self._manifest_file(install_path, repo_path)
+        if not os.path.exists(manifest_file):
+            return None
+        try:
+            with open(manifest_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading link manifest {manifest_file}: {e}")
+            return None
+
+    def new(self, install_path, repo_path):
+        return {"install_path": os.path.abspath(install_path), "repo_path": os.path.abspath(repo_path), "folders": {}}
+
+    def save(self, manifest):
+        manifest_file = self._manifest_file(manifest["install_path"], manifest["repo_path"])
+        try:
+            if not any(manifest["folders"].values()):
+                if os.path.exists(manifest_file):
+                    os.remove(manifest_file)
+                return True
+            os.makedirs(self.manifest_dir, exist_ok=True)
+            tmp_file = manifest_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(manifest, f, separators=(",", ":"))
+            os.replace(tmp_file, manifest_file)
+            return True
+        except Exception as e:
+            print(f"Error saving link manifest {manifest_file}: {e}")
+            return False
+
+    def move(self, from_install_path, to_install_path, repo_paths):
+        """Re-key the manifests of the given repositories from one installation path to another"""
+        for repo_path in repo_paths:
+            manifest = self.load(from_install_path, repo_path)
+            if manifest is None:
+                continue
+            old_file = self._manifest_file(from_install_path, repo_path)
+            manifest["install_path"] = os.path.abspath(to_install_path)
+            if self.save(manifest) and os.path.exists(old_file):
+                os.remove(old_file)
+
+    @staticmethod
+    def add_entries(manifest, folder, rel_paths):
+        # Keep earlier entries: links to files since removed from the repository must still be cleaned up
+        existing = set(manifest["folders"].get(folder, []))
+        existing.update(rel_paths)
+        manifest["folders"][folder] = sorted(existing)
+
+# Installation link modes: per-file symlinks in models/, or ComfyUI's extra_model_paths.yaml
+LINK_MODE_SYMLINK = "symlink"
+LINK_MODE_CONFIG = "config"
+
+EXTRA_MODEL_PATHS_FILE = "extra_model_paths.yaml"
+EXTRA_PATHS_BEGIN = "# BEGIN ComfyUI Model Manager (generated - edits inside this block are overwritten)"
+EXTRA_PATHS_END = "# END ComfyUI Model Manager"
+
+class ExtraModelPathsBackend:
+    """
+    Zero-symlink link backend: maps each linked repository's folders to ComfyUI folder keys in the
+    installation's extra_model_paths.yaml. Only the block between the BEGIN/END markers is managed;
+    anything else the user keeps in the file is preserved.
+
+    ComfyUI scans every configured path recursively and, for the same file name, uses the first
+    path listed, so repositories are written highest priority (last linked) first.
+    """
+
+    def __init__(self, linker):
+        self.linker = linker
+
+    def _yaml_file(self, install_path):
+        return os.path.join(install_path, EXTRA_MODEL_PATHS_FILE)
+
+    def _repository_folders(self, repo, config):
+        folders = [f for f in self.linker.standard_folders if os.path.isdir(os.path.join(repo["path"], f))]
+        if config:
+            folders += [f for f in config.get_enabled_custom_folders(repo["id"])
+                        if os.path.isdir(os.path.join(repo["path"], f))]
+        return folders
+
+    def render_block(self, repos, config=None):
+        # JSON strings are valid YAML double-quoted scalars, which keeps odd paths safe without PyYAML
+        lines = [EXTRA_PATHS_BEGIN]
+        for repo in reversed(repos):
+            folders = self._repository_folders(repo, config)
+            if not folders:
+                continue
+            lines.append(f"model_manager_repo_{repo['id']}:")
+            lines.append(f"    base_path: {json.dumps(repo['path'])}")
+            for folder in folders:
+                lines.append(f"    {folder}: {json.dumps(folder + '/')}")
+        lines.append(EXTRA_PATHS_END)
+        return "\n".join(lines) + "\n"
+
+    def _read_unmanaged(self, install_path):
+        """Return the file's content with our managed block cut out"""
+        yaml_file = self._yaml_file(install_path)
+        if not os.path.exists(yaml_file):
+            return ""
+        with open(yaml_file, 'r') as f:
+            content = f.read()
+        start = content.find(EXTRA_PATHS_BEGIN)
+        end = content.find(EXTRA_PATHS_END)
+        if start == -1 or end == -1:
+            return content
+        return content[:start] + content[end + len(EXTRA_PATHS_END):].lstrip("\n")
+
+    def write(self, install_path, repos, config=None):
+        """Rewrite the managed block for the installation's linked repositories (one small file write)"""
+        unmanaged = self._read_unmanaged(install_path).rstrip("\n")
+        parts = [unmanaged + "\n"] if unmanaged.strip() else []
+        if repos:
+            parts.append(self.render_block(repos, config))
+        content = "\n".join(parts)
+
+        yaml_file = self._yaml_file(install_path)
+        if not content:
+            if os.path.exists(yaml_file):
+                os.remove(yaml_file)
+            return True
+        tmp_file = yaml_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(content)
+        os.replace(tmp_file, yaml_file)
+        return True
+
+    def remove(self, install_path):
+        """Drop the managed block (used when switching the installation back to symlinks)"""
+        return self.write(install_path, [], None)
+
+    def configured_repositories(self, install_path):
+        """Repository ids currently present in the managed block"""
+        yaml_file = self._yaml_file(install_path)
+        if not os.path.exists(yaml_file):
+            return []
+        with open(yaml_file, 'r') as f:
+            content = f.read()
+        start = content.find(EXTRA_PATHS_BEGIN)
+        end = content.find(EXTRA_PATHS_END)
+        if start == -1 or end == -1:
+            return []
+        return [int(m) for m in re.findall(r'^model_manager_repo_(\d+):', content[start:end], re.MULTILINE)]
+
+    def get_link_status(self, repo, install_path, config=None):
+        """Status in the same shape as ModelLinker.get_link_status; linked_count is the number of files exposed"""
+        configured = repo["id"] in self.configured_repositories(install_path)
+        folders = self._repository_folders(repo, config) if configured else []
+        results = {}
+        for folder in self.linker.standard_folders:
+            src_folder = os.path.join(repo["path"], folder)
+            linked_count = 0
+            if folder in folders:
+                try:
+                    linked_count = sum(1 for _, _, files in os.walk(src_folder) for _ in files)
+                except OSError:
+                    pass
+            results[folder] = {
+                "src_exists": os.path.exists(src_folder),
+                "dest_exists": folder in folders,
+                "linked_count": linked_count,
+                "link_mode": LINK_MODE_CONFIG
+            }
+        return results
+
+def _link_points_into(dest_file, src_folder, src_realpath):
+    """True if dest_file is a symlink whose target lies in src_folder (one readlink, no tree walk)"""
+    try:
+        target = os.readlink(dest_file)
+    except OSError:
+        return False
+    return _target_points_into(target, src_folder, src_realpath)
+
+def _target_points_into(target, src_folder, src_realpath):
+    if target.startswith(src_folder + os.sep):
+        return True
+    return os.path.abspath(target).startswith(src_realpath)
+
+# dir_fd-relative symlink/unlink/mkdir/readlink are available (POSIX); elsewhere full paths are used
+DIR_FD_LINKING = all(func in os.supports_dir_fd for func in (os.symlink, os.unlink, os.mkdir, os.readlink, os.open))
+_DIR_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_CLOEXEC", 0)
+
+# Open directory fds a LinkTreeWriter keeps; past this the least recently used one is closed
+LINK_TREE_MAX_FDS = 256
+
+class LinkTreeWriter:
+    """
+    Creates and removes symlinks under one destination folder with directory-relative syscalls.
+    Every directory of the tree is opened once and its fd reused, and its names are read with a
+    single scandir, so a link costs one symlinkat() instead of a full path lookup plus exists/islink
+    checks. Directories this writer created are known to be empty and are never listed.
+    Without dir_fd support the same calls fall back to full paths.
+    """
+
+    def __init__(self, root, create=True):
+        self.root = root
+        self.create = create
+        self.fds = collections.OrderedDict()  # relative directory -> fd, least recently used first
+        self.listings = {}    # relative directory -> names already in it
+        self.created = set()  # relative directories made by this writer
+        self.ops = collections.Counter()
+        if create and not os.path.isdir(root):
+            os.makedirs(root, exist_ok=True)
+            self.created.add("")
+            self.ops["mkdir"] += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if DIR_FD_LINKING:
+            for fd in self.fds.values():
+                os.close(fd)
+        self.fds.clear()
+
+    def _dir(self, rel_dir):
+        """fd of rel_dir (its full path without dir_fd support), making it first when the writer creates"""
+        handle = self.fds.get(rel_dir)
+        if handle is not None:
+            self.fds.move_to_end(rel_dir)
+            return handle
+        if not DIR_FD_LINKING:
+            handle = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            if self.create and rel_dir and not os.path.isdir(handle):
+                os.makedirs(handle, exist_ok=True)
+                self.created.add(rel_dir)
+                self.ops["mkdir"] += 1
+            self.fds[rel_dir] = handle
+            return handle
+
+        if not rel_dir:
+            handle = os.open(self.root, _DIR_OPEN_FLAGS)
+        else:
+            parent, name = os.path.split(rel_dir)
+            parent_fd = self._dir(parent)
+            if self.create and name not in self._names(parent):
+                os.mkdir(name, dir_fd=parent_fd)
+                self.created.add(rel_dir)
+                self.listings[parent].add(name)
+                self.ops["mkdir"] += 1
+            handle = os.open(name, _DIR_OPEN_FLAGS, dir_fd=parent_fd)
+        # At the fd limit close the least recently used directory; the parents just used stay open
+        while len(self.fds) >= LINK_TREE_MAX_FDS:
+            os.close(self.fds.popitem(last=False)[1])
+        self.fds[rel_dir] = handle
+        return handle
+
+    def _names(self, rel_dir):
+        """Names in rel_dir, listed once; empty without a listing for directories this writer made"""
+        names = self.listings.get(rel_dir)
+        if names is None:
+            names = set()
+            if rel_dir not in self.created:
+                self.ops["scandir"] += 1
+                with os.scandir(self._dir(rel_dir)) as it:
+                    names.update(entry.name for entry in it)
+            self.listings[rel_dir] = names
+        return names
+
+    def _locate(self, rel_path):
+        rel_dir, name = os.path.split(rel_path)
+        handle = self._dir(rel_dir)
+        if DIR_FD_LINKING:
+            return rel_dir, name, {"dir_fd": handle}
+        return rel_dir, os.path.join(handle, name), {}
+
+    def readlink(self, rel_path):
+        """Target of the link at rel_path; None when nothing is there, "" for a real file or directory"""
+        rel_dir, name, kwargs = self._locate(rel_path)
+        if os.path.basename(name) not in self._names(rel_dir):
+            return None
+        self.ops["readlink"] += 1
+        try:
+            return os.readlink(name, **kwargs)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            return ""
+
+    def link(self, src_file, rel_path):
+        """Make rel_path a symlink to src_file, replacing whatever else is there"""
+        rel_dir, name, kwargs = self._locate(rel_path)
+        names = self._names(rel_dir)
+        base_name = os.path.basename(name)
+        if base_name in names:
+            # Relinking: a link that already points at src_file is left as it is
+            self.ops["readlink"] += 1
+            try:
+                if os.readlink(name, **kwargs) == src_file:
+                    return
+            except FileNotFoundError:
+                pass
+            except OSError:
+                pass  # A real file is in the way and gets replaced, as before
+        self.ops["symlink"] += 1
+        try:
+            os.symlink(src_file, name, **kwargs)
+        except FileExistsError:
+            self.ops["remove"] += 1
+            os.unlink(name, **kwargs)
+            self.ops["symlink"] += 1
+            os.symlink(src_file, name, **kwargs)
+        names.add(base_name)
+
+    def replace(self, src_file, rel_path):
+        """Swap in a new link atomically so readers never see rel_path missing"""
+        rel_dir, name, kwargs = self._locate(rel_path)
+        tmp_name = name + ".mm-tmp"
+        try:
+            os.unlink(tmp_name, **kwargs)
+            self.ops["remove"] += 1
+        except FileNotFoundError:
+            pass
+        self.ops["symlink"] += 1
+        os.symlink(src_file, tmp_name, **kwargs)
+        if DIR_FD_LINKING:
+            os.replace(tmp_name, name, src_dir_fd=kwargs["dir_fd"], dst_dir_fd=kwargs["dir_fd"])
+        else:
+            os.replace(tmp_name, name)
+
+    def unlink_if_points_into(self, rel_path, src_folder, src_realpath):
+        """Remove the link at rel_path if it still points into src_folder; True when removed"""
+        try:
+            rel_dir, name, kwargs = self._locate(rel_path)
+        except FileNotFoundError:
+            return False
+        self.ops["readlink"] += 1
+        try:
+            target = os.readlink(name, **kwargs)
+        except OSError:
+            return False
+        if not _target_points_into(target, src_folder, src_realpath):
+            return False
+        self.ops["remove"] += 1
+        os.unlink(name, **kwargs)
+        return True
+
+    def remove_empty_dirs(self, rel_dirs):
+        """rmdir the given relative directories deepest first; non-empty ones are kept"""
+        for rel_dir in sorted(rel_dirs, key=lambda d: d.count(os.sep), reverse=True):
+            handle = self.fds.pop(rel_dir, None)
+            if handle is not None and DIR_FD_LINKING:
+                os.close(handle)
+            try:
+                if DIR_FD_LINKING:
+                    parent, name = os.path.split(rel_dir)
+                    os.rmdir(name, dir_fd=self._dir(parent))
+                else:
+                    os.rmdir(os.path.join(self.root, rel_dir))
+            except OSError:
+                pass  # Directory not empty or already gone
+
+    def record(self):
+        """Add the syscalls made so far to the fs operation metrics"""
+        _record_fs_ops(**self.ops)
+        self.ops.clear()
+
 class ModelLinker:
     """Handles the actual symbolic linking between repositories and ComfyUI installations"""
 
     def __init__(self):
+        self.manifests = LinkManifestStore()
+        self.extra_paths = ExtraModelPathsBackend(self)
+        self.profiles = LinkProfileManager(self)
         # Official ComfyUI model directories (as of 2024)
         self.standard_folders = [
             "audio_encoders",
@@ -428,116 +2195,358 @@ class ModelLinker:
     
     def link_repository_to_installation(self, repo_path, install_path, repo_id=None, config=None):
         """Link all model folders from repository to ComfyUI installation"""
-        results = {}
-        models_path = os.path.join(install_path, "models")
-
-        if not os.path.exists(models_path):
-            os.makedirs(models_path, exist_ok=True)
-
         # Get enabled custom folders if config is provided
         custom_folders = []
         if config and repo_id:
             custom_folders = config.get_enabled_custom_folders(repo_id)
 
-        # Link standard folders
-        for folder in self.standard_folders:
-            src_folder = os.path.join(repo_path, folder)
-            dest_folder = os.path.join(models_path, folder)
+        folders = [(folder, "Source folder") for folder in self.standard_folders]
+        folders += [(folder, "Custom folder") for folder in custom_folders]
+        return self.link_folders(repo_path, install_path, folders)
 
-            if os.path.exists(src_folder):
-                results[folder] = self._link_folder(src_folder, dest_folder, folder)
-            else:
-                results[folder] = {"success": False, "message": f"Source folder {src_folder} does not exist", "count": 0}
+    def link_folders(self, repo_path, install_path, folders, skip_missing=False):
+        """
+        Link the given (folder, label) list and record the created links in the pair's manifest.
+        Missing source folders are reported with the label, or left out when skip_missing is set.
+        """
+        results = {}
+        models_path = os.path.join(install_path, "models")
+
+        if not os.path.exists(models_path):
+            os.makedirs(models_path, exist_ok=True)
 
-        # Link enabled custom folders
-        for folder in custom_folders:
+        manifest = self.manifests.load(install_path, repo_path) or self.manifests.new(install_path, repo_path)
+        for folder, label in folders:
             src_folder = os.path.join(repo_path, folder)
             dest_folder = os.path.join(models_path, folder)
 
             if os.path.exists(src_folder):
-                results[folder] = self._link_folder(src_folder, dest_folder, folder)
-            else:
-                results[folder] = {"success": False, "message": f"Custom folder {src_folder} does not exist", "count": 0}
+                linked = []
+                results[folder] = self._link_folder(src_folder, dest_folder, folder, linked)
+                self.manifests.add_entries(manifest, folder, linked)
+            elif not skip_missing:
+                results[folder] = {"success": False, "message": f"{label} {src_folder} does not exist", "count": 0}
+        self.manifests.save(manifest)
 
         return results
     
     def unlink_repository_from_installation(self, repo_path, install_path, repo_id=None, config=None):
         """Remove symbolic links for a specific repository from ComfyUI installation"""
-        results = {}
-        models_path = os.path.join(install_path, "models")
-
         # Get enabled custom folders if config is provided
         custom_folders = []
         if config and repo_id:
             custom_folders = config.get_enabled_custom_folders(repo_id)
-            print(f"DEBUG: Unlinking repo_id={repo_id}, custom_folders={custom_folders}")
+            _log_event(logging.DEBUG, "unlink_repository", repo_id=repo_id, custom_folders=custom_folders)
 
-        # Unlink standard folders
-        for folder in self.standard_folders:
-            src_folder = os.path.join(repo_path, folder)
-            dest_folder = os.path.join(models_path, folder)
-            if os.path.exists(dest_folder):
-                results[folder] = self._unlink_folder_for_repository(src_folder, dest_folder, folder)
-            else:
-                results[folder] = {"success": True, "message": f"Folder {dest_folder} does not exist", "count": 0}
+        folders = [(folder, "Folder") for folder in self.standard_folders]
+        folders += [(folder, "Custom folder") for folder in custom_folders]
+        return self.unlink_folders(repo_path, install_path, folders)
 
-        # Unlink enabled custom folders
-        for folder in custom_folders:
+    def unlink_folders(self, repo_path, install_path, folders, skip_missing=False):
+        """
+        Remove this repository's links for the given (folder, label) list.
+        Uses the pair's manifest when there is one; links made before manifests existed
+        are found by walking the destination folder as before.
+        """
+        results = {}
+        models_path = os.path.join(install_path, "models")
+        manifest = self.manifests.load(install_path, repo_path)
+
+        for folder, label in folders:
             src_folder = os.path.join(repo_path, folder)
             dest_folder = os.path.join(models_path, folder)
-            if os.path.exists(dest_folder):
-                results[folder] = self._unlink_folder_for_repository(src_folder, dest_folder, folder)
+            if not os.path.exists(dest_folder):
+                if not skip_missing:
+                    results[folder] = {"success": True, "message": f"{label} {dest_folder} does not exist", "count": 0}
+            elif manifest is not None:
+                rel_paths = manifest["folders"].pop(folder, [])
+                results[folder] = self._unlink_manifest_entries(src_folder, dest_folder, folder, rel_paths)
             else:
-                results[folder] = {"success": True, "message": f"Custom folder {dest_folder} does not exist", "count": 0}
+                results[folder] = self._unlink_folder_for_repository(src_folder, dest_folder, folder)
 
+        if manifest is not None:
+            self.manifests.save(manifest)
         return results
-    
-    def _link_folder(self, src, dest, folder_name):
+
+    def _unlink_manifest_entries(self, src_folder, dest_folder, folder_name, rel_paths):
+        """Remove the recorded links that still point into src_folder, then prune emptied directories"""
+        try:
+            count = 0
+            src_realpath = os.path.realpath(src_folder)
+            parent_dirs = set()
+            with LinkTreeWriter(dest_folder, create=False) as writer:
+                for rel_path in rel_paths:
+                    # A link overwritten by another repository no longer points here and is left alone
+                    if writer.unlink_if_points_into(rel_path, src_folder, src_realpath):
+                        count += 1
+                    rel_dir = os.path.dirname(rel_path)
+                    while rel_dir:
+                        parent_dirs.add(rel_dir)
+                        rel_dir = os.path.dirname(rel_dir)
+
+                # Deepest directories first so nested empty folders collapse
+                writer.remove_empty_dirs(parent_dirs)
+                writer.record()
+
+            _log_event(logging.DEBUG, "unlink_folder_done", folder=folder_name, removed=count, manifest=True)
+            return {"success": True, "message": f"Removed {count} symbolic links for this repository", "count": count}
+
+        except Exception as e:
+            return {"success": False, "message": f"Error unlinking folder: {str(e)}", "count": 0}
+
+    def _link_folder(self, src, dest, folder_name, linked=None):
         """Link ALL files from source to destination folder (not just safetensors)"""
         try:
             if not os.path.exists(src):
                 return {"success": False, "message": f"Source directory {src} does not exist", "count": 0}
-            
-            # Create destination directory if it doesn't exist
-            os.makedirs(dest, exist_ok=True)
-            
+
+            return self._link_entries(self._enumerate_folder(src, folder_name), dest, linked)
+
+        except Exception as e:
+            return {"success": False, "message": f"Error linking folder: {str(e)}", "count": 0}
+
+    def _enumerate_folder(self, src, folder_name):
+        """
+        List the (relative path, source file) pairs _link_folder links for one repository folder.
+        Walks with scandir so the entry types come from the directory listing instead of a stat per file.
+        """
+        entries = []
+        scanned = 0
+        # For loras and checkpoints, link ALL files recursively; other folders link the top directory only
+        recursive = folder_name in RECURSIVE_LINK_FOLDERS
+        pending = [("", src)]
+        while pending:
+            rel_dir, abs_dir = pending.pop()
+            subdirs = []
+            scanned += 1
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if not recursive:
+                        if entry.is_file():
+                            entries.append((rel_path, entry.path))
+                    elif not entry.is_dir():
+                        entries.append((rel_path, entry.path))
+                    elif not entry.is_symlink():
+                        # Symlinked directories are not descended into, as with os.walk
+                        subdirs.append((rel_path, entry.path))
+            pending.extend(reversed(subdirs))
+        _record_fs_ops(scandir=scanned)
+        return entries
+
+    def _link_entries(self, entries, dest, linked=None):
+        """
+        Create symbolic links under dest for pre-enumerated (relative path, source file) pairs.
+        The relative path of every link created is appended to `linked` when given.
+        """
+        try:
             count = 0
-            
-            if folder_name in ["loras", "checkpoints"]:
-                # For loras and checkpoints, link ALL files recursively
-                for root, dirs, files in os.walk(src):
-                    for file in files:
-                        src_file = os.path.join(root, file)
-                        # Calculate relative path from src
-                        rel_path = os.path.relpath(src_file, src)
-                        dest_file = os.path.join(dest, rel_path)
-                        
-                        # Create destination directory if needed
-                        os.makedirs(os.path.dirname(dest_file), exist_ok=True)
-                        
-                        # Create symbolic link (force overwrite if exists)
-                        if os.path.exists(dest_file) or os.path.islink(dest_file):
-                            os.remove(dest_file)
-                        os.symlink(src_file, dest_file)
-                        count += 1
-            else:
-                # For other folders, link ALL files in the top directory
-                for file in os.listdir(src):
-                    src_file = os.path.join(src, file)
-                    if os.path.isfile(src_file):
-                        dest_file = os.path.join(dest, file)
-                        
+            with LinkTreeWriter(dest) as writer:
+                try:
+                    for rel_path, src_file in entries:
                         # Create symbolic link (force overwrite if exists)
-                        if os.path.exists(dest_file) or os.path.islink(dest_file):
-                            os.remove(dest_file)
-                        os.symlink(src_file, dest_file)
+                        writer.link(src_file, rel_path)
                         count += 1
-            
+                        if linked is not None:
+                            linked.append(rel_path)
+                finally:
+                    writer.record()
+
             return {"success": True, "message": f"Linked {count} files", "count": count}
-            
+
         except Exception as e:
             return {"success": False, "message": f"Error linking folder: {str(e)}", "count": 0}
-    
+
+    def _enumerate_repository(self, repo, config=None):
+        """Enumerate every linkable folder of a repository: {folder: entries or missing-folder result}"""
+        folders = [(f, "Source folder") for f in self.standard_folders]
+        if config:
+            folders += [(f, "Custom folder") for f in config.get_enabled_custom_folders(repo["id"])]
+        enumeration = {}
+        for folder, label in folders:
+            src_folder = os.path.join(repo["path"], folder)
+            if not os.path.exists(src_folder):
+                enumeration[folder] = {"success": False, "message": f"{label} {src_folder} does not exist", "count": 0}
+                continue
+            try:
+                enumeration[folder] = self._enumerate_folder(src_folder, folder)
+            except OSError as e:
+                enumeration[folder] = {"success": False, "message": f"Error linking folder: {str(e)}", "count": 0}
+        return enumeration
+
+    def plan_overlay(self, repos, config=None, enumerations=None):
+        """
+        Merge the trees of an installation's repositories into one link plan.
+        repos is in priority order: when several repositories contain the same relative
+        path, the later one wins (the same outcome as linking them one after another).
+        enumerations caches _enumerate_repository results by repo id so callers planning
+        several installations walk each repository only once.
+        """
+        if enumerations is None:
+            enumerations = {}
+        folders = {}   # folder -> {rel_path: (src_file, repo_id)}
+        shadowed = {}  # (folder, rel_path) -> [repo ids that lost]
+        missing = {}   # repo_id -> {folder: result}
+
+        for repo in repos:
+            if repo["id"] not in enumerations:
+                enumerations[repo["id"]] = self._enumerate_repository(repo, config)
+            for folder, entries in enumerations[repo["id"]].items():
+                if isinstance(entries, dict):
+                    missing.setdefault(repo["id"], {})[folder] = entries
+                    continue
+                folder_plan = folders.setdefault(folder, {})
+                for rel_path, src_file in entries:
+                    previous = folder_plan.get(rel_path)
+                    if previous is not None and previous[1] != repo["id"]:
+                        shadowed.setdefault((folder, rel_path), []).append(previous[1])
+                    folder_plan[rel_path] = (src_file, repo["id"])
+
+        conflicts = [{
+            "folder": folder,
+            "rel_path": rel_path,
+            "winner_repo_id": folders[folder][rel_path][1],
+            "shadowed_repo_ids": losers
+        } for (folder, rel_path), losers in sorted(shadowed.items())]
+        return {"folders": folders, "conflicts": conflicts, "missing": missing}
+
+    def apply_overlay(self, install_path, repos, plan):
+        """
+        Make the installation's models/ folder match an overlay plan with one pass of symlink operations.
+        Links that already point at the planned file are left untouched; links that repositories in
+        the plan owned before but no longer win are removed. Each repository's manifest is rewritten
+        with exactly the links it owns.
+        """
+        models_path = os.path.join(install_path, "models")
+        os.makedirs(models_path, exist_ok=True)
+        stats = {"created": 0, "replaced": 0, "unchanged": 0, "removed": 0, "errors": 0}
+        owned = {repo["id"]: {} for repo in repos}  # repo_id -> folder -> [rel_path]
+
+        for folder, folder_plan in plan["folders"].items():
+            with LinkTreeWriter(os.path.join(models_path, folder)) as writer:
+                for rel_path, (src_file, repo_id) in folder_plan.items():
+                    try:
+                        current = writer.readlink(rel_path)
+                        if current == src_file:
+                            stats["unchanged"] += 1
+                        elif current is None:
+                            writer.link(src_file, rel_path)
+                            stats["created"] += 1
+                        else:
+                            # Swap in the new link atomically so ComfyUI never sees the path missing
+                            writer.replace(src_file, rel_path)
+                            stats["replaced"] += 1
+                        owned[repo_id].setdefault(folder, []).append(rel_path)
+                    except OSError as e:
+                        stats["errors"] += 1
+                        _log_event(logging.WARNING, "overlay_link_failed",
+                                   dest=os.path.join(models_path, folder, rel_path), error=str(e))
+                writer.record()
+
+        # Drop links the repositories owned before but no longer win, then record the new ownership
+        for repo in repos:
+            manifest = self.manifests.load(install_path, repo["path"]) or self.manifests.new(install_path, repo["path"])
+            for folder, rel_paths in manifest["folders"].items():
+                now_owned = set(owned[repo["id"]].get(folder, []))
+                stale = [rel for rel in rel_paths if rel not in now_owned and
+                         rel not in plan["folders"].get(folder, {})]
+                if stale:
+                    result = self._unlink_manifest_entries(os.path.join(repo["path"], folder),
+                                                           os.path.join(models_path, folder), folder, stale)
+                    stats["removed"] += result["count"]
+            manifest["folders"] = owned[repo["id"]]
+            # Remember that this repository hides others' files, so unlinking it re-applies the overlay
+            manifest["shadows"] = sum(1 for c in plan["conflicts"] if c["winner_repo_id"] == repo["id"])
+            self.manifests.save(manifest)
+
+        repo_results = {}
+        for repo in repos:
+            results = dict(plan["missing"].get(repo["id"], {}))
+            for folder, rel_paths in owned[repo["id"]].items():
+                results[folder] = {"success": True, "message": f"Linked {len(rel_paths)} files", "count": len(rel_paths)}
+            repo_results[repo["id"]] = results
+        return {"repos": repo_results, "conflicts": plan["conflicts"], "stats": stats}
+
+    def sync_config_linked(self, install, repos, config=None):
+        """Config-mode counterpart of link_installation_overlay: rewrite extra_model_paths.yaml"""
+        self.extra_paths.write(install["path"], repos, config)
+        repo_results = {}
+        for repo in repos:
+            repo_results[repo["id"]] = {
+                folder: {"success": True, "message": f"Mapped in {EXTRA_MODEL_PATHS_FILE}",
+                         "count": status["linked_count"]}
+                for folder, status in self.extra_paths.get_link_status(repo, install["path"], config).items()
+                if status["dest_exists"]
+            }
+        return {"repos": repo_results, "conflicts": [], "stats": {"link_mode": LINK_MODE_CONFIG}}
+
+    def remove_repository(self, install, repo, remaining_repos, config=None):
+        """
+        Take a repository out of an installation. remaining_repos are the repositories still
+        linked, in priority order; files the removed repository was shadowing are relinked from them.
+        """
+        if install.get("link_mode") == LINK_MODE_CONFIG:
+            # Config-linked: drop the repository from extra_model_paths.yaml
+            self.sync_config_linked(install, remaining_repos, config)
+            return {}
+
+        manifest = self.manifests.load(install["path"], repo["path"])
+
+        # Perform the actual unlinking (remove symlinks for this specific repository)
+        results = self.unlink_repository_from_installation(repo["path"], install["path"], repo["id"], config)
+
+        # Files this repository was shadowing belong to the next repository in priority order again
+        if manifest and manifest.get("shadows"):
+            self.link_installation_overlay(install["path"], remaining_repos, config)
+        return results
+
+    def link_installation_overlay(self, install_path, repos, config=None, enumerations=None):
+        """Plan and apply the overlay of all repositories linked to one installation"""
+        plan = self.plan_overlay(repos, config, enumerations)
+        return self.apply_overlay(install_path, repos, plan)
+
+    def link_batch(self, jobs, config=None, max_workers=8):
+        """
+        Link many (installation, repository) pairs at once.
+        Each repository is enumerated once; every affected installation then gets one
+        overlay pass over all of its linked repositories, run in parallel.
+        Returns {install_id: apply_overlay result}.
+        """
+        per_install = {}
+        for install, repo in jobs:
+            per_install.setdefault(install["id"], (install, []))[1].append(repo)
+
+        enumerations = {}
+        install_repos = {}
+        for install_id, (install, repos) in per_install.items():
+            linked = config.get_linked_repositories(install_id) if config else []
+            install_repos[install_id] = linked + [r for r in repos if r["id"] not in {l["id"] for l in linked}]
+            if install.get("link_mode") == LINK_MODE_CONFIG:
+                continue
+            # Enumerate up front so worker threads only read the shared cache
+            for repo in install_repos[install_id]:
+                if repo["id"] not in enumerations:
+                    enumerations[repo["id"]] = self._enumerate_repository(repo, config)
+
+        results = {}
+        for install_id, (install, repos) in list(per_install.items()):
+            if install.get("link_mode") == LINK_MODE_CONFIG:
+                results[install_id] = self.sync_config_linked(install, install_repos[install_id], config)
+                del per_install[install_id]
+        if not per_install:
+            return results
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(per_install)))) as executor:
+            futures = {install_id: executor.submit(self.link_installation_overlay, install["path"],
+                                                   install_repos[install_id], config, enumerations)
+                       for install_id, (install, repos) in per_install.items()}
+            for install_id, future in futures.items():
+                try:
+                    results[install_id] = future.result()
+                except Exception as e:
+                    results[install_id] = {"error": str(e)}
+        return results
+
     def _unlink_folder_for_repository(self, src_folder, dest_folder, folder_name):
         """Remove only symbolic links that point to files in the specific source repository"""
         try:
@@ -545,25 +2554,29 @@ class ModelLinker:
                 return {"success": True, "message": f"Directory {dest_folder} does not exist", "count": 0}
 
             count = 0
+            stats = 0
+            readlinks = 0
             src_realpath = os.path.realpath(src_folder)
-            print(f"DEBUG: Unlinking {folder_name}: src={src_realpath}, dest={dest_folder}")
+            _log_event(logging.DEBUG, "unlink_folder_start", folder=folder_name, src=src_realpath, dest=dest_folder)
             
             # Find and remove symbolic links that point to this specific repository
             for root, dirs, files in os.walk(dest_folder, topdown=False):
                 for file in files:
                     file_path = os.path.join(root, file)
+                    stats += 1
                     if os.path.islink(file_path):
                         try:
                             # Get the target of the symbolic link
+                            readlinks += 1
                             link_target = os.path.realpath(file_path)
                             # Check if this link points to our source repository
                             if link_target.startswith(src_realpath):
-                                print(f"DEBUG: Removing symlink {file_path} -> {link_target}")
                                 os.remove(file_path)
                                 count += 1
                         except (OSError, FileNotFoundError):
                             # Link might be broken, remove it anyway if it was targeting our repo
                             try:
+                                readlinks += 1
                                 link_target = os.readlink(file_path)
                                 if os.path.abspath(link_target).startswith(src_realpath):
                                     os.remove(file_path)
@@ -580,7 +2593,8 @@ class ModelLinker:
                     except OSError:
                         pass  # Directory not empty or other error
             
-            print(f"DEBUG: Finished unlinking {folder_name}: removed {count} links")
+            _record_fs_ops(remove=count, stat=stats, readlink=readlinks)
+            _log_event(logging.DEBUG, "unlink_folder_done", folder=folder_name, removed=count)
             return {"success": True, "message": f"Removed {count} symbolic links for this repository", "count": count}
             
         except Exception as e:
@@ -593,11 +2607,13 @@ class ModelLinker:
                 return {"success": True, "message": f"Directory {dest} does not exist", "count": 0}
             
             count = 0
+            stats = 0
             
             # Find and remove all symbolic links recursively
             for root, dirs, files in os.walk(dest, topdown=False):
                 for file in files:
                     file_path = os.path.join(root, file)
+                    stats += 1
                     if os.path.islink(file_path):
                         os.remove(file_path)
                         count += 1
@@ -611,6 +2627,7 @@ class ModelLinker:
                     except OSError:
                         pass  # Directory not empty or other error
             
+            _record_fs_ops(remove=count, stat=stats)
             return {"success": True, "message": f"Removed {count} symbolic links", "count": count}
             
         except Exception as e:
@@ -621,6 +2638,7 @@ class ModelLinker:
         results = {}
         models_path = os.path.join(install_path, "models")
         src_realpath = os.path.realpath(repo_path)
+        manifest = self.manifests.load(install_path, repo_path)
         
         for folder in self.standard_folders:
             src_folder = os.path.join(repo_path, folder)
@@ -630,18 +2648,31 @@ class ModelLinker:
             dest_exists = os.path.exists(dest_folder)
             
             linked_count = 0
-            if dest_exists and src_exists:
+            stats = 2
+            readlinks = 0
+            if dest_exists and src_exists and manifest is not None:
+                # Only the links recorded for this pair need checking
+                rel_paths = manifest["folders"].get(folder, [])
+                folder_realpath = os.path.realpath(src_folder)
+                for rel_path in rel_paths:
+                    if _link_points_into(os.path.join(dest_folder, rel_path), src_folder, folder_realpath):
+                        linked_count += 1
+                readlinks += len(rel_paths)
+            elif dest_exists and src_exists:
                 # Count symbolic links in destination that point to this specific repository
                 for root, dirs, files in os.walk(dest_folder):
                     for file in files:
                         file_path = os.path.join(root, file)
+                        stats += 1
                         if os.path.islink(file_path):
                             try:
+                                readlinks += 1
                                 link_target = os.path.realpath(file_path)
                                 if link_target.startswith(src_realpath):
                                     linked_count += 1
                             except (OSError, FileNotFoundError):
                                 pass
+            _record_fs_ops(stat=stats, readlink=readlinks)
             
             results[folder] = {
                 "src_exists": src_exists,
@@ -651,13 +2682,2018 @@ class ModelLinker:
         
         return results
 
+# Inactive link profiles are staged here, next to the installation's models/ folder
+PROFILE_STAGING_DIR = "models.profiles"
+
+_RENAME_EXCHANGE = 2
+_AT_FDCWD = -100
+
+def _exchange_directories(path_a, path_b):
+    """
+    Atomically swap two directories with renameat2(RENAME_EXCHANGE) where the platform has it.
+    Otherwise falls back to three renames, leaving path_a briefly missing. Returns True if atomic.
+    """
+    renameat2 = None
+    if sys.platform.startswith("linux"):
+        try:
+            renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+        except (OSError, AttributeError):
+            renameat2 = None
+    if renameat2 is not None:
+        result = renameat2(_AT_FDCWD, os.fsencode(path_a), _AT_FDCWD, os.fsencode(path_b), _RENAME_EXCHANGE)
+        if result == 0:
+            return True
+        errno_value = ctypes.get_errno()
+        # EINVAL/ENOSYS: filesystem or kernel without RENAME_EXCHANGE, use the fallback below
+        if errno_value not in (22, 38):
+            raise OSError(errno_value, os.strerror(errno_value), path_a)
+
+    tmp_path = path_a + ".swap-tmp"
+    os.rename(path_a, tmp_path)
+    os.rename(path_b, path_a)
+    os.rename(tmp_path, path_b)
+    return False
+
+def _real_files(root):
+    """Relative paths of the regular files (not symlinks) under root; symlinked directories are not entered"""
+    files = []
+    pending = [("", root)]
+    while pending:
+        rel_dir, abs_dir = pending.pop()
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir():
+                        pending.append((rel_path, entry.path))
+                    else:
+                        files.append(rel_path)
+        except FileNotFoundError:
+            pass
+    return files
+
+class LinkProfileManager:
+    """
+    Named link profiles per installation (e.g. "flux", "sdxl").
+    The active profile is the live models/ folder. Every other profile keeps a fully built
+    link tree in models.profiles/<name>/models, so switching is a directory exchange that
+    takes the same time for ten links or a hundred thousand, and switching back is just as fast.
+    Profiles are stored on the installation: "profiles": {name: {"repo_ids": [...]}}, "active_profile".
+    Links in models/ when profiles are first used belong to the profile that is active then.
+    Real files (configs/, placeholders, manual downloads) belong to the installation: they are
+    recorded in "profile_files" when profiles are first used and every time one is saved, and the
+    recorded ones stay in the live models/ across switches without walking the tree. A recorded
+    file at a path the incoming profile links is reported as shadowed and stays with the outgoing tree.
+    """
+
+    def __init__(self, linker):
+        self.linker = linker
+
+    @staticmethod
+    def valid_name(name):
+        return bool(name) and re.match(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*$', name) is not None
+
+    def staged_install_path(self, install_path, name):
+        """Pseudo installation path whose models/ holds the staged tree of an inactive profile"""
+        return os.path.join(install_path, PROFILE_STAGING_DIR, name)
+
+    def ensure_profiles(self, install, config):
+        """Capture the current links as the active profile the first time profiles are used"""
+        if "profiles" not in install:
+            install["profiles"] = {"default": {"repo_ids": []}}
+            install["active_profile"] = "default"
+            self.track_real_files(install)
+        # perform_link/unlink edit the live links directly, so they are the truth for the active profile
+        install["profiles"][install["active_profile"]]["repo_ids"] = list(config.data["links"].get(str(install["id"]), []))
+        return install["profiles"]
+
+    def track_real_files(self, install):
+        """Record the real files in the live models/ that switches carry over"""
+        install["profile_files"] = sorted(_real_files(os.path.join(install["path"], "models")))
+
+    def save_profile(self, install, name, repo_ids, config):
+        """Create or update a profile; an inactive profile's staged tree is (re)built right away"""
+        profiles = self.ensure_profiles(install, config)
+        self.track_real_files(install)
+        previous_ids = profiles.get(name, {}).get("repo_ids", [])
+        profiles[name] = {"repo_ids": list(repo_ids)}
+        repos_by_id = {r["id"]: r for r in config.data["repositories"]}
+        repos = [repos_by_id[i] for i in repo_ids if i in repos_by_id]
+
+        if name == install["active_profile"]:
+            config.data["links"][str(install["id"])] = list(repo_ids)
+            tree_path = install["path"]
+        else:
+            tree_path = self.staged_install_path(install["path"], name)
+        # apply_overlay only cleans up after the repositories it is given
+        for repo_id in previous_ids:
+            if repo_id not in repo_ids and repo_id in repos_by_id:
+                self.linker.unlink_repository_from_installation(repos_by_id[repo_id]["path"], tree_path, repo_id, config)
+        return self.linker.link_installation_overlay(tree_path, repos, config)
+
+    def activate(self, install, name, config):
+        """Swap the staged tree of `name` into models/ and stage the previously active tree"""
+        profiles = self.ensure_profiles(install, config)
+        old_name = install["active_profile"]
+        if name == old_name:
+            return {"switched": False, "atomic": True}
+
+        repos_by_id = {r["id"]: r for r in config.data["repositories"]}
+        old_repo_paths = [repos_by_id[i]["path"] for i in profiles[old_name]["repo_ids"] if i in repos_by_id]
+        new_repo_paths = [repos_by_id[i]["path"] for i in profiles[name]["repo_ids"] if i in repos_by_id]
+
+        live_models = os.path.join(install["path"], "models")
+        new_staged = self.staged_install_path(install["path"], name)
+        old_staged = self.staged_install_path(install["path"], old_name)
+        # Check for a leftover staging directory before anything moves
+        if os.path.exists(old_staged) and not self._remove_staged_tree(old_staged):
+            raise OSError(f"Leftover staging directory {old_staged} contains real files")
+        if not os.path.isdir(os.path.join(new_staged, "models")):
+            # Never built (or removed by hand): build it now, the swap itself stays instant
+            self.save_profile(install, name, profiles[name]["repo_ids"], config)
+        os.makedirs(live_models, exist_ok=True)
+
+        # Recorded real files belong to the installation, not the profile: hard link them into the
+        # incoming tree so ComfyUI keeps seeing them. Only the recorded paths are checked, never the tree
+        new_models = os.path.join(new_staged, "models")
+        carried, to_move, shadowed = [], [], []
+        for rel_path in install.get("profile_files", []):
+            src = os.path.join(live_models, rel_path)
+            if os.path.islink(src) or not os.path.isfile(src):
+                continue
+            dest = os.path.join(new_models, rel_path)
+            if os.path.lexists(dest):
+                shadowed.append(rel_path)  # The profile links something here; the file stays with the old tree
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            try:
+                os.link(src, dest)
+                carried.append(rel_path)
+            except OSError:
+                to_move.append(rel_path)
+
+        try:
+            atomic = _exchange_directories(live_models, new_models)
+        except OSError:
+            for rel_path in carried:
+                os.remove(os.path.join(new_models, rel_path))
+            raise
+        # The previous live tree now sits under the new profile's staging dir
+        for rel_path in carried:
+            os.remove(os.path.join(new_models, rel_path))
+        for rel_path in to_move:
+            dest = os.path.join(live_models, rel_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.rename(os.path.join(new_models, rel_path), dest)
+        # File the previous tree under its own name
+        os.rename(new_staged, old_staged)
+
+        # Manifests follow their trees: live <-> staged
+        swap_path = old_staged + ".manifest-swap"
+        self.linker.manifests.move(install["path"], swap_path, old_repo_paths)
+        self.linker.manifests.move(new_staged, install["path"], new_repo_paths)
+        self.linker.manifests.move(swap_path, old_staged, old_repo_paths)
+
+        install["active_profile"] = name
+        config.data["links"][str(install["id"])] = list(profiles[name]["repo_ids"])
+        if shadowed:
+            _log_event(logging.WARNING, "profile_files_shadowed", install=install["name"], profile=name,
+                       count=len(shadowed), staged=old_staged)
+        return {"switched": True, "atomic": atomic, "previous_profile": old_name, "shadowed": shadowed}
+
+    def delete(self, install, name, config):
+        """Remove an inactive profile and its staged tree (only symlinks are deleted)"""
+        profiles = self.ensure_profiles(install, config)
+        if name == install["active_profile"] or name not in profiles:
+            return False
+        staged_path = self.staged_install_path(install["path"], name)
+        repos_by_id = {r["id"]: r for r in config.data["repositories"]}
+        for repo_id in profiles[name]["repo_ids"]:
+            if repo_id in repos_by_id:
+                manifest = self.linker.manifests.new(staged_path, repos_by_id[repo_id]["path"])
+                self.linker.manifests.save(manifest)  # An empty manifest removes the file
+        self._remove_staged_tree(staged_path)
+        del profiles[name]
+        return True
+
+    def _remove_staged_tree(self, staged_path):
+        """Delete a staged tree's symlinks and empty directories; real files are never touched"""
+        models_path = os.path.join(staged_path, "models")
+        self.linker._unlink_folder(models_path)
+        for path in (models_path, staged_path):
+            try:
+                os.rmdir(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return False
+        return True
+
+# Search index persisted between runs, next to the configuration file
+SEARCH_INDEX_FILE = "model_manager_search_index.json"
+
+# File extensions treated as model files by the search index
+MODEL_FILE_EXTENSIONS = ('.safetensors', '.gguf', '.ckpt', '.pt', '.bin', '.pth')
+
+# Document fields with facet counts (repo_id is filter-only)
+SEARCH_FACET_FIELDS = ("folder", "model_type", "base_model", "repo_name", "repo_id")
+
+# Folders whose subdirectories are linked recursively by ModelLinker._link_folder
+RECURSIVE_LINK_FOLDERS = ["loras", "checkpoints"]
+
+def _tokenize_search_text(text):
+    """Split text into lowercase search tokens (separators, camelCase and digit boundaries)"""
+    if not text:
+        return []
+    tokens = []
+    for part in re.split(r'[^0-9A-Za-z]+', str(text)):
+        if not part:
+            continue
+        tokens.append(part.lower())
+        # Also index the camelCase / letter-digit pieces so "naturalSinRC1" matches "natural"
+        pieces = re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+', part)
+        if len(pieces) > 1:
+            tokens.extend(p.lower() for p in pieces)
+    return tokens
+
+def _derive_base_model(metadata):
+    """Best-effort base model name from safetensors metadata"""
+    if not metadata or not isinstance(metadata, dict) or "error" in metadata:
+        return ""
+    base = metadata.get("ss_base_model_version", "")
+    if base:
+        return str(base)
+    architecture = str(metadata.get("modelspec.architecture", ""))
+    if architecture:
+        # e.g. "stable-diffusion-xl-v1-base/lora" -> "stable-diffusion-xl-v1-base"
+        return architecture.split("/")[0]
+    return str(metadata.get("general.architecture", ""))
+
+# Bumped when indexed documents gain fields; older index files are rebuilt from disk
+SEARCH_INDEX_VERSION = 3
+
+# MinHash signatures over tensor sets; (a, b) pairs of the universal hash functions
+MINHASH_PERMUTATIONS = 64
+_MINHASH_PRIME = (1 << 61) - 1
+_minhash_rng = random.Random(0x6d696e68)   # fixed seed: signatures persist in the index file
+_MINHASH_PARAMS = [
+    (_minhash_rng.randrange(1, _MINHASH_PRIME), _minhash_rng.randrange(0, _MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+# Tensor-name suffixes of the two halves of a LoRA module (down/A: [rank, in], up/B: [out, rank])
+LORA_DOWN_SUFFIXES = (".lora_down.weight", ".lora_A.weight", ".lora.down.weight")
+LORA_UP_SUFFIXES = (".lora_up.weight", ".lora_B.weight", ".lora.up.weight")
+
+# Document fields holding signatures; kept out of search results
+SIMILARITY_FIELDS = ("similarity_signature", "layout", "lora")
+
+def _minhash(items):
+    """MinHash signature of a set of strings as a hex string, or "" for an empty set"""
+    hashes = [int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little') for item in items]
+    if not hashes:
+        return ""
+    return "".join(
+        "%08x" % (min((a * h + b) % _MINHASH_PRIME for h in hashes) & 0xffffffff)
+        for a, b in _MINHASH_PARAMS
+    )
+
+def _signature_values(signature):
+    return [signature[i:i + 8] for i in range(0, len(signature), 8)]
+
+def _estimate_jaccard(signature_a, signature_b):
+    values_a, values_b = _signature_values(signature_a), _signature_values(signature_b)
+    return sum(1 for a, b in zip(values_a, values_b) if a == b) / len(values_a)
+
+def _similarity_fields(tensors):
+    """
+    Signature fields for a file's tensors (name -> _TensorInfo):
+    similarity_signature covers the "name shape" set, so finetunes of one base share it;
+    layout is the sorted set of (out, in) dimensions of its layers, which a LoRA shares with its
+    base whatever the key naming. For a LoRA those come from its down/up pairs. Layouts are small
+    (tens of distinct shapes), so they are kept exactly rather than as a signature.
+    """
+    lora_down, lora_up = {}, {}
+    for name, info in tensors.items():
+        for suffix in LORA_DOWN_SUFFIXES:
+            if name.endswith(suffix) and len(info.shape) >= 2:
+                lora_down[name[:-len(suffix)]] = info.shape
+        for suffix in LORA_UP_SUFFIXES:
+            if name.endswith(suffix) and len(info.shape) >= 2:
+                lora_up[name[:-len(suffix)]] = info.shape
+
+    if lora_down:
+        layout = {f"{lora_up[module][0]}x{shape[1]}" for module, shape in lora_down.items() if module in lora_up}
+    else:
+        layout = {f"{info.shape[0]}x{info.shape[1]}" for name, info in tensors.items()
+                  if name.endswith(".weight") and len(info.shape) >= 2}
+    return {
+        "similarity_signature": _minhash(f"{name} {info.shape}" for name, info in tensors.items()),
+        "layout": sorted(layout),
+        "lora": bool(lora_down)
+    }
+
+class MinHashLSH:
+    """Banded locality-sensitive hashing over MinHash signatures; finds likely-similar documents without a full scan"""
+
+    def __init__(self, bands, rows):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = {}     # (band, band values) -> set(doc_id)
+        self.doc_keys = {}    # doc_id -> bucket keys, needed to remove a document
+
+    def _keys(self, signature):
+        values = _signature_values(signature)
+        return [(band, "".join(values[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def add(self, doc_id, signature):
+        keys = self._keys(signature)
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(doc_id)
+        self.doc_keys[doc_id] = keys
+
+    def remove(self, doc_id):
+        for key in self.doc_keys.pop(doc_id, ()):
+            ids = self.buckets.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.buckets[key]
+
+    def candidates(self, signature):
+        result = set()
+        for key in self._keys(signature):
+            result.update(self.buckets.get(key, ()))
+        return result
+
+def _public_document(doc):
+    return {key: value for key, value in doc.items() if key not in SIMILARITY_FIELDS}
+
+class ModelSearchIndex:
+    """In-memory inverted index over every model file in every repository"""
+
+    def __init__(self, index_file=SEARCH_INDEX_FILE):
+        self.index_file = index_file
+        self.lock = threading.RLock()
+        self.docs = {}          # doc_id -> document dict
+        self.path_to_id = {}    # absolute path -> doc_id
+        self.tokens = {}        # token -> set(doc_id)
+        self.doc_tokens = {}    # doc_id -> set(token), needed to remove a document
+        self.vocabulary = []    # sorted tokens for prefix lookups
+        self.vocabulary_dirty = False
+        self.rank = {}          # doc_id -> position in name order, for ranking results
+        self.ordered = []       # doc ids in name order (may hold removed ids until the next re-rank)
+        self.rank_dirty = False
+        self.facets = {field: {} for field in SEARCH_FACET_FIELDS}  # field -> value -> set(doc_id)
+        # 16 bands of 4 rows: candidates from ~50% Jaccard
+        self.similarity_lsh = MinHashLSH(16, 4)
+        # Layer shape -> non-LoRA doc ids; a small LoRA layout inside a large base has too low a
+        # Jaccard for banded LSH, so containment is counted exactly from these postings
+        self.layouts = {}
+        self.next_id = 1
+        self.ready = False
+        self.last_refresh = None
+        self.refresh_thread = None
+        self.refresh_pending = None
+
+    # ---- document maintenance ----
+
+    def _add_document(self, doc):
+        doc_id = self.next_id
+        self.next_id += 1
+        self.docs[doc_id] = doc
+        self.path_to_id[doc["path"]] = doc_id
+        self.rank_dirty = True
+
+        doc_tokens = set()
+        for field in ("name", "folder", "model_type", "base_model", "architecture", "output_name", "repo_name"):
+            doc_tokens.update(_tokenize_search_text(doc.get(field, "")))
+        # Sub-folders inside the repository folder (e.g. loras/flux/styles) are searchable too
+        doc_tokens.update(_tokenize_search_text(os.path.dirname(doc.get("rel_path", ""))))
+
+        for token in doc_tokens:
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                self.vocabulary_dirty = True
+            self.tokens[token].add(doc_id)
+        self.doc_tokens[doc_id] = doc_tokens
+
+        for field, postings in self.facets.items():
+            postings.setdefault(str(doc.get(field) or ""), set()).add(doc_id)
+
+        if doc.get("similarity_signature"):
+            self.similarity_lsh.add(doc_id, doc["similarity_signature"])
+        if doc.get("layout") and not doc.get("lora"):
+            for shape in doc["layout"]:
+                self.layouts.setdefault(shape, set()).add(doc_id)
+
+    def _remove_document(self, path):
+        doc_id = self.path_to_id.pop(path, None)
+        if doc_id is None:
+            return
+        for token in self.doc_tokens.pop(doc_id, ()):
+            ids = self.tokens.get(token)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.tokens[token]
+                    self.vocabulary_dirty = True
+        doc = self.docs.pop(doc_id, None)
+        self.rank.pop(doc_id, None)
+        self.similarity_lsh.remove(doc_id)
+        if doc is not None:
+            for shape in doc.get("layout") or ():
+                ids = self.layouts.get(shape)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self.layouts[shape]
+            for field, postings in self.facets.items():
+                value = str(doc.get(field) or "")
+                ids = postings.get(value)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del postings[value]
+
+    def _build_document(self, repo, file_path, stat_result):
+        rel_path = os.path.relpath(file_path, repo["path"])
+        name = os.path.basename(file_path)
+        folder = rel_path.split(os.sep)[0] if os.sep in rel_path else ""
+        doc = {
+            "path": file_path,
+            "name": name,
+            "rel_path": rel_path,
+            "folder": folder,
+            "repo_id": repo["id"],
+            "repo_name": repo["name"],
+            "size_bytes": stat_result.st_size,
+            "mtime_ns": stat_result.st_mtime_ns,
+            "model_type": "",
+            "base_model": "",
+            "architecture": "",
+            "output_name": ""
+        }
+
+        if name.lower().endswith(HEADER_FILE_EXTENSIONS):
+            try:
+                # Tensor shapes are needed for the similarity fields: one read gives both. The header
+                # cache is left alone: a refresh over every repository would evict what browsing uses
+                metadata, tensors = _read_model_tensors(file_path)
+            except Exception:
+                metadata, tensors = {}, {}
+                if name.lower().endswith(PICKLE_CHECKPOINT_EXTENSIONS):
+                    doc["model_type"] = "PyTorch Model/Ckpt"
+                    return doc
+            doc["model_type"] = classify_safetensor(name, metadata, list(tensors))
+            doc["base_model"] = _derive_base_model(metadata)
+            doc["architecture"] = str(metadata.get("modelspec.architecture") or metadata.get("general.architecture", "")) if isinstance(metadata, dict) else ""
+            doc["output_name"] = str(metadata.get("ss_output_name", "")) if isinstance(metadata, dict) else ""
+            if tensors:
+                try:
+                    doc.update(_similarity_fields(tensors))
+                except Exception:
+                    pass
+        return doc
+
+    def refresh(self, repositories):
+        """Incrementally bring the index in line with the repositories on disk"""
+        seen_paths = set()
+        changed = 0
+
+        for repo in repositories:
+            # Repositories on agent nodes are not visible from this host
+            if repo.get("node") or not os.path.isdir(repo["path"]):
+                continue
+            for root, dirs, files in os.walk(repo["path"]):
+                IO_SCHEDULER.throttle()
+                for file in files:
+                    if not file.lower().endswith(MODEL_FILE_EXTENSIONS):
+                        continue
+                    file_path = os.path.join(root, file)
+                    IO_SCHEDULER.throttle()
+                    try:
+                        stat_result = os.stat(file_path)
+                    except OSError:
+                        continue
+                    seen_paths.add(file_path)
+
+                    with self.lock:
+                        doc_id = self.path_to_id.get(file_path)
+                        existing = self.docs.get(doc_id) if doc_id else None
+                    if existing and existing["size_bytes"] == stat_result.st_size and \
+                       existing["mtime_ns"] == stat_result.st_mtime_ns and existing["repo_id"] == repo["id"] and \
+                       existing["repo_name"] == repo["name"]:
+                        continue
+
+                    # Header parsing happens outside the lock so queries are never blocked by disk I/O
+                    doc = self._build_document(repo, file_path, stat_result)
+                    with self.lock:
+                        self._remove_document(file_path)
+                        self._add_document(doc)
+                    changed += 1
+
+        with self.lock:
+            for path in [p for p in self.path_to_id if p not in seen_paths]:
+                self._remove_document(path)
+                changed += 1
+            self.ready = True
+            self.last_refresh = datetime.datetime.now().isoformat()
+
+        if changed:
+            self.save()
+        return changed
+
+    def schedule_refresh(self, repositories):
+        """Refresh the index in a background thread; coalesces requests made while one is running"""
+        repositories = [dict(r) for r in repositories]
+        with self.lock:
+            if self.refresh_thread and self.refresh_thread.is_alive():
+                self.refresh_pending = repositories
+                return
+            self.refresh_thread = threading.Thread(target=self._refresh_worker, args=(repositories,), daemon=True)
+            self.refresh_thread.start()
+
+    def _refresh_worker(self, repositories):
+        IO_SCHEDULER.enter_background()
+        while repositories is not None:
+            try:
+                self.refresh(repositories)
+            except Exception as e:
+                print(f"Error refreshing search index: {e}")
+            with self.lock:
+                repositories, self.refresh_pending = self.refresh_pending, None
+
+    # ---- persistence ----
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get("version", 1) != SEARCH_INDEX_VERSION:
+                return False
+            with self.lock:
+                for doc in data.get("documents", []):
+                    self._add_document(doc)
+                self.last_refresh = data.get("last_refresh")
+                self.ready = True
+            return True
+        except Exception as e:
+            print(f"Error loading search index: {e}")
+            return False
+
+    def save(self):
+        try:
+            with self.lock:
+                data = {"version": SEARCH_INDEX_VERSION, "last_refresh": self.last_refresh, "documents": list(self.docs.values())}
+            tmp_file = self.index_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.index_file)
+            return True
+        except Exception as e:
+            print(f"Error saving search index: {e}")
+            return False
+
+    # ---- queries ----
+
+    def _match_token(self, query_token):
+        """Return (doc_ids, exact_ids) for one query token using exact, prefix, then fuzzy matching.
+
+        doc_ids is the exact posting itself when no other token matched; callers must not mutate either set.
+        """
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.tokens)
+            self.vocabulary_dirty = False
+
+        exact = self.tokens.get(query_token) or set()
+        matched = exact
+        start = bisect.bisect_left(self.vocabulary, query_token)
+        end = bisect.bisect_left(self.vocabulary, query_token + "\uffff")
+        for token in self.vocabulary[start:end]:
+            if token != query_token:
+                if matched is exact:
+                    matched = set(exact)
+                matched.update(self.tokens[token])
+        if matched:
+            return matched, exact
+
+        # Fuzzy fallback, limited to tokens sharing the first character to stay fast
+        matched = set()
+        if len(query_token) >= 3:
+            start = bisect.bisect_left(self.vocabulary, query_token[0])
+            end = bisect.bisect_left(self.vocabulary, query_token[0] + "\uffff")
+            candidates = [t for t in self.vocabulary[start:end] if abs(len(t) - len(query_token)) <= 2]
+            for token in difflib.get_close_matches(query_token, candidates, n=5, cutoff=0.75):
+                matched.update(self.tokens[token])
+        return matched, exact
+
+    def _ranked(self, ids, limit, exclude=()):
+        """The first limit doc ids of ids in name order, skipping exclude"""
+        if self.rank_dirty:
+            self.ordered = sorted(self.docs, key=lambda d: self.docs[d]["name"].lower())
+            self.rank = {doc_id: position for position, doc_id in enumerate(self.ordered)}
+            self.rank_dirty = False
+        if len(ids) * 16 >= len(self.docs):
+            # Dense result sets: walking the name order finds limit hits after ~limit * docs / ids steps
+            top = []
+            if limit > 0:
+                for doc_id in self.ordered:
+                    if doc_id in ids and doc_id not in exclude:
+                        top.append(doc_id)
+                        if len(top) >= limit:
+                            break
+            return top
+        return heapq.nsmallest(limit, (d for d in ids if d not in exclude), key=self.rank.__getitem__)
+
+    def _facet_counts(self, result_ids):
+        """Facet value counts over result_ids (None means every document)"""
+        facets = {}
+        for field in SEARCH_FACET_FIELDS:
+            if field == "repo_id":
+                continue
+            postings = self.facets[field]
+            if result_ids is None:
+                counts = {value or "(none)": len(ids) for value, ids in postings.items()}
+            else:
+                counts = {}
+                # Every document has exactly one value per field, so the largest posting's count is
+                # whatever the other values leave over and is never intersected
+                ordered = sorted(postings.items(), key=lambda item: len(item[1]))
+                remaining = len(result_ids)
+                for value, ids in ordered[:-1]:
+                    count = len(result_ids & ids) if len(ids) < len(result_ids) else len(ids & result_ids)
+                    if count:
+                        counts[value or "(none)"] = count
+                        remaining -= count
+                if ordered and remaining:
+                    counts[ordered[-1][0] or "(none)"] = remaining
+            facets[field] = counts
+        return facets
+
+    def search(self, query, filters=None, limit=50, facets=False):
+        """Search the index; returns matching documents, plus facet counts over all matches when asked"""
+        filters = filters or {}
+        query_tokens = [t for t in re.split(r'[^0-9a-z]+', (query or "").lower()) if t]
+
+        with self.lock:
+            result_ids = None   # None: every document, so empty queries never copy the whole index
+            # Documents matching every query token exactly are ranked first; while no token has
+            # matched by prefix or fuzzily, every result is an exact match and exact_ids stays None
+            exact_ids = None
+            all_exact = True
+            for query_token in query_tokens:
+                ids, exact = self._match_token(query_token)
+                if all_exact and ids is not exact:
+                    all_exact = False
+                    exact_ids = result_ids
+                result_ids = ids if result_ids is None else result_ids & ids
+                if not all_exact:
+                    exact_ids = exact if exact_ids is None else exact_ids & exact
+                if not result_ids:
+                    break
+
+            # Filters are answered from the facet postings, smallest posting first
+            for ids in sorted((self.facets.get(field, {}).get(str(value), set()) for field, value in filters.items()), key=len):
+                result_ids = ids if result_ids is None else result_ids & ids
+
+            matches = self.docs if result_ids is None else result_ids
+            if all_exact:
+                top = self._ranked(matches, limit)
+            else:
+                exact_ids = exact_ids & result_ids
+                top = self._ranked(exact_ids, limit)
+                if len(top) < limit:
+                    top += self._ranked(matches, limit - len(top), exact_ids)
+
+            result = {
+                "query": query,
+                "total": len(matches),
+                "results": [_public_document(self.docs[d]) for d in top],
+                "indexed_files": len(self.docs),
+                "ready": self.ready,
+                "last_refresh": self.last_refresh
+            }
+            if facets:
+                result["facets"] = self._facet_counts(result_ids)
+            return result
+
+    def similar(self, path, limit=20, min_score=0.5):
+        """Indexed files whose tensor names and shapes overlap path's, best first (near-duplicates, finetunes)"""
+        with self.lock:
+            doc = self.docs.get(self.path_to_id.get(path))
+            if doc is None or not doc.get("similarity_signature"):
+                return None
+            signature = doc["similarity_signature"]
+            candidates = self.similarity_lsh.candidates(signature) - {self.path_to_id[path]}
+            scored = []
+            for doc_id in candidates:
+                score = _estimate_jaccard(signature, self.docs[doc_id]["similarity_signature"])
+                if score >= min_score:
+                    scored.append((score, doc_id))
+            top = heapq.nlargest(limit, scored)
+            return {
+                "path": path,
+                "candidates": len(candidates),
+                "results": [dict(_public_document(self.docs[d]), score=round(score, 3)) for score, d in top]
+            }
+
+    def compatible_bases(self, path, limit=20, min_score=0.8):
+        """
+        Non-LoRA files containing the layer dimensions path's LoRA patches, best first.
+        The score is the share of the LoRA's layer shapes found in the base.
+        """
+        with self.lock:
+            doc = self.docs.get(self.path_to_id.get(path))
+            if doc is None or not doc.get("layout"):
+                return None
+            layout = doc["layout"]
+            shared = collections.Counter()
+            for shape in layout:
+                shared.update(self.layouts.get(shape, ()))
+            shared.pop(self.path_to_id[path], None)
+            scored = []
+            for doc_id, count in shared.items():
+                containment = count / len(layout)
+                if containment >= min_score:
+                    scored.append((containment, doc_id))
+            top = heapq.nlargest(limit, scored)
+            return {
+                "path": path,
+                "lora": bool(doc.get("lora")),
+                "candidates": len(shared),
+                "results": [dict(_public_document(self.docs[d]), score=round(score, 3)) for score, d in top]
+            }
+
+def _installations_seeing_file(config, doc, standard_folders):
+    """List the installations whose models/ folder exposes the given indexed file"""
+    folder = doc.get("folder", "")
+    if not folder:
+        return []
+    if folder not in standard_folders and folder not in config.get_enabled_custom_folders(doc["repo_id"]):
+        return []
+    # Only loras/checkpoints are linked recursively; other folders link their top level only
+    if folder not in RECURSIVE_LINK_FOLDERS and doc["rel_path"].count(os.sep) > 1:
+        return []
+
+    installations = []
+    for install in config.data["comfyui_installations"]:
+        if doc["repo_id"] in config.data["links"].get(str(install["id"]), []):
+            installations.append({"id": install["id"], "name": install["name"], "path": install["path"]})
+    return installations
+
+SEARCH_INDEX = ModelSearchIndex()
+
+# Page-cache warmup defaults; override with the "page_cache_warmup" config setting
+PAGE_CACHE_WARMUP_DEFAULTS = {
+    "max_bytes": 16 * 1024 ** 3,   # warm set budget, further capped by available memory
+    "memory_fraction": 0.5,        # share of MemAvailable the warm set may use
+    "chunk_bytes": 8 * 1024 ** 2   # sequential read size
+}
+
+_PROT_READ = 1
+_MAP_SHARED = 1
+
+def _page_cache_residency(file_path, size):
+    """Bytes of a file currently in the page cache (mincore), or None where unsupported"""
+    if size == 0:
+        return 0
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+    except (OSError, AttributeError):
+        return None
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        addr = libc.mmap(None, size, _PROT_READ, _MAP_SHARED, fd, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            return None
+        try:
+            pages = (size + page_size - 1) // page_size
+            vec = (ctypes.c_ubyte * pages)()
+            if libc.mincore(ctypes.c_void_p(addr), size, vec) != 0:
+                return None
+            resident_pages = sum(1 for page in vec if page & 1)
+        finally:
+            libc.munmap(ctypes.c_void_p(addr), size)
+    finally:
+        os.close(fd)
+    return min(size, resident_pages * page_size)
+
+class PageCacheWarmer:
+    """
+    Pre-reads an installation's "warm set" of models into the page cache so ComfyUI's
+    first load of them is a memory copy instead of a cold disk read.
+
+    The warm set is either explicit (install["warm_set"], paths relative to models/ such as
+    "checkpoints/sdxl.safetensors") or the most recently accessed linked models, up to the
+    memory budget. Files are resolved through the installation's overlay plan, so each entry
+    maps to the real file ComfyUI would open.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {}  # install_id -> progress/report of the last warmup
+
+    def resolve_models(self, install, config, linker):
+        """models/-relative path -> real file for every model file the installation sees"""
+        plan = linker.plan_overlay(config.get_linked_repositories(install["id"]), config)
+        models = {}
+        for folder, folder_plan in plan["folders"].items():
+            for rel_path, (src_file, _) in folder_plan.items():
+                if src_file.lower().endswith(MODEL_FILE_EXTENSIONS):
+                    models[os.path.join(folder, rel_path)] = src_file
+        return models
+
+    def budget_bytes(self, settings=None):
+        settings = dict(PAGE_CACHE_WARMUP_DEFAULTS, **(settings or {}))
+        budget = settings["max_bytes"]
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        budget = min(budget, int(int(line.split()[1]) * 1024 * settings["memory_fraction"]))
+                        break
+        except (OSError, ValueError):
+            pass
+        return budget
+
+    def select_warm_set(self, install, config, linker, settings=None):
+        """Pick the files to warm: explicit entries first, otherwise by most recent access, within budget"""
+        models = self.resolve_models(install, config, linker)
+        budget = self.budget_bytes(settings)
+        candidates = []
+        explicit = install.get("warm_set") or []
+        names = [name for name in explicit if name in models] if explicit else list(models)
+        for name in names:
+            try:
+                st = os.stat(models[name])
+            except OSError:
+                continue
+            candidates.append((name, models[name], st.st_size, st.st_atime))
+        if not explicit:
+            candidates.sort(key=lambda c: c[3], reverse=True)
+
+        selected = []
+        total = 0
+        for name, path, size, _ in candidates:
+            if total + size > budget:
+                continue
+            selected.append({"name": name, "path": path, "size_bytes": size})
+            total += size
+        return {"files": selected, "total_bytes": total, "budget_bytes": budget, "explicit": bool(explicit),
+                "missing": [name for name in explicit if name not in models]}
+
+    def residency(self, warm_set):
+        """Add resident_bytes/resident_pct to each file of a warm set"""
+        resident_total = 0
+        for entry in warm_set["files"]:
+            try:
+                resident = _page_cache_residency(entry["path"], entry["size_bytes"])
+            except OSError:
+                resident = None
+            entry["resident_bytes"] = resident
+            entry["resident_pct"] = round(100.0 * resident / entry["size_bytes"], 1) if resident is not None and entry["size_bytes"] else None
+            resident_total += resident or 0
+        warm_set["resident_bytes"] = resident_total
+        return warm_set
+
+    def start(self, install_id, warm_set, settings=None):
+        """Warm the files in a background thread; returns False if a warmup is already running"""
+        settings = dict(PAGE_CACHE_WARMUP_DEFAULTS, **(settings or {}))
+        with self.lock:
+            job = self.jobs.get(install_id)
+            if job and job["running"]:
+                return False
+            job = self.jobs[install_id] = {
+                "running": True, "started": datetime.datetime.now().isoformat(), "finished": None,
+                "files_done": 0, "files_total": len(warm_set["files"]),
+                "bytes_read": 0, "bytes_total": warm_set["total_bytes"], "errors": []
+            }
+        threading.Thread(target=self._warm, args=(job, warm_set["files"], settings["chunk_bytes"]),
+                         name="page-cache-warmup", daemon=True).start()
+        return True
+
+    def status(self, install_id):
+        with self.lock:
+            job = self.jobs.get(install_id)
+            return dict(job, errors=list(job["errors"])) if job else None
+
+    def _warm(self, job, files, chunk_bytes):
+        # Warming is opt-in work nobody waits on: idle I/O class, but no rate limit
+        IO_SCHEDULER.enter_background()
+        buffer = bytearray(chunk_bytes)
+        view = memoryview(buffer)
+        for entry in files:
+            try:
+                with _open_noatime(entry["path"]) as f:
+                    if hasattr(os, "posix_fadvise"):
+                        # Let the kernel start large sequential readahead for the whole file
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                    while True:
+                        n = f.readinto(view)
+                        if not n:
+                            break
+                        with self.lock:
+                            job["bytes_read"] += n
+            except OSError as e:
+                with self.lock:
+                    job["errors"].append({"name": entry["name"], "error": str(e)})
+            with self.lock:
+                job["files_done"] += 1
+        with self.lock:
+            job["running"] = False
+            job["finished"] = datetime.datetime.now().isoformat()
+
+WARMER = PageCacheWarmer()
+
+# Tiering between a fast and a slow repository; configured with the "tiering" config setting
+TIERING_DEFAULTS = {
+    "fast_repo_id": None,
+    "slow_repo_id": None,
+    "fast_capacity_bytes": None,   # default: free space plus the fast tier's own files, less the reserve
+    "fast_reserve_bytes": None,    # kept free on the fast filesystem; default: 10% of its size
+    "cold_after_days": 30,         # fast-tier files unused this long are demoted
+    "hot_within_days": 7,          # slow-tier files used this recently are promoted
+    "min_hot_accesses": 0          # logged manager accesses also required; 0 = atime recency alone qualifies
+}
+TIERING_COPY_CHUNK = 8 * 1024 ** 2
+
+class TieringEngine:
+    """
+    Moves model files between a fast and a slow repository by how recently and how often
+    they are used (atime, plus the manager's own access log in the state store).
+
+    A move keeps the file's path relative to the repository. It copies to a temporary file,
+    flushes it to disk, drops it from the page cache where the platform allows, compares it
+    with the original byte for byte and renames it into place. Every symlink to the old file
+    (live models/ trees and staged profile trees of every installation) is then swapped to
+    the new file before the original is deleted, so no link is ever dangling.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.job = None
+
+    @staticmethod
+    def settings(config):
+        return dict(TIERING_DEFAULTS, **config.data.get("tiering", {}))
+
+    def tier_repositories(self, config):
+        """(fast repo, slow repo), or None when tiering is not configured"""
+        settings = self.settings(config)
+        repos_by_id = {r["id"]: r for r in config.data["repositories"]}
+        fast = repos_by_id.get(settings["fast_repo_id"])
+        slow = repos_by_id.get(settings["slow_repo_id"])
+        if not fast or not slow or fast["id"] == slow["id"] or fast.get("node") or slow.get("node"):
+            return None
+        return fast, slow
+
+    def _files(self, repo, linker, config, access_log):
+        """(folder, rel_path) -> file info for every linkable model file of a repository"""
+        files = {}
+        for folder, entries in linker._enumerate_repository(repo, config).items():
+            if isinstance(entries, dict):
+                continue
+            for rel_path, src_file in entries:
+                if not src_file.lower().endswith(MODEL_FILE_EXTENSIONS):
+                    continue
+                try:
+                    st = os.stat(src_file)
+                except OSError:
+                    continue
+                logged_access, hits = access_log.get(src_file, (0.0, 0))
+                files[(folder, rel_path)] = {
+                    "folder": folder,
+                    "rel_path": rel_path,
+                    "path": src_file,
+                    "size_bytes": st.st_size,
+                    "last_used": max(st.st_atime, logged_access),
+                    "hits": hits
+                }
+        return files
+
+    def plan(self, config, linker):
+        """Decide which files to demote and promote; nothing is moved"""
+        tiers = self.tier_repositories(config)
+        if tiers is None:
+            return {"configured": False, "demote": [], "promote": []}
+        fast, slow = tiers
+        settings = self.settings(config)
+        access_log = config.state.get_file_access()
+        fast_files = self._files(fast, linker, config, access_log)
+        slow_files = self._files(slow, linker, config, access_log)
+
+        capacity = settings["fast_capacity_bytes"]
+        if capacity is None:
+            # The fast disk may also hold the OS, ComfyUI or other data: only space that is free
+            # now, or already taken by the fast tier itself, can be used
+            fs = os.statvfs(fast["path"])
+            reserve = settings["fast_reserve_bytes"]
+            if reserve is None:
+                reserve = int(fs.f_blocks * fs.f_frsize * 0.1)
+            fast_bytes = sum(f["size_bytes"] for f in fast_files.values())
+            capacity = max(0, fs.f_bavail * fs.f_frsize + fast_bytes - reserve)
+        now = time.time()
+        cold_before = now - settings["cold_after_days"] * 86400
+        hot_after = now - settings["hot_within_days"] * 86400
+
+        # Files present in both tiers are left alone: moving either would clobber the other
+        demote = [f for key, f in fast_files.items() if f["last_used"] < cold_before and key not in slow_files]
+        demoted = {(f["folder"], f["rel_path"]) for f in demote}
+        used = sum(f["size_bytes"] for f in fast_files.values()) - sum(f["size_bytes"] for f in demote)
+
+        promote = []
+        candidates = sorted(
+            (f for key, f in slow_files.items()
+             if f["last_used"] >= hot_after and f["hits"] >= settings["min_hot_accesses"] and key not in fast_files),
+            key=lambda f: (f["last_used"], f["hits"]), reverse=True
+        )
+        for f in candidates:
+            if used + f["size_bytes"] <= capacity:
+                promote.append(f)
+                used += f["size_bytes"]
+
+        # Still over capacity: demote the coldest remaining fast-tier files
+        for key, f in sorted(fast_files.items(), key=lambda item: (item[1]["last_used"], item[1]["hits"])):
+            if used <= capacity:
+                break
+            if key in demoted or key in slow_files:
+                continue
+            demote.append(f)
+            used -= f["size_bytes"]
+
+        return {
+            "configured": True,
+            "fast_repo_id": fast["id"],
+            "slow_repo_id": slow["id"],
+            "capacity_bytes": capacity,
+            "fast_used_after_bytes": used,
+            "demote": demote,
+            "promote": promote
+        }
+
+    def ensure_tier_links(self, config):
+        """
+        Make every installation that links one tier link the other as well (right after it),
+        so moved files stay visible. Returns the installations whose links changed.
+        """
+        tiers = self.tier_repositories(config)
+        if tiers is None:
+            return []
+        tier_ids = [tiers[0]["id"], tiers[1]["id"]]
+        changed = []
+        for install in config.data["comfyui_installations"]:
+            links = config.data["links"].get(str(install["id"]), [])
+            present = [repo_id for repo_id in tier_ids if repo_id in links]
+            if len(present) == 1:
+                other = tier_ids[1] if present[0] == tier_ids[0] else tier_ids[0]
+                links.insert(links.index(present[0]) + 1, other)
+                changed.append(install)
+        return changed
+
+    def start(self, plan, config, linker):
+        """Run a plan in a background thread; returns False if a run is already in progress"""
+        tiers = self.tier_repositories(config)
+        if tiers is None:
+            return False
+        with self.lock:
+            if self.job and self.job["running"]:
+                return False
+            self.job = {
+                "running": True, "started": datetime.datetime.now().isoformat(), "finished": None,
+                "moved": 0, "bytes_moved": 0, "links_retargeted": 0,
+                "total": len(plan["demote"]) + len(plan["promote"]), "errors": []
+            }
+            job = self.job
+        fast, slow = tiers
+        moves = [(f, fast, slow) for f in plan["demote"]] + [(f, slow, fast) for f in plan["promote"]]
+        install_paths = self._link_tree_paths(config, linker)
+        repositories = [dict(r) for r in config.data["repositories"]]
+        threading.Thread(target=self._run, args=(job, moves, install_paths, config.state, linker, repositories),
+                         name="tiering", daemon=True).start()
+        return True
+
+    def status(self):
+        with self.lock:
+            return dict(self.job, errors=list(self.job["errors"])) if self.job else None
+
+    @staticmethod
+    def _link_tree_paths(config, linker):
+        """Every path whose models/ folder may hold links: installations and their staged profiles"""
+        paths = []
+        for install in config.data["comfyui_installations"]:
+            if install.get("link_mode") == LINK_MODE_CONFIG:
+                continue
+            paths.append(install["path"])
+            for name in install.get("profiles", {}):
+                staged = linker.profiles.staged_install_path(install["path"], name)
+                if os.path.isdir(os.path.join(staged, "models")):
+                    paths.append(staged)
+        return paths
+
+    def _run(self, job, moves, install_paths, state, linker, repositories):
+        IO_SCHEDULER.enter_background()
+        for entry, from_repo, to_repo in moves:
+            dst = os.path.join(to_repo["path"], entry["folder"], entry["rel_path"])
+            try:
+                self._copy_verified(entry["path"], dst)
+                # Links and manifests are otherwise only changed by requests, which hold this lock
+                with _request_lock:
+                    retargeted = self._retarget_links(entry, dst, from_repo, to_repo, install_paths, linker)
+                    os.remove(entry["path"])
+                    state.move_file_access(entry["path"], dst)
+            except (OSError, ValueError) as e:
+                with self.lock:
+                    job["errors"].append({"path": entry["path"], "error": str(e)})
+                continue
+            with self.lock:
+                job["moved"] += 1
+                job["bytes_moved"] += entry["size_bytes"]
+                job["links_retargeted"] += retargeted
+
+        if job["moved"]:
+            SEARCH_INDEX.schedule_refresh(repositories)
+        with self.lock:
+            job["running"] = False
+            job["finished"] = datetime.datetime.now().isoformat()
+
+    @staticmethod
+    def _copy_verified(src, dst):
+        """Copy src next to dst, compare the copy on disk with the original, then rename it into place"""
+        if os.path.lexists(dst):
+            raise ValueError(f"{dst} already exists")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        src_stat = os.stat(src)  # before the copy reads bump the access time
+        tmp = dst + ".tiering-tmp"
+        try:
+            with _open_noatime(src) as fin, open(tmp, "wb") as fout:
+                while True:
+                    chunk = fin.read(TIERING_COPY_CHUNK)
+                    if not chunk:
+                        break
+                    fout.write(chunk)
+                    IO_SCHEDULER.throttle(nbytes=len(chunk))
+                fout.flush()
+                os.fsync(fout.fileno())
+                # Drop the copy's cached pages so the comparison below reads what reached the disk
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fout.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            os.utime(tmp, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+            with _open_noatime(src) as a, open(tmp, "rb") as b:
+                while True:
+                    chunk_a = a.read(TIERING_COPY_CHUNK)
+                    chunk_b = b.read(TIERING_COPY_CHUNK)
+                    IO_SCHEDULER.throttle(nbytes=len(chunk_a) + len(chunk_b))
+                    if chunk_a != chunk_b:
+                        raise ValueError(f"Copy of {src} does not match the original")
+                    if not chunk_a:
+                        break
+            os.rename(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _retarget_links(entry, dst, from_repo, to_repo, install_paths, linker):
+        """
+        Point every link to the old file at its new location and move its manifest entry to the
+        new repository, saving each manifest right away; returns the number of links swapped
+        """
+        count = 0
+        for install_path in install_paths:
+            dest_file = os.path.join(install_path, "models", entry["folder"], entry["rel_path"])
+            try:
+                if os.readlink(dest_file) != entry["path"]:
+                    continue
+            except OSError:
+                continue
+            tmp_link = dest_file + ".tiering-link"
+            if os.path.lexists(tmp_link):
+                os.remove(tmp_link)
+            os.symlink(dst, tmp_link)
+            os.replace(tmp_link, dest_file)
+            count += 1
+
+            # Ownership moves to the repository that now holds the file
+            old_manifest = linker.manifests.load(install_path, from_repo["path"])
+            if old_manifest is not None and entry["rel_path"] in old_manifest["folders"].get(entry["folder"], []):
+                old_manifest["folders"][entry["folder"]].remove(entry["rel_path"])
+                linker.manifests.save(old_manifest)
+            new_manifest = linker.manifests.load(install_path, to_repo["path"]) or \
+                linker.manifests.new(install_path, to_repo["path"])
+            LinkManifestStore.add_entries(new_manifest, entry["folder"], [entry["rel_path"]])
+            linker.manifests.save(new_manifest)
+        return count
+
+TIERING = TieringEngine()
+
+# Integrity scan defaults; override with the "integrity" config setting
+INTEGRITY_DEFAULTS = {
+    "max_workers": 16,               # files checked in parallel
+    "deep_sample_tensors": 16,       # tensors whose data a deep scan reads
+    "deep_sample_bytes": 64 * 1024   # bytes read from each sampled tensor
+}
+
+# Issues that make a file unloadable; everything else marks it suspect
+INTEGRITY_FATAL_ISSUES = {"unreadable_header", "truncated", "bad_offsets", "size_mismatch", "overlap", "read_error"}
+
+# Issues listed per file before the rest are only counted
+INTEGRITY_MAX_ISSUES = 20
+
+def _check_safetensors_integrity(file_path, deep=False, settings=None):
+    """
+    Check a safetensors file against its own header: the data region must end exactly at the
+    end of the file, and every tensor's data_offsets must match its dtype and shape and follow
+    the previous tensor without gaps or overlap. Only the header is read unless deep is set,
+    in which case a sample of tensor regions and the end of the file are read back as well.
+    Returns {"path", "size_bytes", "expected_bytes", "status": ok/suspect/corrupt, "issues"}.
+    """
+    settings = dict(INTEGRITY_DEFAULTS, **(settings or {}))
+    result = {"path": file_path, "size_bytes": None, "expected_bytes": None, "status": "ok", "issues": []}
+
+    def issue(code, message):
+        if len(result["issues"]) < INTEGRITY_MAX_ISSUES:
+            result["issues"].append({"code": code, "message": message})
+        if code in INTEGRITY_FATAL_ISSUES:
+            result["status"] = "corrupt"
+        elif result["status"] == "ok":
+            result["status"] = "suspect"
+
+    with _open_noatime(file_path) as f:
+        size = result["size_bytes"] = os.fstat(f.fileno()).st_size
+        try:
+            header, header_length = _read_safetensor_header_from(f)
+            if not isinstance(header, dict):
+                raise ValueError("Header is not a JSON object")
+        except (ValueError, UnicodeDecodeError) as e:
+            issue("unreadable_header", str(e))
+            return result
+        IO_SCHEDULER.throttle(nbytes=8 + header_length)
+
+        data_start = 8 + header_length
+        regions = []
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            offsets = info.get("data_offsets") if isinstance(info, dict) else None
+            if (not isinstance(offsets, list) or len(offsets) != 2 or
+                    not all(isinstance(o, int) and o >= 0 for o in offsets) or offsets[0] > offsets[1]):
+                issue("bad_offsets", f"{name}: invalid data_offsets {offsets!r}")
+                continue
+            element_size = DTYPE_SIZES.get(info.get("dtype"))
+            shape = info.get("shape")
+            if element_size and isinstance(shape, list) and all(isinstance(d, int) for d in shape):
+                expected = element_size
+                for dim in shape:
+                    expected *= dim
+                if offsets[1] - offsets[0] != expected:
+                    issue("size_mismatch", f"{name}: {offsets[1] - offsets[0]} bytes for {info.get('dtype')} {shape}, expected {expected}")
+            regions.append((offsets[0], offsets[1], name))
+
+        regions.sort()
+        data_end = 0
+        for begin, end, name in regions:
+            if begin < data_end:
+                issue("overlap", f"{name} starts at {begin}, inside the previous tensor (ends at {data_end})")
+            elif begin > data_end:
+                issue("gap", f"{begin - data_end} unused bytes before {name}")
+            data_end = max(data_end, end)
+
+        expected_size = result["expected_bytes"] = data_start + data_end
+        if size < expected_size:
+            issue("truncated", f"File is {size} bytes, the header describes {expected_size} ({expected_size - size} missing)")
+        elif size > expected_size:
+            issue("trailing_bytes", f"{size - expected_size} bytes after the last tensor")
+
+        if deep and regions:
+            _sample_tensor_regions(f, data_start, regions, min(size, expected_size), settings, issue)
+    return result
+
+def _sample_tensor_regions(f, data_start, regions, readable_end, settings, issue):
+    """Deep integrity check: read the start of evenly spaced tensors and the last bytes of the data region"""
+    sample_bytes = max(1, settings["deep_sample_bytes"])
+    count = max(1, settings["deep_sample_tensors"])
+    step = max(1, len(regions) // count)
+    samples = [(data_start + begin, min(end - begin, sample_bytes), name)
+               for begin, end, name in regions[::step][:count] if end > begin]
+    # The tail is where an interrupted or preallocated download ends
+    tail_length = min(sample_bytes, readable_end - data_start)
+    if tail_length > 0:
+        samples.append((readable_end - tail_length, tail_length, "end of data"))
+
+    buffer = bytearray(sample_bytes)
+    for offset, length, name in samples:
+        if offset + length > readable_end:
+            continue  # Already reported as truncated
+        view = memoryview(buffer)[:length]
+        IO_SCHEDULER.throttle(nbytes=length)
+        try:
+            f.seek(offset)
+            n = f.readinto(view)
+        except OSError as e:
+            issue("read_error", f"{name}: {e}")
+            continue
+        if n < length:
+            issue("read_error", f"{name}: short read at offset {offset}")
+        elif name == "end of data" and length >= 4096 and view.tobytes().count(0) == length:
+            issue("zero_filled_tail", f"The last {length} bytes of tensor data are all zero (incomplete preallocated download?)")
+
+class IntegrityScanner:
+    """
+    Flags truncated or corrupt .safetensors files across repositories before ComfyUI trips
+    over them mid-workflow. The default pass reads headers only, in parallel, so it costs the
+    same per file whatever the model size; a deep pass also reads back a sample of tensor data.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.job = None
+
+    @staticmethod
+    def _find_files(repositories):
+        files = []
+        for repo in repositories:
+            for root, dirs, names in os.walk(repo["path"]):
+                IO_SCHEDULER.throttle()
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in names:
+                    if name.lower().endswith('.safetensors'):
+                        files.append((repo, os.path.join(root, name)))
+        return files
+
+    def start(self, repositories, deep=False, settings=None):
+        """Scan the repositories in a background thread; returns False if a scan is already running"""
+        settings = dict(INTEGRITY_DEFAULTS, **(settings or {}))
+        with self.lock:
+            if self.job and self.job["running"]:
+                return False
+            self.job = {
+                "running": True, "started": datetime.datetime.now().isoformat(), "finished": None,
+                "deep": bool(deep), "repo_ids": [repo["id"] for repo in repositories],
+                "files_done": 0, "files_total": None, "bytes_checked": 0,
+                "corrupt": [], "suspect": [], "errors": []
+            }
+            job = self.job
+        threading.Thread(target=self._run, args=(job, [dict(r) for r in repositories], bool(deep), settings),
+                         name="integrity-scan", daemon=True).start()
+        return True
+
+    def status(self):
+        with self.lock:
+            if not self.job:
+                return None
+            return dict(self.job, corrupt=list(self.job["corrupt"]), suspect=list(self.job["suspect"]),
+                        errors=list(self.job["errors"]))
+
+    def _check(self, job, repo, file_path, deep, settings):
+        IO_SCHEDULER.throttle()
+        try:
+            result = _check_safetensors_integrity(file_path, deep, settings)
+        except Exception as e:
+            with self.lock:
+                job["errors"].append({"path": file_path, "error": str(e)})
+                job["files_done"] += 1
+            return
+        METRICS.inc("model_manager_integrity_files_total", status=result["status"])
+        result["repo_id"] = repo["id"]
+        result["rel_path"] = os.path.relpath(file_path, repo["path"])
+        with self.lock:
+            job["files_done"] += 1
+            job["bytes_checked"] += result["size_bytes"] or 0
+            if result["status"] != "ok":
+                job[result["status"]].append(result)
+
+    def _run(self, job, repositories, deep, settings):
+        IO_SCHEDULER.enter_background()
+        files = self._find_files(repositories)
+        with self.lock:
+            job["files_total"] = len(files)
+        # Workers share the background I/O budget with the search refresh, warmer and tiering
+        with ThreadPoolExecutor(max_workers=max(1, settings["max_workers"]),
+                                initializer=IO_SCHEDULER.enter_background) as executor:
+            for repo, file_path in files:
+                executor.submit(self._check, job, repo, file_path, deep, settings)
+        with self.lock:
+            job["corrupt"].sort(key=lambda r: r["path"])
+            job["suspect"].sort(key=lambda r: r["path"])
+            job["running"] = False
+            job["finished"] = datetime.datetime.now().isoformat()
+            summary = {"finished": job["finished"], "deep": deep, "files": job["files_done"],
+                       "corrupt": len(job["corrupt"]), "suspect": len(job["suspect"])}
+        _log_event(logging.INFO, "integrity_scan_done", **summary)
+        DASHBOARD.publish("integrity", None, summary)
+
+INTEGRITY = IntegrityScanner()
+
+# Downscaled preview images, next to the configuration file
+THUMBNAIL_DIR = "model_manager_thumbnails"
+
+# Thumbnail defaults; override with the "thumbnails" config setting
+THUMBNAIL_DEFAULTS = {
+    "enabled": True,
+    "size": 256,                          # longest edge, in pixels
+    "format": "webp",                     # "webp" or "jpeg"
+    "quality": 80,
+    "max_cache_bytes": 256 * 1024 ** 2,   # least recently served thumbnails are evicted past this
+    "workers": 2
+}
+
+# Preview sidecars looked up for a model file, in order ("<base><suffix>")
+PREVIEW_IMAGE_SUFFIXES = ('.preview.png', '.preview.jpg', '.preview.jpeg', '.preview.webp', '.png', '.jpg', '.jpeg', '.webp')
+THUMBNAIL_CONTENT_TYPES = {
+    '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.webp': 'image/webp'
+}
+
+def _find_preview_image(file_name, names):
+    """Sidecar preview image name for a model file, given the names in its directory, or None"""
+    base = file_name
+    for extension in MODEL_FILE_EXTENSIONS:
+        if file_name.lower().endswith(extension):
+            base = file_name[:-len(extension)]
+            break
+    else:
+        return None
+    for suffix in PREVIEW_IMAGE_SUFFIXES:
+        if base + suffix in names:
+            return base + suffix
+    return None
+
+class ThumbnailCache:
+    """
+    Content-addressed, size-capped cache of downscaled preview images.
+
+    A thumbnail is named by the SHA-256 of its source image plus the rendering settings, so
+    identical previews share one file and the name doubles as the ETag. Thumbnails are rendered
+    on first request on a small worker pool; concurrent requests for the same image share one job.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_DIR):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.pool = None
+        self.pool_size = 0
+        self.pending = {}     # cache file name -> Future
+        self.digests = {}     # (path, size, mtime_ns) -> source digest
+        self.entries = None   # cache file name -> [size, last_used]; loaded on first use
+        self.total_bytes = 0
+
+    def _load_entries(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        stat_result = entry.stat()
+                        self.entries[entry.name] = [stat_result.st_size, stat_result.st_mtime]
+                        self.total_bytes += stat_result.st_size
+        except FileNotFoundError:
+            pass
+
+    def _source_digest(self, image_path, stat_result):
+        key = (image_path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self.lock:
+            digest = self.digests.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with _open_noatime(image_path) as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            with self.lock:
+                self.digests[key] = digest
+        return digest
+
+    def _render(self, image_path, cache_path, settings):
+        with Image.open(image_path) as image:
+            # JPEG sources decode at a reduced scale directly
+            image.draft("RGB", (settings["size"], settings["size"]))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image.thumbnail((settings["size"], settings["size"]))
+            if settings["format"] == "jpeg" and image.mode == "RGBA":
+                image = image.convert("RGB")
+            temp_path = cache_path + ".tmp"
+            image.save(temp_path, "WEBP" if settings["format"] == "webp" else "JPEG", quality=settings["quality"])
+        os.replace(temp_path, cache_path)
+        return os.path.getsize(cache_path)
+
+    def _evict(self, max_bytes):
+        """Remove least recently served thumbnails until the cache fits; call with the lock held"""
+        if self.total_bytes <= max_bytes:
+            return
+        for name, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            del self.entries[name]
+            self.total_bytes -= size
+
+    def get(self, image_path, settings=None):
+        """
+        Thumbnail for a preview image: (file path, content type, etag, result), where result is
+        "hit", "generated" or "original" (Pillow unavailable or thumbnails disabled).
+        """
+        settings = dict(THUMBNAIL_DEFAULTS, **(settings or {}))
+        stat_result = os.stat(image_path)
+        if not PIL_AVAILABLE or not settings["enabled"]:
+            content_type = THUMBNAIL_CONTENT_TYPES.get(os.path.splitext(image_path)[1].lower(), 'application/octet-stream')
+            etag = hashlib.sha1(f"{image_path}:{stat_result.st_size}:{stat_result.st_mtime_ns}".encode()).hexdigest()
+            return image_path, content_type, etag, "original"
+
+        digest = self._source_digest(image_path, stat_result)
+        extension = "webp" if settings["format"] == "webp" else "jpg"
+        name = f"{digest[:40]}-{settings['size']}q{settings['quality']}.{extension}"
+        cache_path = os.path.join(self.cache_dir, name)
+        content_type = "image/webp" if extension == "webp" else "image/jpeg"
+
+        with self.lock:
+            self._load_entries()
+            entry = self.entries.get(name)
+            if entry is not None:
+                if os.path.exists(cache_path):
+                    entry[1] = time.time()
+                    return cache_path, content_type, name, "hit"
+                # Removed behind our back; render it again
+                del self.entries[name]
+                self.total_bytes -= entry[0]
+            future = self.pending.get(name)
+            if future is None:
+                if self.pool is None or self.pool_size != settings["workers"]:
+                    if self.pool is not None:
+                        self.pool.shutdown(wait=False)
+                    self.pool = ThreadPoolExecutor(max_workers=settings["workers"], thread_name_prefix="thumbnail")
+                    self.pool_size = settings["workers"]
+                os.makedirs(self.cache_dir, exist_ok=True)
+                future = self.pool.submit(self._render, image_path, cache_path, settings)
+                self.pending[name] = future
+
+        try:
+            size = future.result()
+        finally:
+            with self.lock:
+                self.pending.pop(name, None)
+        with self.lock:
+            if name not in self.entries:
+                self.entries[name] = [size, time.time()]
+                self.total_bytes += size
+                self._evict(settings["max_cache_bytes"])
+        return cache_path, content_type, name, "generated"
+
+THUMBNAILS = ThumbnailCache()
+
+# Routes reported by name in the request metrics; anything else is grouped as "other"
+METRIC_ROUTES = {
+    "/", "/metrics", "/favicon.ico", "/inspector",
+    "/api/repositories", "/api/installations", "/api/links", "/api/config", "/api/installation_summary",
+    "/api/dashboard", "/api/events",
+    "/api/repository_folders", "/api/check_path", "/api/link_status", "/api/browse", "/api/analyze_file",
+    "/api/search", "/api/search/rebuild", "/api/similar", "/api/compatible_bases", "/api/link", "/api/unlink", "/api/perform_link", "/api/perform_unlink",
+    "/api/perform_link_batch", "/api/link_priority", "/api/overlay_plan",
+    "/api/link_mode", "/api/profiles", "/api/profiles/activate", "/api/profiles/delete",
+    "/api/warmup", "/api/tiering", "/api/thumbnail", "/api/tiering/settings", "/api/tiering/run",
+    "/api/integrity", "/api/integrity/scan", "/api/nodes", "/api/nodes/delete",
+    "/api/toggle_custom_folder", "/api/refresh_paths", "/api/update_link_status",
+    "/api/check_repository_changes", "/api/repository_changes",
+    "/api/debug/profiles", "/api/debug/slow_requests"
+}
+
+def _metric_route(path):
+    """Collapse a request path to a bounded route label"""
+    path = urlparse(path).path
+    if path.startswith("/assets/"):
+        return "/assets/"
+    # /api/repositories/3 -> /api/repositories/{id}
+    path = re.sub(r'/\d+$', '/{id}', path)
+    if path in METRIC_ROUTES or path.endswith("/{id}") and path.rsplit("/", 1)[0] in METRIC_ROUTES:
+        return path
+    return "other"
+
+# pstats dumps captured by the request profiler, next to the configuration file
+PROFILE_DIR = "model_manager_profiles"
+
+# True while any request is being traced; the audit hook checks only this otherwise
+_tracing_active = False
+
+class RequestProfiler:
+    """
+    Opt-in request profiling and slow-request tracing, configured by the "profiling"
+    section of the config:
+        "profiling": {
+            "enabled": false,          # cProfile every request
+            "allow_header": false,     # cProfile requests sent with "X-Profile: 1"
+            "slow_request_ms": 0,      # trace requests slower than this (0 = off)
+            "max_profiles": 50         # pstats dumps kept in model_manager_profiles/
+        }
+    With no "profiling" section the only cost per request is a dict lookup.
+    """
+
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.lock = threading.Lock()
+        self.active = {}  # thread id -> trace dict of in-flight traced requests
+        self.slow_requests = collections.deque(maxlen=100)
+        self.watchdog = None
+        self.audit_hook_installed = False
+        self.local = threading.local()
+
+    # ---- slow request tracing ----
+
+    def _audit_hook(self, event, args):
+        # Installed once and cannot be removed: with no trace in flight anywhere it returns at once
+        if not _tracing_active:
+            return
+        trace = getattr(self.local, "trace", None)
+        if trace is None or event not in SLOW_TRACE_AUDIT_EVENTS or not args:
+            return
+        trace["fs_ops"] += 1
+        if len(trace["paths"]) < 200:
+            path = args[0]
+            if isinstance(path, (str, bytes)):
+                trace["paths"].append(f"{event} {os.fsdecode(path)}")
+
+    def _watchdog_loop(self):
+        # Samples the stack of requests that are still running past their threshold; exits once
+        # no trace has been in flight for a second, begin_trace starts it again when needed
+        idle_ticks = 0
+        while True:
+            time.sleep(0.05)
+            now = time.perf_counter()
+            frames = None
+            with self.lock:
+                if not self.active:
+                    idle_ticks += 1
+                    if idle_ticks >= 20:
+                        self.watchdog = None
+                        return
+                    continue
+                idle_ticks = 0
+                overdue = [(tid, t) for tid, t in self.active.items()
+                           if now - t["start"] >= t["threshold"] and len(t["stack_samples"]) < 5]
+            for thread_id, trace in overdue:
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    trace["stack_samples"].append({
+                        "elapsed_ms": round((now - trace["start"]) * 1000, 1),
+                        "stack": traceback.format_stack(frame)[-25:]
+                    })
+
+    def begin_trace(self, threshold_ms, method, path):
+        global _tracing_active
+        if not self.audit_hook_installed:
+            sys.addaudithook(self._audit_hook)
+            self.audit_hook_installed = True
+
+        trace = {
+            "start": time.perf_counter(),
+            "threshold": threshold_ms / 1000.0,
+            "method": method,
+            "path": path,
+            "paths": [],
+            "fs_ops": 0,
+            "stack_samples": []
+        }
+        self.local.trace = trace
+        with self.lock:
+            self.active[threading.get_ident()] = trace
+            _tracing_active = True
+            if self.watchdog is None:
+                self.watchdog = threading.Thread(target=self._watchdog_loop, name="slow-request-watchdog", daemon=True)
+                self.watchdog.start()
+        return trace
+
+    def end_trace(self, trace, status):
+        global _tracing_active
+        self.local.trace = None
+        with self.lock:
+            self.active.pop(threading.get_ident(), None)
+            _tracing_active = bool(self.active)
+        elapsed = time.perf_counter() - trace["start"]
+        if elapsed < trace["threshold"]:
+            return None
+
+        entry = {
+            "time": datetime.datetime.now().isoformat(),
+            "method": trace["method"],
+            "path": trace["path"],
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "fs_ops": trace["fs_ops"],
+            "paths_touched": trace["paths"],
+            "stack_samples": trace["stack_samples"]
+        }
+        self.slow_requests.append(entry)
+        _log_event(logging.WARNING, "slow_request", method=entry["method"], path=entry["path"],
+                   duration_ms=entry["duration_ms"], fs_ops=entry["fs_ops"])
+        return entry
+
+    # ---- cProfile dumps ----
+
+    def save_profile(self, profile, method, path, max_profiles):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        route = _metric_route(path).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        name = f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{method}_{route}.pstats"
+        profile.dump_stats(os.path.join(self.profile_dir, name))
+
+        # Keep only the newest dumps
+        dumps = self.list_profiles()
+        for old in dumps[max_profiles:]:
+            try:
+                os.remove(os.path.join(self.profile_dir, old["name"]))
+            except OSError:
+                pass
+        return name
+
+    def list_profiles(self):
+        if not os.path.isdir(self.profile_dir):
+            return []
+        profiles = []
+        for entry in os.scandir(self.profile_dir):
+            if entry.name.endswith(".pstats") and entry.is_file():
+                stat = entry.stat()
+                profiles.append({
+                    "name": entry.name,
+                    "size_bytes": stat.st_size,
+                    "created": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
+                })
+        profiles.sort(key=lambda p: p["name"], reverse=True)
+        return profiles
+
+    def profile_path(self, name):
+        """Resolve a dump name from list_profiles to its path, or None"""
+        if not name or os.path.basename(name) != name or not name.endswith(".pstats"):
+            return None
+        path = os.path.join(self.profile_dir, name)
+        return path if os.path.isfile(path) else None
+
+# Audit events whose first argument is a path touched by the request
+SLOW_TRACE_AUDIT_EVENTS = {
+    "open", "os.listdir", "os.scandir", "os.symlink", "os.remove", "os.rmdir", "os.mkdir",
+    "os.rename", "os.link", "os.chmod", "os.utime", "shutil.copyfile", "shutil.rmtree"
+}
+
+PROFILER = RequestProfiler()
+
+# Multi-node mode: repositories and installations with a "node" live on another host, where
+# `model_manager.py --agent` runs; nodes are listed in the "nodes" config setting as
+# {name: {"url": "http://host:8003", "token": "...", "timeout": 300}}
+AGENT_DEFAULT_PORT = 8003
+AGENT_RPC_PATH = "/rpc"
+AGENT_RPC_TIMEOUT = 300
+# Addresses an agent may listen on without a token
+AGENT_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+class AgentError(Exception):
+    """An agent could not be reached, rejected the call, or the call failed on the agent"""
+
+class AgentClient:
+    """JSON RPC client for one agent"""
+
+    def __init__(self, name, url, token=None, timeout=AGENT_RPC_TIMEOUT):
+        self.name = name
+        self.url = url.rstrip("/") + AGENT_RPC_PATH
+        self.token = token
+        self.timeout = timeout
+
+    def call(self, method, **params):
+        body = json.dumps({"method": method, "params": params}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read().decode("utf-8"))
+            except ValueError:
+                raise AgentError(f"Node {self.name}: HTTP {e.code}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise AgentError(f"Node {self.name}: {e}")
+        if "error" in payload:
+            raise AgentError(f"Node {self.name}: {payload['error']}")
+        return payload.get("result")
+
+class ClusterController:
+    """Sends linker and scanner operations for remote entities to their node's agent"""
+
+    @staticmethod
+    def client(config, node):
+        spec = config.data.get("nodes", {}).get(node)
+        if not spec:
+            raise AgentError(f"Unknown node {node}")
+        return AgentClient(node, spec["url"], spec.get("token"), spec.get("timeout", AGENT_RPC_TIMEOUT))
+
+    def call(self, config, node, method, **params):
+        return self.client(config, node).call(method, **params)
+
+    def fan_out(self, config, calls, max_workers=16):
+        """
+        Run (node, method, params) calls concurrently.
+        Returns one entry per call, in order: the result, or the AgentError it raised.
+        """
+        def run(call):
+            node, method, params = call
+            try:
+                return self.call(config, node, method, **params)
+            except AgentError as e:
+                return e
+
+        if not calls:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(calls)))) as executor:
+            return list(executor.map(run, calls))
+
+CLUSTER = ClusterController()
+
+def _link_status_for(linker, install, repo, config):
+    """Link status of one (installation, repository) pair on this host, by the installation's link mode"""
+    if install.get("link_mode") == LINK_MODE_CONFIG:
+        return linker.extra_paths.get_link_status(repo, install["path"], config)
+    return linker.get_link_status(repo["path"], install["path"])
+
+class ModelManagerAgent:
+    """
+    The RPC methods an agent serves. The controller sends the entities involved (and its config
+    data for custom folders), so agents keep no configuration of their own; link manifests and
+    folder snapshots are kept in the agent's working directory.
+    """
+
+    def __init__(self):
+        self.linker = ModelLinker()
+
+    def rpc_ping(self):
+        return {"hostname": os.uname().nodename, "pid": os.getpid()}
+
+    def rpc_paths_exist(self, paths):
+        return {path: os.path.exists(path) for path in paths}
+
+    def rpc_repository_folders(self, path):
+        return ModelManagerConfig.from_data({}).get_repository_folders(path)
+
+    def rpc_sync_installation(self, install, repos, config_data):
+        config = ModelManagerConfig.from_data(config_data)
+        if install.get("link_mode") == LINK_MODE_CONFIG:
+            return self.linker.sync_config_linked(install, repos, config)
+        return self.linker.link_installation_overlay(install["path"], repos, config)
+
+    def rpc_remove_repository(self, install, repo, remaining_repos, config_data):
+        return self.linker.remove_repository(install, repo, remaining_repos, ModelManagerConfig.from_data(config_data))
+
+    def rpc_link_status(self, install, repos, config_data):
+        config = ModelManagerConfig.from_data(config_data)
+        return {str(repo["id"]): _link_status_for(self.linker, install, repo, config) for repo in repos}
+
+    def rpc_detect_changes(self, repo):
+        repo = dict(repo, exists=os.path.exists(repo["path"]))
+        return ModelManagerConfig.from_data({"repositories": [repo]}).detect_repository_changes(repo["id"])
+
+# Change events kept for /api/events clients that reconnect; older clients get a reset
+DASHBOARD_EVENT_BACKLOG = 1000
+DASHBOARD_KEEPALIVE_SECONDS = 15
+
+def _config_digest(data):
+    """Digest of the configuration without the existence flags, which have their own events"""
+    structural = dict(
+        data,
+        repositories=[{k: v for k, v in r.items() if k != "exists"} for r in data.get("repositories", [])],
+        comfyui_installations=[{k: v for k, v in i.items() if k != "exists"} for i in data.get("comfyui_installations", [])]
+    )
+    return hashlib.sha1(json.dumps(structural, sort_keys=True).encode("utf-8")).hexdigest()
+
+class DashboardEvents:
+    """
+    Revisioned change feed behind the /api/dashboard snapshot and the /api/events stream.
+
+    Each published change bumps the revision. A change is dropped when it repeats the last
+    value published under the same (event, key), so periodic rechecks don't reach the browser.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.revision = 0
+        self.events = collections.deque(maxlen=DASHBOARD_EVENT_BACKLOG)  # (revision, event, data)
+        self.last = {}   # (event, key) -> last published data
+
+    def publish(self, event, key, data):
+        with self.condition:
+            if self.last.get((event, key)) == data:
+                return
+            self.last[(event, key)] = data
+            self.revision += 1
+            self.events.append((self.revision, event, data))
+            self.condition.notify_all()
+
+    def since(self, revision, timeout):
+        """
+        Events after revision, waiting up to timeout for the first one. Returns None when the
+        client is out of step (backlog overrun or a restarted server) and must reload the snapshot.
+        """
+        with self.condition:
+            if revision == self.revision:
+                self.condition.wait(timeout)
+            if revision > self.revision or (self.events and self.events[0][0] > revision + 1):
+                return None
+            return [event for event in self.events if event[0] > revision]
+
+DASHBOARD = DashboardEvents()
+
+# The handler was written for one request at a time; the threaded server still runs them one
+# at a time, and only event streams release this lock to wait in parallel
+_request_lock = threading.Lock()
+
 class ModelManagerHandler(SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
-        self.config = ModelManagerConfig()
-        self.linker = ModelLinker()
-        # SafeTensor Inspector setup - default to user's home directory for broader access
-        self.inspector_root = os.path.expanduser("~")
-        super().__init__(*args, **kwargs)
+        _request_lock.acquire()
+        self._holds_request_lock = True
+        try:
+            self.config = ModelManagerConfig()
+            self.linker = ModelLinker()
+            # SafeTensor Inspector setup - default to user's home directory for broader access
+            self.inspector_root = os.path.expanduser("~")
+            super().__init__(*args, **kwargs)
+        finally:
+            self._release_request_lock()
+
+    def _release_request_lock(self):
+        if self._holds_request_lock:
+            self._holds_request_lock = False
+            _request_lock.release()
+
+    def handle_one_request(self):
+        # Time every request for the latency histograms on /metrics
+        start = time.perf_counter()
+        self.command = None
+        self._status_code = None
+        self._profile = None
+        self._trace = None
+        self._foreground = False
+        self._streaming = False
+        try:
+            super().handle_one_request()
+        finally:
+            if self._foreground:
+                PREFETCHER.foreground_finished()
+            # Close the trace and stop the profiler even if the request raised
+            if self._trace is not None:
+                PROFILER.end_trace(self._trace, self._status_code)
+            if self._profile is not None:
+                self._profile.disable()
+        if self._streaming:
+            # Event streams are long-lived by design; keep them out of latency tracking
+            return
+
+        if self._profile is not None:
+            settings = self.config.data.get("profiling", {})
+            PROFILER.save_profile(self._profile, self.command, self.path, settings.get("max_profiles", 50))
+        if self.command:
+            duration = time.perf_counter() - start
+            METRICS.observe("model_manager_http_request_duration_seconds", duration,
+                            method=self.command, route=_metric_route(self.path), status=self._status_code or 0)
+            # Background scans slow down while foreground requests are slow
+            IO_SCHEDULER.record_foreground(duration, self.config.data.get("background_io"))
+
+    def parse_request(self):
+        # Called right before the do_* dispatch: start opt-in profiling/tracing here
+        if not super().parse_request():
+            return False
+        # Background header prefetching pauses while this request is served
+        PREFETCHER.foreground_started()
+        self._foreground = True
+        settings = self.config.data.get("profiling")
+        if settings:
+            if settings.get("slow_request_ms"):
+                self._trace = PROFILER.begin_trace(settings["slow_request_ms"], self.command, self.path)
+            if settings.get("enabled") or (settings.get("allow_header") and self.headers.get("X-Profile") == "1"):
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+        return True
+
+    def send_response(self, code, message=None):
+        self._status_code = code
+        super().send_response(code, message)
     
     def _send_json_response(self, data, status_code=200):
         self.send_response(status_code)
@@ -704,37 +4740,194 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                 '.ico': 'image/x-icon'
             }
             content_type = content_types.get(ext.lower(), 'application/octet-stream')
+            stat_result = os.stat(full_path)
+            etag = f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
             
-            # Send the file
-            self.send_response(200)
-            self.send_header("Content-Type", content_type)
-            self.send_header("Cache-Control", "public, max-age=3600")  # Cache for 1 hour
-            self.end_headers()
-            
-            with open(full_path, 'rb') as f:
-                self.wfile.write(f.read())
+            # Send the file (cache for 1 hour, then revalidate by ETag)
+            self._send_file(full_path, content_type, etag, "public, max-age=3600")
                 
         except Exception as e:
             print(f"Error serving static file {path}: {e}")
             self.send_error(500, "Internal server error")
+
+    def _send_file(self, full_path, content_type, etag, cache_control):
+        """Send a file, or 304 Not Modified when the client's If-None-Match has this ETag"""
+        etag = f'"{etag}"'
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return False
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def _serve_thumbnail(self, image_path):
+        """Serve the cached thumbnail of a preview image, rendering it on first request"""
+        try:
+            cache_path, content_type, etag, result = THUMBNAILS.get(image_path, self.config.data.get("thumbnails"))
+            sent = self._send_file(cache_path, content_type, etag, "public, max-age=86400")
+            METRICS.inc("model_manager_thumbnail_requests_total", result=result if sent else "not_modified")
+        except Exception as e:
+            print(f"Error serving thumbnail for {image_path}: {e}")
+            self.send_error(500, "Could not create thumbnail")
+
+    def _add_thumbnail_urls(self, directory, browse_results):
+        """Point model entries at a thumbnail of their preview sidecar image, if there is one"""
+        names = {item["name"] for item in browse_results if item["type"] == "file"}
+        for item in browse_results:
+            if item["type"] != "file":
+                continue
+            preview = _find_preview_image(item["name"], names)
+            if preview:
+                item["preview_image"] = preview
+                item["thumbnail_url"] = "/api/thumbnail?path=" + quote(os.path.join(directory, preview))
     
     def _get_safetensor_details(self, file_abs_path):
         """Get SafeTensor metadata and tensor keys"""
         if not SAFETENSORS_AVAILABLE:
             return {"error": "safetensors library not installed"}, []
         try:
-            metadata, keys = _read_safetensor_header(file_abs_path)
+            metadata, keys = _read_model_header_cached(file_abs_path)
             return metadata, keys
         except Exception as e:
             print(f"Could not read metadata for {file_abs_path}: {e}")
             return {"error": f"Could not read metadata: {str(e)}"}, []
+
+    def _add_safetensor_details(self, pending):
+        """
+        Fill in header metadata, tensor keys and model type for browse entries.
+        pending is a list of (file_info, abs_path, stat_result); headers are read concurrently.
+        """
+        concurrency = self.config.data.get("header_read_concurrency", DEFAULT_HEADER_READ_CONCURRENCY)
+        results = _read_model_headers([(path, stat_result) for _, path, stat_result in pending], concurrency)
+        for (file_info, path, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Could not read metadata for {path}: {result}")
+                header_meta, tensor_keys = {"error": f"Could not read metadata: {str(result)}"}, []
+            else:
+                header_meta, tensor_keys = result
+            file_info["header_metadata"] = header_meta
+            file_info["tensor_keys"] = tensor_keys
+            if isinstance(result, Exception) and path.lower().endswith(PICKLE_CHECKPOINT_EXTENSIONS):
+                file_info["model_type"] = "PyTorch Model/Ckpt"
+                continue
+            # Use enhanced classification
+            file_info["model_type"] = classify_safetensor(file_info["name"], header_meta, tensor_keys)
     
+    def _aggregate_browse_entries(self, directory, browse_results, pending_headers):
+        """
+        Collapse sharded checkpoints into their index entry and describe diffusers trees,
+        so each logical model is listed once. Shard headers are not queued for reading.
+        """
+        shard_files = set()
+        for item in browse_results:
+            if item["type"] != "file" or not item["name"].endswith(SHARD_INDEX_SUFFIX):
+                continue
+            aggregate = _aggregate_sharded_model(os.path.join(directory, item["name"]))
+            if not aggregate:
+                continue
+            shard_files.update(aggregate["shards"])
+            item["shards"] = aggregate["shards"]
+            item["missing_shards"] = aggregate["missing_shards"]
+            item["size_mb"] = round(aggregate["total_size"] / (1024 * 1024), 2)
+            item["parameters"] = aggregate["parameters"]
+            item["dtypes"] = aggregate["dtypes"]
+            item["header_metadata"] = aggregate["header_metadata"]
+            item["tensor_keys"] = aggregate["tensor_keys"]
+            item["model_type"] = aggregate["architecture"] or \
+                classify_safetensor(item["name"], aggregate["header_metadata"], aggregate["tensor_keys"])
+
+        for item in browse_results:
+            if item["type"] != "directory" or item["name"] == "..":
+                continue
+            item_dir = os.path.join(directory, item["name"])
+            if not os.path.isfile(os.path.join(item_dir, DIFFUSERS_INDEX_FILE)):
+                continue
+            pipeline = _aggregate_diffusers_pipeline(item_dir)
+            if pipeline:
+                item["model_type"] = f"Diffusers Pipeline ({pipeline['pipeline_class']})" if pipeline["pipeline_class"] else "Diffusers Pipeline"
+                item["size_mb"] = round(pipeline["total_size"] / (1024 * 1024), 2)
+                item["parameters"] = pipeline["parameters"]
+                item["components"] = pipeline["components"]
+
+        if shard_files:
+            browse_results[:] = [
+                item for item in browse_results if item["type"] != "file" or item["name"] not in shard_files
+            ]
+            pending_headers[:] = [entry for entry in pending_headers if entry[0]["name"] not in shard_files]
+
+    def _stream_events(self, since):
+        """Server-Sent Events: dashboard deltas after revision since, until the client disconnects"""
+        try:
+            revision = int(since)
+        except ValueError:
+            self.send_error(400, "Invalid since parameter")
+            return
+        # Leave the request lock and the foreground count; this request only waits
+        self._streaming = True
+        if self._foreground:
+            PREFETCHER.foreground_finished()
+            self._foreground = False
+        self._release_request_lock()
+        # Opt-in profiling covers the setup only: a stream open for hours is not a slow request
+        if self._trace is not None:
+            PROFILER.end_trace(self._trace, 200)
+            self._trace = None
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile = None
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while True:
+                events = DASHBOARD.since(revision, DASHBOARD_KEEPALIVE_SECONDS)
+                if events is None:
+                    revision = DASHBOARD.revision
+                    chunk = f"id: {revision}\nevent: reset\ndata: {{}}\n\n"
+                elif events:
+                    chunk = "".join(f"id: {r}\nevent: {event}\ndata: {json.dumps(data)}\n\n" for r, event, data in events)
+                    revision = events[-1][0]
+                else:
+                    chunk = ": keepalive\n\n"
+                self.wfile.write(chunk.encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _schedule_prefetch(self, directory, browse_results, boundary):
+        """Warm the header cache for the listed subdirectories and the sibling folders"""
+        subdirectories = [
+            os.path.join(directory, item["name"]) for item in browse_results
+            if item["type"] == "directory" and item["name"] != ".."
+        ]
+        PREFETCHER.schedule(directory, subdirectories, boundary, self.config.data.get("header_prefetch"))
+
     def do_GET(self):
         parsed_url = urlparse(self.path)
         query_params = parse_qs(parsed_url.query)
         
         if parsed_url.path == "/":
             self.serve_main_interface()
+        elif parsed_url.path == "/metrics":
+            body = METRICS.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
         elif parsed_url.path.startswith("/assets/"):
             # Serve static assets (images, etc.)
             self.serve_static_file(parsed_url.path)
@@ -745,7 +4938,25 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
         elif parsed_url.path == "/api/links":
             self._send_json_response(self.config.data["links"])
         elif parsed_url.path == "/api/config":
-            self._send_json_response(self.config.data)
+            self._send_json_response(self.config.public_data())
+        elif parsed_url.path == "/api/dashboard":
+            # Everything the main page shows, in one snapshot; /api/events?since=<revision> continues from it
+            revision = DASHBOARD.revision
+            config = ModelManagerConfig()
+            self._send_json_response({
+                "revision": revision,
+                "repositories": config.data["repositories"],
+                "installations": config.data["comfyui_installations"],
+                "links": config.data["links"],
+                "summaries": {
+                    str(install["id"]): config.get_installation_link_summary(install["id"])
+                    for install in config.data["comfyui_installations"]
+                }
+            })
+        elif parsed_url.path == "/api/events":
+            # EventSource reconnects to the same URL; its Last-Event-ID is newer than the since it was opened with
+            last_event_id = self.headers.get("Last-Event-ID")
+            self._stream_events(last_event_id if last_event_id else query_params.get('since', ["0"])[0])
         elif parsed_url.path == "/api/installation_summary":
             install_id = query_params.get('install_id', [None])[0]
             if install_id:
@@ -758,7 +4969,14 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
             if repo_id:
                 repo = next((r for r in self.config.data["repositories"] if r["id"] == int(repo_id)), None)
                 if repo:
-                    folder_data = self.config.get_repository_folders(repo["path"])
+                    if repo.get("node"):
+                        try:
+                            folder_data = CLUSTER.call(self.config, repo["node"], "repository_folders", path=repo["path"])
+                        except AgentError as e:
+                            self._send_json_response({"success": False, "error": str(e)}, 502)
+                            return
+                    else:
+                        folder_data = self.config.get_repository_folders(repo["path"])
                     # Add enabled status for custom folders
                     enabled_custom_folders = self.config.get_enabled_custom_folders(int(repo_id))
                     for folder in folder_data["folders"]:
@@ -771,7 +4989,15 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                 self.send_error(400, "Missing repo_id parameter")
         elif parsed_url.path == "/api/check_path":
             path = query_params.get('path', [None])[0]
-            if path:
+            node = query_params.get('node', [None])[0]
+            if path and node:
+                try:
+                    exists = CLUSTER.call(self.config, node, "paths_exist", paths=[path])[path]
+                except AgentError as e:
+                    self._send_json_response({"success": False, "error": str(e)}, 502)
+                    return
+                self._send_json_response({"path": path, "exists": exists, "node": node})
+            elif path:
                 exists = self.config.check_path_exists(path)
                 self._send_json_response({"path": path, "exists": exists})
             else:
@@ -782,13 +5008,138 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
             if install_id and repo_id:
                 install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == int(install_id)), None)
                 repo = next((r for r in self.config.data["repositories"] if r["id"] == int(repo_id)), None)
-                if install and repo:
+                if install and repo and install.get("node"):
+                    try:
+                        statuses = CLUSTER.call(self.config, install["node"], "link_status", install=install,
+                                                repos=[repo], config_data=self.config.agent_data())
+                    except AgentError as e:
+                        self._send_json_response({"success": False, "error": str(e)}, 502)
+                        return
+                    self._send_json_response(statuses[str(repo["id"])])
+                elif install and repo:
                     status = self.linker.get_link_status(repo["path"], install["path"])
                     self._send_json_response(status)
                 else:
                     self.send_error(404, "Installation or repository not found")
             else:
                 self.send_error(400, "Missing install_id or repo_id parameter")
+        elif parsed_url.path == "/api/nodes":
+            # Configured agent nodes and whether they answer, pinged concurrently
+            nodes = self.config.data.get("nodes", {})
+            names = sorted(nodes)
+            pings = CLUSTER.fan_out(self.config, [(name, "ping", {}) for name in names])
+            self._send_json_response({"nodes": [{
+                "name": name,
+                "url": nodes[name]["url"],
+                "online": not isinstance(ping, AgentError),
+                "info": None if isinstance(ping, AgentError) else ping,
+                "error": str(ping) if isinstance(ping, AgentError) else None
+            } for name, ping in zip(names, pings)]})
+        elif parsed_url.path == "/api/debug/profiles":
+            name = query_params.get('name', [None])[0]
+            if not name:
+                self._send_json_response({"profiles": PROFILER.list_profiles()})
+                return
+            profile_path = PROFILER.profile_path(name)
+            if not profile_path:
+                self.send_error(404, "Profile not found")
+                return
+            with open(profile_path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif parsed_url.path == "/api/debug/slow_requests":
+            self._send_json_response({"slow_requests": list(PROFILER.slow_requests)})
+        elif parsed_url.path == "/api/warmup":
+            install_id = query_params.get('install_id', [None])[0]
+            install = next((i for i in self.config.data["comfyui_installations"] if install_id and i["id"] == int(install_id)), None)
+            if not install:
+                self.send_error(404, "Installation not found")
+                return
+            warm_set = WARMER.select_warm_set(install, self.config, self.linker, self.config.data.get("page_cache_warmup"))
+            warm_set = WARMER.residency(warm_set)
+            warm_set["job"] = WARMER.status(install["id"])
+            self._send_json_response(warm_set)
+        elif parsed_url.path == "/api/integrity":
+            self._send_json_response({"job": INTEGRITY.status()})
+        elif parsed_url.path == "/api/tiering":
+            self._send_json_response({
+                "settings": TIERING.settings(self.config),
+                "plan": TIERING.plan(self.config, self.linker),
+                "job": TIERING.status()
+            })
+        elif parsed_url.path == "/api/profiles":
+            install_id = query_params.get('install_id', [None])[0]
+            install = next((i for i in self.config.data["comfyui_installations"] if install_id and i["id"] == int(install_id)), None)
+            if not install:
+                self.send_error(404, "Installation not found")
+                return
+            profiles = []
+            for name, profile in install.get("profiles", {}).items():
+                staged = os.path.join(self.linker.profiles.staged_install_path(install["path"], name), "models")
+                profiles.append({
+                    "name": name,
+                    "repo_ids": profile["repo_ids"],
+                    "active": name == install.get("active_profile"),
+                    "staged": name == install.get("active_profile") or os.path.isdir(staged)
+                })
+            self._send_json_response({"active_profile": install.get("active_profile"), "profiles": profiles})
+        elif parsed_url.path == "/api/overlay_plan":
+            # Dry run: which repository wins each conflicting file for an installation
+            install_id = query_params.get('install_id', [None])[0]
+            if not install_id:
+                self.send_error(400, "Missing install_id parameter")
+                return
+            repos = self.config.get_linked_repositories(int(install_id))
+            plan = self.linker.plan_overlay(repos, self.config)
+            self._send_json_response({
+                "repositories": [{"id": r["id"], "name": r["name"]} for r in repos],
+                "file_counts": {folder: len(entries) for folder, entries in plan["folders"].items()},
+                "conflicts": plan["conflicts"]
+            })
+        elif parsed_url.path == "/api/search":
+            query = query_params.get('q', [''])[0]
+            try:
+                limit = int(query_params.get('limit', ['50'])[0])
+            except ValueError:
+                self.send_error(400, "Invalid limit parameter")
+                return
+            filters = {}
+            for field in ("folder", "model_type", "base_model", "repo_id"):
+                value = query_params.get(field, [None])[0]
+                if value:
+                    filters[field] = value
+
+            # Facet counts cost a pass over every match, so they are only computed on request
+            facets = query_params.get('facets', ['0'])[0] in ("1", "true")
+            result = SEARCH_INDEX.search(query, filters, limit, facets=facets)
+            # Tell the caller which installations can see each hit
+            for doc in result["results"]:
+                doc["installations"] = _installations_seeing_file(self.config, doc, self.linker.standard_folders)
+            self._send_json_response(result)
+        elif parsed_url.path in ("/api/similar", "/api/compatible_bases"):
+            # Similarity queries over the search index's MinHash signatures
+            file_path = os.path.normpath(query_params.get('path', [''])[0])
+            try:
+                limit = int(query_params.get('limit', ['20'])[0])
+                min_score = float(query_params.get('min_score', ['0.5' if parsed_url.path == "/api/similar" else '0.8'])[0])
+            except ValueError:
+                self.send_error(400, "Invalid limit or min_score parameter")
+                return
+            if parsed_url.path == "/api/similar":
+                result = SEARCH_INDEX.similar(file_path, limit, min_score)
+            else:
+                result = SEARCH_INDEX.compatible_bases(file_path, limit, min_score)
+            if result is None:
+                self._send_json_response({"success": False, "error": "File is not in the search index or has no readable tensor header"}, 404)
+                return
+            for doc in result["results"]:
+                doc["installations"] = _installations_seeing_file(self.config, doc, self.linker.standard_folders)
+            self._send_json_response(result)
         elif parsed_url.path.startswith("/inspector"):
             # Redirect to SafeTensor Inspector
             folder_path = query_params.get('path', [None])[0]
@@ -847,6 +5198,7 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                         "path": parent_dir
                     })
                 
+                pending_headers = []
                 try:
                     # List both directories and files for filesystem browsing
                     for item_name in sorted(os.listdir(current_browse_abs_path)):
@@ -876,19 +5228,18 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                                 "modified": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
                                 "path": item_abs_path
                             }
-                            if item_name.lower().endswith('.safetensors'):
+                            if item_name.lower().endswith(HEADER_FILE_EXTENSIONS):
                                 if SAFETENSORS_AVAILABLE:
-                                    header_meta, tensor_keys = self._get_safetensor_details(item_abs_path)
-                                    file_info["header_metadata"] = header_meta
-                                    file_info["tensor_keys"] = tensor_keys
-                                    # Use enhanced classification
-                                    file_info["model_type"] = classify_safetensor(item_name, header_meta, tensor_keys)
+                                    # Headers (and checkpoint pickles) are read together after the listing
+                                    pending_headers.append((file_info, item_abs_path, stat))
                                 else:
                                     # Fallback classification without metadata
                                     file_info["model_type"] = classify_safetensor(item_name)
-                            elif item_name.lower().endswith(('.ckpt', '.pt', '.bin', '.pth')):
-                                file_info["model_type"] = "PyTorch Model/Ckpt"
                             browse_results.append(file_info)
+                    self._aggregate_browse_entries(current_browse_abs_path, browse_results, pending_headers)
+                    self._add_safetensor_details(pending_headers)
+                    self._add_thumbnail_urls(current_browse_abs_path, browse_results)
+                    self._schedule_prefetch(current_browse_abs_path, browse_results, None)
                 
                 except PermissionError:
                     self.send_error(403, "Permission denied")
@@ -929,6 +5280,7 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                         "path": path_for_parent
                     })
                 
+                pending_headers = []
                 try:
                     for item_name in sorted(os.listdir(current_browse_abs_path)):
                         item_abs_path = os.path.join(current_browse_abs_path, item_name)
@@ -949,19 +5301,18 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                                 "modified": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(),
                                 "path": item_rel_path
                             }
-                            if item_name.lower().endswith('.safetensors'):
+                            if item_name.lower().endswith(HEADER_FILE_EXTENSIONS):
                                 if SAFETENSORS_AVAILABLE:
-                                    header_meta, tensor_keys = self._get_safetensor_details(item_abs_path)
-                                    file_info["header_metadata"] = header_meta
-                                    file_info["tensor_keys"] = tensor_keys
-                                    # Use enhanced classification
-                                    file_info["model_type"] = classify_safetensor(item_name, header_meta, tensor_keys)
+                                    # Headers (and checkpoint pickles) are read together after the listing
+                                    pending_headers.append((file_info, item_abs_path, stat))
                                 else:
                                     # Fallback classification without metadata
                                     file_info["model_type"] = classify_safetensor(item_name)
-                            elif item_name.lower().endswith(('.ckpt', '.pt', '.bin', '.pth')):
-                                file_info["model_type"] = "PyTorch Model/Ckpt"
                             browse_results.append(file_info)
+                    self._aggregate_browse_entries(current_browse_abs_path, browse_results, pending_headers)
+                    self._add_safetensor_details(pending_headers)
+                    self._add_thumbnail_urls(current_browse_abs_path, browse_results)
+                    self._schedule_prefetch(current_browse_abs_path, browse_results, os.path.normpath(self.inspector_root))
                 except FileNotFoundError:
                     self.send_error(404, "Path not found")
                     return
@@ -970,6 +5321,17 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                     self.send_error(500, f"Server error: {str(e)}")
                     return
                 self._send_json_response(browse_results)
+        elif parsed_url.path == "/api/thumbnail":
+            # Downscaled preview image for browse listings (see thumbnail_url)
+            image_path = os.path.normpath(query_params.get('path', [''])[0])
+            restricted_paths = ['/proc', '/sys', '/dev', '/run', '/tmp/systemd-private']
+            if not image_path.startswith('/') or any(image_path.startswith(path) for path in restricted_paths):
+                self.send_error(403, "Forbidden or invalid image path")
+                return
+            if not image_path.lower().endswith(tuple(THUMBNAIL_CONTENT_TYPES)) or not os.path.isfile(image_path):
+                self.send_error(404, "Image not found")
+                return
+            self._serve_thumbnail(image_path)
         elif parsed_url.path == "/api/analyze_file":
             # SafeTensor Inspector analyze API
             requested_file_param = query_params.get('path', [None])[0]
@@ -1000,8 +5362,22 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                     self.send_error(403, "Forbidden or invalid file path")
                     return
 
-            if not file_abs_path.lower().endswith('.safetensors'):
-                self.send_error(400, "File is not a .safetensors file or safetensors library unavailable.")
+            if file_abs_path.endswith(SHARD_INDEX_SUFFIX):
+                # A sharded checkpoint, analyzed as one model from its index
+                aggregate = _aggregate_sharded_model(file_abs_path)
+                if not aggregate:
+                    self.send_error(400, "File is not a shard index (no weight_map).")
+                    return
+                filename = os.path.basename(file_abs_path)
+                self._send_json_response(dict(
+                    aggregate,
+                    model_type=aggregate["architecture"] or
+                        classify_safetensor(filename, aggregate["header_metadata"], aggregate["tensor_keys"])
+                ))
+                return
+
+            if not file_abs_path.lower().endswith(HEADER_FILE_EXTENSIONS):
+                self.send_error(400, "File is not a .safetensors, .gguf or PyTorch checkpoint file.")
                 return
             
             if not SAFETENSORS_AVAILABLE:
@@ -1009,16 +5385,28 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                  return
 
             header_meta, tensor_keys = self._get_safetensor_details(file_abs_path)
+            self.config.state.record_file_access(os.path.realpath(file_abs_path))
             
             # Include enhanced model type in analysis response
             filename = os.path.basename(file_abs_path)
             model_type = classify_safetensor(filename, header_meta, tensor_keys)
             
-            self._send_json_response({
+            response = {
                 "header_metadata": header_meta, 
                 "tensor_keys": tensor_keys,
                 "model_type": model_type
-            })
+            }
+            table_reader = _tensor_table_reader(file_abs_path)
+            if table_reader and "error" not in header_meta:
+                # Shapes and dtypes come from the pickle or GGUF tensor table; no tensor data is read
+                try:
+                    _, tensors, _ = table_reader[0](file_abs_path)
+                    response["tensors"] = {
+                        name: {"dtype": info.dtype, "shape": info.shape} for name, info in tensors.items()
+                    }
+                except Exception as e:
+                    print(f"Could not read tensor shapes for {file_abs_path}: {e}")
+            self._send_json_response(response)
         elif parsed_url.path == "/favicon.ico":
             # Simple favicon handler to prevent 404 errors
             self.send_response(204)  # No Content
@@ -1041,19 +5429,32 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
         parsed_url = urlparse(self.path)
         
         if parsed_url.path == "/api/repositories":
+            if data.get("node") and data["node"] not in self.config.data.get("nodes", {}):
+                self._send_json_response({"success": False, "error": "Unknown node"}, 400)
+                return
             repo = self.config.add_repository(
                 data.get("name", ""),
                 data.get("path", ""),
-                data.get("description", "")
+                data.get("description", ""),
+                data.get("node")
             )
+            if repo.get("node"):
+                self.config.refresh_all_paths()
             self.config.save_config()
+            SEARCH_INDEX.schedule_refresh(self.config.data["repositories"])
             self._send_json_response(repo, 201)
         elif parsed_url.path == "/api/installations":
+            if data.get("node") and data["node"] not in self.config.data.get("nodes", {}):
+                self._send_json_response({"success": False, "error": "Unknown node"}, 400)
+                return
             installation = self.config.add_comfyui_installation(
                 data.get("name", ""),
                 data.get("path", ""),
-                data.get("description", "")
+                data.get("description", ""),
+                data.get("node")
             )
+            if installation.get("node"):
+                self.config.refresh_all_paths()
             self.config.save_config()
             self._send_json_response(installation, 201)
         elif parsed_url.path == "/api/link":
@@ -1084,17 +5485,251 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                 self._send_json_response({"success": False, "error": "Installation or repository not found"}, 404)
                 return
             
-            # Perform the actual linking
-            results = self.linker.link_repository_to_installation(repo["path"], install["path"], repo_id, self.config)
+            if install.get("node") != repo.get("node"):
+                self._send_json_response({"success": False, "error": "Installation and repository are on different nodes"}, 400)
+                return
 
-            # Also update the configuration
-            self.config.link_repository_to_installation(install_id, repo_id)
+            # Record the link first so the overlay includes this repository at the end of the priority order
+            self.config.link_repository_to_installation(install_id, repo_id, to_end=True)
+
+            # Perform the actual linking: one overlay pass over every repository linked to the installation
+            try:
+                overlay = self._sync_installation(install)
+            except AgentError as e:
+                self.config.save_config()
+                self._send_json_response({"success": False, "error": str(e)}, 502)
+                return
             
             # Update link status
             self.config.update_all_link_status(self.linker)
             self.config.save_config()
             
-            self._send_json_response({"success": True, "results": results})
+            self._send_json_response({
+                "success": True,
+                "results": overlay["repos"].get(repo_id, {}),
+                "conflicts": overlay["conflicts"],
+                "stats": overlay["stats"]
+            })
+        elif parsed_url.path == "/api/perform_link_batch":
+            # Create the symbolic links for many (install_id, repo_id) pairs in one pass
+            pairs = data.get("pairs", [])
+            jobs = []
+            errors = []
+            for pair in pairs:
+                install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == pair.get("install_id")), None)
+                repo = next((r for r in self.config.data["repositories"] if r["id"] == pair.get("repo_id")), None)
+                if install and repo and install.get("node") != repo.get("node"):
+                    errors.append({"install_id": install["id"], "repo_id": repo["id"],
+                                   "error": "Installation and repository are on different nodes"})
+                elif install and repo:
+                    jobs.append((install, repo))
+                else:
+                    errors.append({"install_id": pair.get("install_id"), "repo_id": pair.get("repo_id"),
+                                   "error": "Installation or repository not found"})
+
+            if not jobs:
+                self._send_json_response({"success": False, "error": "No valid installation/repository pairs", "errors": errors}, 404)
+                return
+
+            for install, repo in jobs:
+                self.config.link_repository_to_installation(install["id"], repo["id"], to_end=True)
+            results = self.linker.link_batch([job for job in jobs if not job[0].get("node")], self.config)
+
+            # Installations on agent nodes: one sync per installation, all nodes at once
+            remote_installs = list({install["id"]: install for install, _ in jobs if install.get("node")}.values())
+            remote_results = CLUSTER.fan_out(self.config, [
+                (install["node"], "sync_installation", {
+                    "install": install,
+                    "repos": self.config.get_linked_repositories(install["id"]),
+                    "config_data": self.config.agent_data()
+                })
+                for install in remote_installs
+            ])
+            for install, result in zip(remote_installs, remote_results):
+                results[install["id"]] = {"error": str(result)} if isinstance(result, AgentError) else result
+
+            # One status update and one save for the whole batch
+            self.config.update_all_link_status(self.linker)
+            self.config.save_config()
+
+            self._send_json_response({"success": True, "results": results, "errors": errors})
+        elif parsed_url.path == "/api/link_mode":
+            # Switch an installation between per-file symlinks and extra_model_paths.yaml
+            install_id = data.get("install_id")
+            mode = data.get("mode")
+            install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == install_id), None)
+            if not install:
+                self._send_json_response({"success": False, "error": "Installation not found"}, 404)
+                return
+            if mode not in (LINK_MODE_SYMLINK, LINK_MODE_CONFIG):
+                self._send_json_response({"success": False, "error": f"mode must be '{LINK_MODE_SYMLINK}' or '{LINK_MODE_CONFIG}'"}, 400)
+                return
+            if install.get("node"):
+                self._send_json_response({"success": False, "error": "Link mode can only be changed for local installations"}, 400)
+                return
+
+            repos = self.config.get_linked_repositories(install_id)
+            if mode == LINK_MODE_CONFIG and install.get("link_mode") != LINK_MODE_CONFIG:
+                # Remove the symlinks first so ComfyUI doesn't see every model twice
+                for repo in repos:
+                    self.linker.unlink_repository_from_installation(repo["path"], install["path"], repo["id"], self.config)
+            elif mode == LINK_MODE_SYMLINK and install.get("link_mode") == LINK_MODE_CONFIG:
+                self.linker.extra_paths.remove(install["path"])
+            install["link_mode"] = mode
+
+            overlay = self._sync_installation(install)
+            self.config.update_all_link_status(self.linker)
+            self.config.save_config()
+            self._send_json_response({"success": True, "link_mode": mode, "stats": overlay["stats"]})
+        elif parsed_url.path == "/api/warmup":
+            # Pre-read the installation's warm set into the page cache
+            install_id = data.get("install_id")
+            install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == install_id), None)
+            if not install:
+                self._send_json_response({"success": False, "error": "Installation not found"}, 404)
+                return
+            if install.get("node"):
+                self._send_json_response({"success": False, "error": "Warmup is only available for local installations"}, 400)
+                return
+            if "warm_set" in data:
+                # An empty list goes back to picking models by recent access
+                install["warm_set"] = list(data["warm_set"] or [])
+                self.config.save_config()
+            warm_set = WARMER.select_warm_set(install, self.config, self.linker, self.config.data.get("page_cache_warmup"))
+            if warm_set["explicit"]:
+                # Pinned models count as used for tiering
+                for entry in warm_set["files"]:
+                    self.config.state.record_file_access(entry["path"])
+            if not WARMER.start(install["id"], warm_set, self.config.data.get("page_cache_warmup")):
+                self._send_json_response({"success": False, "error": "Warmup already running"}, 409)
+                return
+            self._send_json_response({
+                "success": True,
+                "files": warm_set["files"],
+                "total_bytes": warm_set["total_bytes"],
+                "budget_bytes": warm_set["budget_bytes"],
+                "missing": warm_set["missing"]
+            })
+        elif parsed_url.path == "/api/integrity/scan":
+            # Check .safetensors files against their headers; all local repositories unless repo_id is given
+            repo_id = data.get("repo_id")
+            repos = [r for r in self.config.data["repositories"]
+                     if not r.get("node") and (repo_id is None or r["id"] == repo_id)]
+            if repo_id is not None and not repos:
+                self._send_json_response({"success": False, "error": "Local repository not found"}, 404)
+                return
+            if not INTEGRITY.start(repos, bool(data.get("deep")), self.config.data.get("integrity")):
+                self._send_json_response({"success": False, "error": "Integrity scan already running"}, 409)
+                return
+            self._send_json_response({"success": True, "repo_ids": [r["id"] for r in repos], "deep": bool(data.get("deep"))})
+        elif parsed_url.path == "/api/tiering/settings":
+            settings = {key: data[key] for key in TIERING_DEFAULTS if key in data}
+            self.config.data.setdefault("tiering", {}).update(settings)
+            self.config.save_config()
+            self._send_json_response({"success": True, "settings": TIERING.settings(self.config)})
+        elif parsed_url.path == "/api/tiering/run":
+            if TIERING.tier_repositories(self.config) is None:
+                self._send_json_response({"success": False, "error": "Tiering needs distinct local fast_repo_id and slow_repo_id"}, 400)
+                return
+            # Installations must see both tiers before files start moving between them
+            for install in TIERING.ensure_tier_links(self.config):
+                self._sync_installation(install)
+            self.config.save_config()
+            plan = TIERING.plan(self.config, self.linker)
+            if not TIERING.start(plan, self.config, self.linker):
+                self._send_json_response({"success": False, "error": "Tiering run already in progress"}, 409)
+                return
+            self._send_json_response({"success": True, "demote": len(plan["demote"]), "promote": len(plan["promote"])})
+        elif parsed_url.path in ("/api/profiles", "/api/profiles/activate", "/api/profiles/delete"):
+            install_id = data.get("install_id")
+            name = data.get("name")
+            install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == install_id), None)
+            if not install:
+                self._send_json_response({"success": False, "error": "Installation not found"}, 404)
+                return
+            if install.get("link_mode") == LINK_MODE_CONFIG or install.get("node"):
+                self._send_json_response({"success": False, "error": "Link profiles need a local installation in symlink link mode"}, 400)
+                return
+            if not LinkProfileManager.valid_name(name):
+                self._send_json_response({"success": False, "error": "Invalid profile name"}, 400)
+                return
+
+            try:
+                if parsed_url.path == "/api/profiles":
+                    # Create/update a profile and pre-build its link tree
+                    repo_ids = data.get("repo_ids", [])
+                    known_ids = {r["id"] for r in self.config.data["repositories"]}
+                    if any(repo_id not in known_ids for repo_id in repo_ids):
+                        self._send_json_response({"success": False, "error": "Unknown repository id"}, 400)
+                        return
+                    overlay = self.linker.profiles.save_profile(install, name, repo_ids, self.config)
+                    response = {"success": True, "conflicts": overlay["conflicts"], "stats": overlay["stats"]}
+                elif parsed_url.path == "/api/profiles/activate":
+                    if name not in self.linker.profiles.ensure_profiles(install, self.config):
+                        self._send_json_response({"success": False, "error": "Profile not found"}, 404)
+                        return
+                    response = {"success": True}
+                    response.update(self.linker.profiles.activate(install, name, self.config))
+                else:
+                    if not self.linker.profiles.delete(install, name, self.config):
+                        self._send_json_response({"success": False, "error": "Profile not found or active"}, 400)
+                        return
+                    response = {"success": True}
+            except OSError as e:
+                self._send_json_response({"success": False, "error": str(e)}, 500)
+                return
+
+            self.config.update_all_link_status(self.linker)
+            self.config.save_config()
+            self._send_json_response(response)
+        elif parsed_url.path == "/api/nodes":
+            # Add or update an agent node: {name, url, token?, timeout?}
+            name = data.get("name")
+            url = data.get("url")
+            if not name or not url or not urlparse(url).scheme.startswith("http"):
+                self._send_json_response({"success": False, "error": "name and an http(s) url are required"}, 400)
+                return
+            node = {"url": url}
+            for key in ("token", "timeout"):
+                if data.get(key):
+                    node[key] = data[key]
+            self.config.data.setdefault("nodes", {})[name] = node
+            self.config.refresh_all_paths()
+            self.config.save_config()
+            self._send_json_response({"success": True})
+        elif parsed_url.path == "/api/nodes/delete":
+            name = data.get("name")
+            in_use = [e["name"] for e in self.config.data["repositories"] + self.config.data["comfyui_installations"]
+                      if e.get("node") == name]
+            if in_use:
+                self._send_json_response({"success": False, "error": "Node is still used by: " + ", ".join(in_use)}, 400)
+                return
+            if self.config.data.get("nodes", {}).pop(name, None) is None:
+                self._send_json_response({"success": False, "error": "Node not found"}, 404)
+                return
+            self.config.save_config()
+            self._send_json_response({"success": True})
+        elif parsed_url.path == "/api/link_priority":
+            # Reorder an installation's repositories and re-apply the overlay
+            install_id = data.get("install_id")
+            repo_ids = data.get("repo_ids", [])
+            install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == install_id), None)
+            if not install:
+                self._send_json_response({"success": False, "error": "Installation not found"}, 404)
+                return
+            if not self.config.set_link_priority(install_id, repo_ids):
+                self._send_json_response({"success": False, "error": "repo_ids must list exactly the linked repositories"}, 400)
+                return
+
+            try:
+                overlay = self._sync_installation(install)
+            except AgentError as e:
+                self.config.save_config()
+                self._send_json_response({"success": False, "error": str(e)}, 502)
+                return
+            self.config.update_all_link_status(self.linker)
+            self.config.save_config()
+            self._send_json_response({"success": True, "conflicts": overlay["conflicts"], "stats": overlay["stats"]})
         elif parsed_url.path == "/api/perform_unlink":
             # Actually remove the symbolic links
             install_id = data.get("install_id")
@@ -1107,11 +5742,18 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                 self._send_json_response({"success": False, "error": "Installation or repository not found"}, 404)
                 return
             
-            # Perform the actual unlinking (remove symlinks for this specific repository)
-            results = self.linker.unlink_repository_from_installation(repo["path"], install["path"], repo_id, self.config)
-
-            # Also update the configuration
+            # Update the configuration, then remove the links (on the installation's node)
             self.config.unlink_repository_from_installation(install_id, repo_id)
+            remaining = self.config.get_linked_repositories(install_id)
+            try:
+                if install.get("node"):
+                    results = CLUSTER.call(self.config, install["node"], "remove_repository", install=install,
+                                           repo=repo, remaining_repos=remaining, config_data=self.config.agent_data())
+                else:
+                    results = self.linker.remove_repository(install, repo, remaining, self.config)
+            except AgentError as e:
+                self._send_json_response({"success": False, "error": str(e)}, 502)
+                return
             
             # Update link status
             self.config.update_all_link_status(self.linker)
@@ -1149,9 +5791,16 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
                     install_id = int(install_key)
                     install = next((i for i in self.config.data["comfyui_installations"] if i["id"] == install_id), None)
                     if install and install["exists"]:
-                        print(f"DEBUG: Toggling {folder_name} (enabled={enabled}) for installation {install_id}")
-                        print(f"DEBUG: Old enabled folders: {old_enabled_folders}")
-                        print(f"DEBUG: New enabled folders: {new_enabled_folders}")
+                        _log_event(logging.DEBUG, "toggle_custom_folder", folder=folder_name, enabled=enabled,
+                                   install_id=install_id, old_folders=old_enabled_folders, new_folders=new_enabled_folders)
+
+                        if install.get("link_mode") == LINK_MODE_CONFIG or install.get("node"):
+                            # The overlay drops links of folders that are no longer enabled
+                            try:
+                                self._sync_installation(install)
+                            except AgentError as e:
+                                _log_event(logging.WARNING, "toggle_custom_folder_failed", install_id=install_id, error=str(e))
+                            continue
 
                         # Unlink using OLD state (so disabled folders get removed)
                         self._unlink_with_custom_folders(repo["path"], install["path"], old_enabled_folders)
@@ -1167,21 +5816,33 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
             self.config.refresh_all_paths()
             self.config.save_config()
             self._send_json_response({"success": True})
+        elif parsed_url.path == "/api/search/rebuild":
+            # Re-scan all repositories in the background; unchanged files are skipped
+            SEARCH_INDEX.schedule_refresh(self.config.data["repositories"])
+            self._send_json_response({"success": True, "message": "Search index refresh started"})
         elif parsed_url.path == "/api/update_link_status":
             # Update link status for all installations
             self.config.update_all_link_status(self.linker)
-            self.config.save_config()
             self._send_json_response({"success": True, "message": "Link status updated for all installations"})
         elif parsed_url.path == "/api/check_repository_changes":
             # Check all repositories for changes
             changes = self.config.check_all_repositories_for_changes()
-            self.config.save_config()  # Save updated snapshots
+            if changes["total_changes"]:
+                SEARCH_INDEX.schedule_refresh(self.config.data["repositories"])
             self._send_json_response(changes)
         elif parsed_url.path == "/api/repository_changes":
             repo_id = data.get("repo_id")
             if repo_id:
-                changes = self.config.detect_repository_changes(repo_id)
-                self.config.save_config()  # Save updated snapshot
+                repo = next((r for r in self.config.data["repositories"] if r["id"] == repo_id), None)
+                if repo and repo.get("node"):
+                    try:
+                        changes = CLUSTER.call(self.config, repo["node"], "detect_changes", repo=repo)
+                    except AgentError as e:
+                        self._send_json_response({"success": False, "error": str(e)}, 502)
+                        return
+                else:
+                    changes = self.config.detect_repository_changes(repo_id)
+                SEARCH_INDEX.schedule_refresh(self.config.data["repositories"])
                 self._send_json_response({"success": True, "changes": changes})
             else:
                 self._send_json_response({"success": False, "error": "Missing repo_id parameter"}, 400)
@@ -1205,6 +5866,7 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
             )
             if repo:
                 self.config.save_config()
+                SEARCH_INDEX.schedule_refresh(self.config.data["repositories"])
                 self._send_json_response(repo)
             else:
                 self.send_error(404, "Repository not found")
@@ -1231,6 +5893,7 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
             repo_id = int(parsed_url.path.split("/")[-1])
             self.config.delete_repository(repo_id)
             self.config.save_config()
+            SEARCH_INDEX.schedule_refresh(self.config.data["repositories"])
             self._send_json_response({"success": True})
         elif parsed_url.path.startswith("/api/installations/"):
             install_id = int(parsed_url.path.split("/")[-1])
@@ -1240,52 +5903,34 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
         else:
             self.send_error(404, "Not found")
     
+    def _sync_installation(self, install):
+        """
+        Bring an installation in line with its linked repositories using its link mode.
+        Installations on agent nodes are synced by their agent (raises AgentError).
+        """
+        repos = self.config.get_linked_repositories(install["id"])
+        if install.get("node"):
+            result = CLUSTER.call(self.config, install["node"], "sync_installation",
+                                  install=install, repos=repos, config_data=self.config.agent_data())
+            result["repos"] = {int(repo_id): repo_result for repo_id, repo_result in result["repos"].items()}
+            return result
+        if install.get("link_mode") == LINK_MODE_CONFIG:
+            return self.linker.sync_config_linked(install, repos, self.config)
+        return self.linker.link_installation_overlay(install["path"], repos, self.config)
+
     def _unlink_with_custom_folders(self, repo_path, install_path, custom_folder_names):
         """Unlink standard folders + specific custom folders"""
-        results = {}
-        models_path = os.path.join(install_path, "models")
-
-        # Unlink standard folders
-        for folder in self.linker.standard_folders:
-            src_folder = os.path.join(repo_path, folder)
-            dest_folder = os.path.join(models_path, folder)
-            if os.path.exists(dest_folder):
-                results[folder] = self.linker._unlink_folder_for_repository(src_folder, dest_folder, folder)
-
-        # Unlink specified custom folders
         for folder in custom_folder_names:
-            src_folder = os.path.join(repo_path, folder)
-            dest_folder = os.path.join(models_path, folder)
-            if os.path.exists(dest_folder):
-                print(f"DEBUG: Unlinking custom folder {folder}")
-                results[folder] = self.linker._unlink_folder_for_repository(src_folder, dest_folder, folder)
-
-        return results
+            _log_event(logging.DEBUG, "unlink_custom_folder", folder=folder)
+        folders = [(folder, "Folder") for folder in self.linker.standard_folders + list(custom_folder_names)]
+        return self.linker.unlink_folders(repo_path, install_path, folders, skip_missing=True)
 
     def _link_with_custom_folders(self, repo_path, install_path, custom_folder_names):
         """Link standard folders + specific custom folders"""
-        results = {}
-        models_path = os.path.join(install_path, "models")
-
-        if not os.path.exists(models_path):
-            os.makedirs(models_path, exist_ok=True)
-
-        # Link standard folders
-        for folder in self.linker.standard_folders:
-            src_folder = os.path.join(repo_path, folder)
-            dest_folder = os.path.join(models_path, folder)
-            if os.path.exists(src_folder):
-                results[folder] = self.linker._link_folder(src_folder, dest_folder, folder)
-
-        # Link specified custom folders
         for folder in custom_folder_names:
-            src_folder = os.path.join(repo_path, folder)
-            dest_folder = os.path.join(models_path, folder)
-            if os.path.exists(src_folder):
-                print(f"DEBUG: Linking custom folder {folder}")
-                results[folder] = self.linker._link_folder(src_folder, dest_folder, folder)
-
-        return results
+            _log_event(logging.DEBUG, "link_custom_folder", folder=folder)
+        folders = [(folder, "Source folder") for folder in self.linker.standard_folders + list(custom_folder_names)]
+        return self.linker.link_folders(repo_path, install_path, folders, skip_missing=True)
 
     def serve_main_interface(self):
         # Serve the actual HTML file
@@ -1317,12 +5962,25 @@ class ModelManagerHandler(SimpleHTTPRequestHandler):
             """
             self._send_html_response(html)
 
+# general.architecture values written by the ComfyUI GGUF converters and llama.cpp
+GGUF_DIFFUSION_ARCHITECTURES = {
+    "flux", "sd1", "sdxl", "sd3", "aura", "ltxv", "hyvid", "wan", "cosmos", "lumina2", "hidream", "chroma"
+}
+GGUF_TEXT_ENCODER_ARCHITECTURES = {"t5", "t5encoder", "clip", "llama", "qwen2", "qwen2vl", "gemma2", "umt5"}
+
 def classify_safetensor(filename, metadata=None, tensor_keys=None):
     """Classify SafeTensor models based on filename, metadata, and tensor keys"""
     lower = filename.lower()
     
     # Check metadata first for more accurate classification
     if metadata and isinstance(metadata, dict):
+        gguf_architecture = str(metadata.get("general.architecture", "")).lower()
+        if gguf_architecture:
+            if gguf_architecture in GGUF_TEXT_ENCODER_ARCHITECTURES:
+                return f"Text Encoder (GGUF, {gguf_architecture})"
+            elif gguf_architecture in GGUF_DIFFUSION_ARCHITECTURES:
+                return f"UNet (GGUF, {gguf_architecture})"
+            return f"GGUF Model ({gguf_architecture})"
         architecture = metadata.get("modelspec.architecture", "")
         if "flux-1-dev/lora" in architecture.lower():
             return "LORA for Flux"
@@ -1338,6 +5996,13 @@ def classify_safetensor(filename, metadata=None, tensor_keys=None):
             return "ControlNet"
         elif any("text_encoder" in k or "clip" in k for k in tensor_keys):
             return "Checkpoint"
+        elif any(k.startswith("model.diffusion_model.") for k in tensor_keys) and \
+             any(k.startswith(("cond_stage_model.", "conditioner.")) for k in tensor_keys):
+            # Original (LDM-format) SD checkpoints, as found in .ckpt files
+            return "Checkpoint"
+        elif any(k.startswith("string_to_param.") for k in tensor_keys):
+            # Textual inversion embeddings saved as .pt
+            return "Embedding"
         elif tensor_keys and all(k.startswith("lora_") or "adapter" in k for k in tensor_keys):
             return "LoRA"
         elif tensor_keys and all("." not in k and k.endswith(".embeddings") for k in tensor_keys):
@@ -1361,8 +6026,91 @@ def classify_safetensor(filename, metadata=None, tensor_keys=None):
     else:
         return "Checkpoint/Model"
 
+class ModelManagerAgentHandler(BaseHTTPRequestHandler):
+    """Agent mode: this host's linker and scanners behind one JSON RPC endpoint for a controller"""
+    agent = None
+    token = None
+
+    def _send_rpc_response(self, payload, status_code=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != AGENT_RPC_PATH:
+            self._send_rpc_response({"error": "Not found"}, 404)
+            return
+        if self.token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            self._send_rpc_response({"error": "Invalid agent token"}, 401)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+        except ValueError:
+            self._send_rpc_response({"error": "Invalid JSON"}, 400)
+            return
+
+        method = getattr(self.agent, "rpc_" + str(request.get("method")), None)
+        if method is None:
+            self._send_rpc_response({"error": f"Unknown method {request.get('method')}"}, 404)
+            return
+        try:
+            result = method(**request.get("params", {}))
+        except Exception as e:
+            _log_event(logging.ERROR, "agent_rpc_failed", method=request.get("method"), error=str(e))
+            self._send_rpc_response({"error": str(e)}, 500)
+            return
+        self._send_rpc_response({"result": result})
+
+def run_agent(port, token=None, host=None):
+    """
+    Serve this host's linker to a controller until interrupted.
+    The agent creates and removes symlinks at paths the caller chooses, so without a
+    token it only listens on the loopback interface.
+    """
+    if host is None:
+        host = "0.0.0.0" if token else "127.0.0.1"
+    elif not token and host not in AGENT_LOOPBACK_HOSTS:
+        raise ValueError("An agent listening beyond localhost needs a token (--token or $MODEL_MANAGER_AGENT_TOKEN)")
+    ModelManagerAgentHandler.agent = ModelManagerAgent()
+    ModelManagerAgentHandler.token = token
+    httpd = ThreadingHTTPServer((host, port), ModelManagerAgentHandler)
+    print(f"ComfyUI Model Manager agent listening on {host}:{port}")
+    if not token:
+        print("No agent token set: only accepting connections from this host")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down agent...")
+    finally:
+        httpd.server_close()
+
 if __name__ == "__main__":
-    port = 8002
+    # MODEL_MANAGER_LOG_LEVEL=DEBUG shows the linker's per-folder events
+    logging.basicConfig(
+        level=os.environ.get("MODEL_MANAGER_LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="ComfyUI Model Manager")
+    parser.add_argument("--agent", action="store_true",
+                        help="run as an agent that links and scans this host for a controller")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"listen port (default 8002, or {AGENT_DEFAULT_PORT} for --agent)")
+    parser.add_argument("--token", default=os.environ.get("MODEL_MANAGER_AGENT_TOKEN"),
+                        help="token the controller must send (agent mode; default $MODEL_MANAGER_AGENT_TOKEN)")
+    parser.add_argument("--host", default=None,
+                        help="agent listen address (default 0.0.0.0 with a token, 127.0.0.1 without)")
+    args = parser.parse_args()
+    if args.agent:
+        try:
+            run_agent(args.port or AGENT_DEFAULT_PORT, args.token, args.host)
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(0)
+
+    port = args.port or 8002
     print(f"ComfyUI Model Manager starting on http://localhost:{port}")
     
     # Initialize and update link status on startup
@@ -1371,10 +6119,14 @@ if __name__ == "__main__":
     
     print("Checking link status for all installations...")
     config.update_all_link_status(linker)
-    config.save_config()
     print("✓ Link status updated")
+
+    # Load the persisted search index, then catch up with the repositories in the background
+    SEARCH_INDEX.load()
+    SEARCH_INDEX.schedule_refresh(config.data["repositories"])
     
-    httpd = HTTPServer(("0.0.0.0", port), ModelManagerHandler)
+    # Threaded so /api/events streams can stay open; other requests still run one at a time
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), ModelManagerHandler)
     try:
         httpd.serve_forever()
     except KeyboardInterrupt: